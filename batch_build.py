@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+複数キャラクターのバッチビルド
+
+characters/*/config.json を複数のヘッドレス Blender プロセスで並列に
+pipeline.py に通し、最後に成功・失敗・所要時間のサマリーを出力する。
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_SCRIPT = os.path.join(BASE_DIR, 'blender_pipeline', 'scripts', 'pipeline.py')
+WORKER_SCRIPT = os.path.join(BASE_DIR, 'blender_pipeline', 'scripts', 'worker.py')
+WORKER_RESULT_PREFIX = "@@worker "
+DEFAULT_PATTERN = os.path.join(BASE_DIR, 'characters', '*', 'config.json')
+
+def log(message):
+    """ログ出力関数"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}", flush=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="複数キャラクターを並列ビルドする (pipeline.py をヘッドレス Blender で実行)"
+    )
+    parser.add_argument('configs', nargs='*',
+                        help='config.json のパスまたはグロブ (省略時: characters/*/config.json)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='同時に起動する Blender プロセス数')
+    parser.add_argument('--queue_size', type=int, default=None,
+                        help='待ち行列の上限 (省略時: jobs の2倍)')
+    parser.add_argument('--timeout', type=float, default=1800,
+                        help='1ジョブあたりのタイムアウト秒数')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='失敗・タイムアウト時の再試行回数')
+    parser.add_argument('--use_asset_motions', action='store_true',
+                        help='Asset Browserからモーションを読み込む')
+    parser.add_argument('--log_level', type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='pipeline.py に渡すログレベル')
+    parser.add_argument('--blender', type=str, default=os.environ.get("BLENDER_BIN", "blender"),
+                        help='Blender 実行ファイル (既定: $BLENDER_BIN または blender)')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='pipeline.py のステージキャッシュを使わない')
+    parser.add_argument('--persistent', action='store_true',
+                        help='常駐ワーカー (worker.py) を使い、Blender の起動を並列数ぶんだけに抑える')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+                        help='実行コマンドを表示するだけで Blender を起動しない')
+    return parser.parse_args()
+
+def expand_configs(patterns):
+    """パス・グロブのリストを重複のない config.json の絶対パスに展開する"""
+    if not patterns:
+        patterns = [DEFAULT_PATTERN]
+
+    configs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            log(f"⚠ 該当する設定ファイルがありません: {pattern}")
+        for path in matches:
+            path = os.path.abspath(path)
+            if not os.path.isfile(path):
+                log(f"⚠ 設定ファイルが見つかりません: {path}")
+                continue
+            if path not in configs:
+                configs.append(path)
+    return configs
+
+def character_name(config_path):
+    """config.json の親ディレクトリ名をキャラクター名とする"""
+    return os.path.basename(os.path.dirname(config_path))
+
+def build_command(config_path, args):
+    """1キャラクター分の Blender コマンドラインを組み立てる"""
+    cmd = [args.blender, "--background", "--python-exit-code", "1",
+           "--python", PIPELINE_SCRIPT, "--",
+           "--config", config_path,
+           "--log_level", args.log_level]
+    if args.use_asset_motions:
+        cmd.append("--use_asset_motions")
+    if args.no_cache:
+        cmd.append("--no_cache")
+    return cmd
+
+def run_cold_attempt(config_path, log_file, args):
+    """Blender を新規に起動して1回ビルドする。(status, returncode) を返す"""
+    cmd = build_command(config_path, args)
+    log_file.write(f"=== {' '.join(cmd)}\n")
+    log_file.flush()
+
+    proc = subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT, cwd=BASE_DIR)
+    try:
+        proc.wait(timeout=args.timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        return 'timeout', proc.returncode
+    return ('success' if proc.returncode == 0 else 'failed'), proc.returncode
+
+def _pump_lines(stream, lines):
+    """ワーカーの標準出力を行単位でキューに流す（EOF で None）"""
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+def read_worker_result(worker, log_file, timeout):
+    """
+    結果行が届くまでワーカーの出力を log_file に転記する。
+    (結果の辞書 or None, 'timeout' / 'crashed' / None) を返す。
+    """
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, 'timeout'
+        try:
+            line = worker['lines'].get(timeout=remaining)
+        except queue.Empty:
+            return None, 'timeout'
+        if line is None:
+            return None, 'crashed'
+        if line.startswith(WORKER_RESULT_PREFIX):
+            return json.loads(line[len(WORKER_RESULT_PREFIX):]), None
+        if log_file:
+            log_file.write(line)
+
+def start_worker(args, log_file=None):
+    """常駐ワーカーを起動し、ready 応答を待つ"""
+    cmd = [args.blender, "--background", "--python", WORKER_SCRIPT, "--", "--log_level", args.log_level]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, bufsize=1, cwd=BASE_DIR)
+    lines = queue.Queue()
+    threading.Thread(target=_pump_lines, args=(proc.stdout, lines), daemon=True).start()
+    worker = {'proc': proc, 'lines': lines}
+
+    result, error = read_worker_result(worker, log_file, args.timeout)
+    if error or result.get('status') != 'ready':
+        stop_worker(worker)
+        raise RuntimeError(f"ワーカーの起動に失敗しました: {error or result}")
+    log(f"✓ ワーカー起動 (pid {result.get('pid')})")
+    return worker
+
+def stop_worker(worker):
+    """ワーカーに終了を指示し、応答がなければ強制終了する"""
+    proc = worker['proc']
+    try:
+        if proc.poll() is None:
+            proc.stdin.write(json.dumps({'cmd': 'quit'}) + "\n")
+            proc.stdin.flush()
+            proc.wait(timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        proc.kill()
+        proc.wait()
+
+def run_worker_attempt(config_path, log_file, args, state):
+    """
+    スレッド専用の常駐ワーカーでビルドする。
+    タイムアウト・異常終了したワーカーは破棄し、次の試行で起動し直す。
+    """
+    if state.get('worker') is None:
+        try:
+            state['worker'] = start_worker(args, log_file)
+        except (RuntimeError, OSError) as e:
+            log_file.write(f"=== {e}\n")
+            return 'failed', None
+    worker = state['worker']
+
+    job = {'id': character_name(config_path), 'config': config_path,
+           'use_asset_motions': args.use_asset_motions, 'no_cache': args.no_cache}
+    log_file.write(f"=== worker job: {json.dumps(job, ensure_ascii=False)}\n")
+    log_file.flush()
+    try:
+        worker['proc'].stdin.write(json.dumps(job, ensure_ascii=False) + "\n")
+        worker['proc'].stdin.flush()
+    except OSError:
+        state['worker'] = None
+        return 'crashed', worker['proc'].poll()
+
+    result, error = read_worker_result(worker, log_file, args.timeout)
+    if error:
+        worker['proc'].kill()
+        worker['proc'].wait()
+        state['worker'] = None
+        return error, worker['proc'].returncode
+    return result['status'], result['returncode']
+
+def run_job(config_path, args, state=None):
+    """
+    1キャラクターをビルドする。失敗・タイムアウト時は retries 回まで再試行し、
+    全試行の出力を characters/<name>/logs/build_<日時>.log に書き出す。
+    state が渡された場合は常駐ワーカーを使う。
+    """
+    name = character_name(config_path)
+    log_dir = os.path.join(os.path.dirname(config_path), 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"build_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+
+    result = {
+        'name': name,
+        'config': config_path,
+        'log': log_path,
+        'status': 'failed',
+        'returncode': None,
+        'attempts': 0,
+        'duration': 0.0,
+    }
+
+    start_time = time.time()
+    with open(log_path, 'a', encoding='utf-8') as log_file:
+        for attempt in range(1, args.retries + 2):
+            result['attempts'] = attempt
+            log_file.write(f"=== attempt {attempt}\n")
+            log_file.flush()
+
+            if state is None:
+                status, returncode = run_cold_attempt(config_path, log_file, args)
+            else:
+                status, returncode = run_worker_attempt(config_path, log_file, args, state)
+            result['status'] = status
+            result['returncode'] = returncode
+            if status == 'timeout':
+                log_file.write(f"=== attempt {attempt}: {args.timeout:.0f}秒でタイムアウトしました\n")
+
+            if result['status'] == 'success':
+                break
+            if attempt <= args.retries:
+                log(f"⚠ {name}: {result['status']} (試行 {attempt}) → 再試行します")
+
+    result['duration'] = time.time() - start_time
+    return result
+
+def worker(jobs, results, lock, args):
+    """キューからジョブを取り出して実行するワーカースレッド"""
+    state = {'worker': None} if args.persistent else None
+    while True:
+        config_path = jobs.get()
+        try:
+            if config_path is None:
+                if state and state['worker']:
+                    stop_worker(state['worker'])
+                return
+            log(f"🚀 ビルド開始: {character_name(config_path)}")
+            start_time = time.time()
+            try:
+                result = run_job(config_path, args, state)
+            except Exception as e:
+                # 例外でスレッドが止まるとキューが詰まるため、失敗として記録して次のジョブへ進む
+                result = {
+                    'name': character_name(config_path),
+                    'config': config_path,
+                    'log': None,
+                    'status': 'failed',
+                    'returncode': None,
+                    'attempts': 0,
+                    'duration': time.time() - start_time,
+                    'error': f"{type(e).__name__}: {e}",
+                }
+                log(f"❌ {result['name']}: {result['error']}")
+            with lock:
+                results.append(result)
+            icon = '✅' if result['status'] == 'success' else '❌'
+            log(f"{icon} {result['name']}: {result['status']} "
+                f"(所要時間: {result['duration']:.2f}秒, 試行: {result['attempts']}, ログ: {result['log']})")
+        finally:
+            jobs.task_done()
+
+def print_summary(results, elapsed):
+    """ビルド結果のサマリーを出力する"""
+    succeeded = [r for r in results if r['status'] == 'success']
+    failed = [r for r in results if r['status'] != 'success']
+
+    log("📊 バッチビルド結果:")
+    for r in sorted(results, key=lambda r: r['name']):
+        icon = '✓' if r['status'] == 'success' else '✗'
+        log(f"  {icon} {r['name']:<20} {r['status']:<8} {r['duration']:8.2f}秒  試行 {r['attempts']}")
+    minutes = int(elapsed // 60)
+    seconds = int(elapsed % 60)
+    log(f"✅ 成功: {len(succeeded)}  ❌ 失敗: {len(failed)}  ⏱ 所要時間: {minutes}分 {seconds}秒")
+    if failed:
+        log(f"  失敗したキャラクター: {', '.join(r['name'] for r in failed)}")
+
+def main():
+    args = parse_args()
+    configs = expand_configs(args.configs)
+    if not configs:
+        log("❌ ビルド対象の設定ファイルがありません")
+        return 1
+
+    jobs_count = max(1, min(args.jobs, len(configs)))
+    mode = '常駐ワーカー' if args.persistent else 'ジョブごとに起動'
+    log(f"🚀 バッチビルドを開始します: {len(configs)} キャラクター / {jobs_count} 並列 ({mode})")
+
+    if args.dry_run:
+        for config_path in configs:
+            log(f"⚠ ドライラン: {' '.join(build_command(config_path, args))}")
+        return 0
+
+    start_time = time.time()
+    jobs = queue.Queue(maxsize=args.queue_size or jobs_count * 2)
+    results = []
+    lock = threading.Lock()
+
+    threads = [threading.Thread(target=worker, args=(jobs, results, lock, args), daemon=True)
+               for _ in range(jobs_count)]
+    for t in threads:
+        t.start()
+
+    # キューが満杯の間は put がブロックするため、投入数は queue_size で頭打ちになる
+    for config_path in configs:
+        jobs.put(config_path)
+    for _ in threads:
+        jobs.put(None)
+    for t in threads:
+        t.join()
+
+    print_summary(results, time.time() - start_time)
+    if len(results) != len(configs):
+        log(f"❌ 結果が {len(configs)} 件中 {len(results)} 件しかありません")
+        return 1
+    return 0 if all(r['status'] == 'success' for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
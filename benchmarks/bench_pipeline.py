@@ -0,0 +1,147 @@
+# benchmarks/bench_pipeline.py
+"""
+合成キャラクター1体分のパイプラインをステージごとに計測する (Blender 側)
+
+run_benchmarks.py から呼び出される:
+  blender --background --factory-startup --python benchmarks/bench_pipeline.py -- \
+    --workdir /tmp/bench/small --subdivisions 1 --motions 3 --keys 5 --result result.json
+
+素体生成 (create_base.generate_base) から、pipeline.py と同じステージ関数、
+保存、FBX/GLB エクスポートまでを順に実行し、各ステージのウォール時間・
+CPU 時間・ピーク RSS と成果物のサイズを JSON で書き出す。
+アニメーションは乱数シード固定の合成モーションで置き換える。
+"""
+import bpy
+import os
+import sys
+import json
+import math
+import random
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(REPO_ROOT, 'blender_pipeline'))
+sys.path.append(os.path.join(REPO_ROOT, 'blender_pipeline', 'scripts'))
+
+import tracing
+from utils import get_rig_object, resolve_control_bones, detect_mesh_collection
+from motion_data import DEFAULT_CONTROL_BONES
+from mesh_metrics import scene_metrics
+from create_base import generate_base
+from pipeline import stage_base, stage_model, stage_rigging
+from apply_detail import apply_to_collection
+from animation import create_action
+from export import EXPORTERS
+
+PREFIX = "Bench"
+
+DETAIL_SETTINGS = {
+    'bevel': {'width': 0.02, 'segments': 3},
+    'displace': {'strength': 0.04, 'noise_scale': 0.8},
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="合成キャラクターでパイプラインを計測する")
+    parser.add_argument('--workdir', type=str, required=True, help='作業・出力ディレクトリ')
+    parser.add_argument('--result', type=str, required=True, help='計測結果 JSON の出力先')
+    parser.add_argument('--subdivisions', type=int, default=1)
+    parser.add_argument('--motions', type=int, default=3)
+    parser.add_argument('--keys', type=int, default=5, help='モーションあたりのキーフレーム数')
+    parser.add_argument('--frames', type=int, default=60, help='モーションの長さ（フレーム）')
+    parser.add_argument('--detail', action='store_true')
+    parser.add_argument('--height', type=float, default=1.58)
+    parser.add_argument('--seed', type=int, default=0)
+    args, _ = parser.parse_known_args(sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else [])
+    return args
+
+def synthetic_motion(bones, keys, frames, rng):
+    """ボーンごとに keys 個の回転キーを持つ合成モーションを作る"""
+    bone_frames = {}
+    for bone in bones:
+        amplitude = rng.uniform(0.1, 0.6)
+        phase = rng.uniform(0, 2 * math.pi)
+        keyframes = []
+        for k in range(keys):
+            frame = 1 + round(k * (frames - 1) / max(1, keys - 1))
+            t = 2 * math.pi * k / max(1, keys - 1) + phase
+            keyframes.append((frame, {'rotation_euler': (amplitude * math.sin(t),
+                                                         0.5 * amplitude * math.cos(t),
+                                                         0.25 * amplitude * math.sin(2 * t))}))
+        bone_frames[bone] = keyframes
+    return bone_frames
+
+def stage_synthetic_animation(args):
+    rig = get_rig_object()
+    if not rig:
+        raise RuntimeError("リグが見つかりません")
+    bones = [b for b in resolve_control_bones(rig, DEFAULT_CONTROL_BONES).values() if b]
+    rng = random.Random(args.seed)
+    for m in range(args.motions):
+        create_action(rig, f"Bench{m:03d}", synthetic_motion(bones, args.keys, args.frames, rng))
+    bpy.context.scene.frame_start = 1
+    bpy.context.scene.frame_end = args.frames
+
+def stage_detail(args):
+    mesh_coll = detect_mesh_collection()
+    if mesh_coll and mesh_coll != f"{PREFIX}Human":
+        bpy.data.collections[mesh_coll].name = f"{PREFIX}Human"
+    apply_to_collection(PREFIX, settings=DETAIL_SETTINGS)
+
+def enable_rigify():
+    import addon_utils
+    if 'rigify' not in bpy.context.preferences.addons:
+        addon_utils.enable('rigify', default_set=True)
+
+def mesh_stats():
+    """評価後（モディファイア適用後）の頂点数・三角形数"""
+    metrics = scene_metrics(evaluated=True)
+    return {'vertices': metrics['vertices'], 'triangles': metrics['triangles']}
+
+def main():
+    args = parse_args()
+    os.makedirs(args.workdir, exist_ok=True)
+    blend_out = os.path.join(args.workdir, f'{PREFIX}_animated.blend')
+    fbx_path = os.path.join(args.workdir, f'{PREFIX.lower()}.fbx')
+    glb_path = os.path.join(args.workdir, f'{PREFIX.lower()}.glb')
+    ctx = {'cfg': {'height': args.height}, 'prefix': PREFIX}
+
+    tracing.enable()
+    with tracing.span("bench"):
+        with tracing.stage('generate_base'):
+            generate_base(PREFIX, subdivisions=args.subdivisions, height=args.height)
+        # generate_base は read_factory_settings でアドオン設定も初期化するため、ここで有効化する
+        enable_rigify()
+        with tracing.stage('base'):
+            stage_base(ctx)
+        if args.detail:
+            with tracing.stage('detail'):
+                stage_detail(args)
+        with tracing.stage('model'):
+            stage_model(ctx)
+        with tracing.stage('rigging'):
+            stage_rigging(ctx)
+        with tracing.stage('animation'):
+            stage_synthetic_animation(args)
+        stats = mesh_stats()
+        with tracing.stage('save'):
+            bpy.ops.wm.save_as_mainfile(filepath=blend_out)
+        with tracing.stage('export_fbx'):
+            EXPORTERS['fbx'](fbx_path, use_armature_deform_only=True)
+        with tracing.stage('export_glb'):
+            EXPORTERS['glb'](glb_path)
+
+    result = {
+        'params': {k: getattr(args, k) for k in ('subdivisions', 'motions', 'keys', 'frames', 'detail', 'height', 'seed')},
+        'blender': bpy.app.version_string,
+        'stages': tracing.stage_summary(),
+        'peak_rss_mb': tracing.peak_rss_mb(),
+        'mesh': stats,
+        'artifacts': {name: os.path.getsize(path) for name, path in
+                      (('blend', blend_out), ('fbx', fbx_path), ('glb', glb_path)) if os.path.exists(path)},
+    }
+    with open(args.result, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"✔ Benchmark result written to: {args.result}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+パイプラインのベンチマーク
+
+合成キャラクターを複数の規模で生成し、ステージごとの時間・メモリ・成果物サイズを
+JSON に記録する。2つの結果ファイルを比較して性能劣化を検出することもできる。
+
+  python3 benchmarks/run_benchmarks.py run --scales small medium --repeat 3 -o bench.json
+  python3 benchmarks/run_benchmarks.py compare base.json bench.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BENCH_SCRIPT = os.path.join(BENCH_DIR, 'bench_pipeline.py')
+
+# 規模ごとの合成キャラクター設定
+SCALES = {
+    'small':  {'subdivisions': 1, 'motions': 3,  'keys': 5,   'frames': 60,  'detail': False},
+    'medium': {'subdivisions': 2, 'motions': 8,  'keys': 30,  'frames': 120, 'detail': True},
+    'large':  {'subdivisions': 3, 'motions': 16, 'keys': 120, 'frames': 240, 'detail': True},
+    'dense':  {'subdivisions': 1, 'motions': 8,  'keys': 600, 'frames': 600, 'detail': False},
+}
+
+# ステージごとに比較する項目。ピーク RSS はプロセス全体で減らないため、ステージごとには増分を比べ、
+# ピークそのものは実行ごとに1回だけ比較する
+STAGE_METRICS = ('wall_ms', 'cpu_ms', 'rss_growth_mb')
+
+# 比較時にノイズとみなす差分の下限
+MIN_DELTA = {'wall_ms': 50.0, 'cpu_ms': 50.0, 'rss_growth_mb': 20.0, 'peak_rss_mb': 20.0, 'artifact_bytes': 4096}
+
+def log(message):
+    """ログ出力関数"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}", flush=True)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_scale(name, params, workdir, blender_bin, seed, timeout):
+    """1規模分を1回計測する（毎回新しい Blender プロセスで実行）"""
+    scale_dir = os.path.join(workdir, name)
+    os.makedirs(scale_dir, exist_ok=True)
+    result_path = os.path.join(scale_dir, 'result.json')
+    cmd = [blender_bin, "--background", "--factory-startup", "--python-exit-code", "1",
+           "--python", BENCH_SCRIPT, "--",
+           "--workdir", scale_dir, "--result", result_path, "--seed", str(seed)]
+    for key in ('subdivisions', 'motions', 'keys', 'frames'):
+        cmd += [f"--{key}", str(params[key])]
+    if params['detail']:
+        cmd.append("--detail")
+
+    with open(os.path.join(scale_dir, 'blender.log'), 'w', encoding='utf-8') as log_file:
+        proc = subprocess.run(cmd, stdout=log_file, stderr=subprocess.STDOUT, timeout=timeout)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name}: Blender が失敗しました (returncode={proc.returncode}, log={log_file.name})")
+    with open(result_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def aggregate(runs):
+    """複数回の計測をステージごとの中央値にまとめる"""
+    stages = {}
+    for stage in runs[0]['stages']:
+        stages[stage] = {}
+        for metric in STAGE_METRICS:
+            values = [r['stages'][stage][metric] for r in runs
+                      if stage in r['stages'] and r['stages'][stage].get(metric) is not None]
+            if values:
+                stages[stage][metric] = round(statistics.median(values), 3)
+    peaks = [r['peak_rss_mb'] for r in runs if r.get('peak_rss_mb') is not None]
+    return {
+        'params': runs[0]['params'],
+        'runs': len(runs),
+        'stages': stages,
+        'peak_rss_mb': round(statistics.median(peaks), 1) if peaks else None,
+        'mesh': runs[0]['mesh'],
+        'artifacts': runs[-1]['artifacts'],
+        'total_wall_ms': round(sum(s.get('wall_ms', 0) for s in stages.values()), 3),
+    }
+
+def cmd_run(args):
+    blender_bin = args.blender
+    workdir = args.workdir or tempfile.mkdtemp(prefix='charactor_bench_')
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'scales': {},
+    }
+    log(f"🚀 ベンチマーク開始: {', '.join(args.scales)} (各 {args.repeat} 回, 作業ディレクトリ: {workdir})")
+    for name in args.scales:
+        runs = []
+        for i in range(args.repeat):
+            start = time.time()
+            run = run_scale(name, SCALES[name], workdir, blender_bin, args.seed, args.timeout)
+            runs.append(run)
+            log(f"  ✓ {name} #{i + 1}: {time.time() - start:.2f}秒")
+        results['meta']['blender'] = runs[0].get('blender')
+        results['scales'][name] = aggregate(runs)
+        print_scale(name, results['scales'][name])
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    log(f"✅ 結果を書き出しました: {args.output}")
+    return 0
+
+def print_scale(name, scale):
+    log(f"📊 {name}: {scale['params']} / 頂点 {scale['mesh']['vertices']} / ピーク RSS {scale.get('peak_rss_mb') or 0:.1f}MB")
+    for stage, m in scale['stages'].items():
+        log(f"    {stage:<14} {m.get('wall_ms', 0):10.1f}ms  cpu {m.get('cpu_ms', 0):10.1f}ms  "
+            f"rss +{m.get('rss_growth_mb') or 0:7.1f}MB")
+    for artifact, size in scale['artifacts'].items():
+        log(f"    {artifact:<14} {size:>12,d} bytes")
+
+def compare(base, new, threshold):
+    """
+    2つの結果を比較し、threshold（割合）かつ MIN_DELTA を超えて悪化した項目を返す。
+    戻り値: [(規模, 項目, 旧値, 新値, 変化率), ...]
+    """
+    rows = []
+    for name, new_scale in new['scales'].items():
+        base_scale = base['scales'].get(name)
+        if not base_scale:
+            continue
+        for stage, metrics in new_scale['stages'].items():
+            for metric in STAGE_METRICS:
+                value = metrics.get(metric)
+                old = base_scale['stages'].get(stage, {}).get(metric)
+                if old is not None and value is not None:
+                    rows.append((name, f"{stage}.{metric}", old, value, MIN_DELTA[metric]))
+        if base_scale.get('peak_rss_mb') is not None and new_scale.get('peak_rss_mb') is not None:
+            rows.append((name, 'peak_rss_mb', base_scale['peak_rss_mb'], new_scale['peak_rss_mb'],
+                         MIN_DELTA['peak_rss_mb']))
+        for artifact, size in new_scale['artifacts'].items():
+            old = base_scale['artifacts'].get(artifact)
+            if old is not None:
+                rows.append((name, f"artifact.{artifact}", old, size, MIN_DELTA['artifact_bytes']))
+
+    regressions = []
+    for name, item, old, value, min_delta in rows:
+        # 旧値が 0 の項目（ピーク RSS が増えなかったステージなど）は増えれば無限大の変化とみなす
+        ratio = (value - old) / old if old else (float('inf') if value > old else 0.0)
+        marker = ''
+        if ratio > threshold and value - old > min_delta:
+            regressions.append((name, item, old, value, ratio))
+            marker = '  ❌ 劣化'
+        elif ratio < -threshold and old - value > min_delta:
+            marker = '  ✅ 改善'
+        log(f"  {name:<8} {item:<28} {old:>14,.1f} → {value:>14,.1f} ({ratio:+7.1%}){marker}")
+    return regressions
+
+def cmd_compare(args):
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    log(f"🔍 比較: {args.base} ({base['meta'].get('git')}) → {args.new} ({new['meta'].get('git')})")
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        log(f"❌ {len(regressions)} 件の劣化を検出しました (しきい値 {args.threshold:.0%})")
+        return 1
+    log("✅ 劣化は検出されませんでした")
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="パイプラインのベンチマーク")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='合成キャラクターで計測する')
+    run.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    run.add_argument('--repeat', type=int, default=3, help='規模ごとの計測回数（中央値を採用）')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--timeout', type=float, default=3600)
+    run.add_argument('--workdir', type=str, help='作業ディレクトリ（省略時は一時ディレクトリ）')
+    run.add_argument('--blender', type=str, default=os.environ.get("BLENDER_BIN", "blender"))
+    run.add_argument('--output', '-o', type=str, default='bench_results.json')
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser('compare', help='2つの結果を比較して劣化を検出する')
+    cmp_.add_argument('base')
+    cmp_.add_argument('new')
+    cmp_.add_argument('--threshold', type=float, default=0.10, help='劣化とみなす変化率')
+    cmp_.set_defaults(func=cmd_compare)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+手続き的な歩行・走行サイクルの生成
+
+身長・歩幅・ケイデンス・腕振りから1歩行周期分の全チャンネル（torso / arm_l / arm_r /
+leg_l / leg_r の rotation_euler）を NumPy 配列で一度に計算する。
+出力は motion_data.compile_motions と同じコンパイル済み形式なので、
+motion_data.bind_motion → animation.write_action_curves でそのまま一括書き込みできる。
+
+  ladder = gait_ladder(height=1.58, fps=24)            # Walk / Jog / Sprint
+  curves = bind_motion(ladder, 'Jog', role_bones)
+
+歩幅は身長に対する比率で指定するため、setup_model で身長を変えたキャラクターでも
+脚の振り角は同じになる。ケイデンスは REFERENCE_HEIGHT の身長での値で、振り子としての脚の
+固有周期に合わせて √(REFERENCE_HEIGHT / height) 倍する（フルード数が同じ＝力学的に相似な歩き方）。
+そのため背の低いキャラクターほど周期が短く（フレーム数が少なく）なり、移動速度は √height に比例する。
+"""
+import numpy as np
+
+# 脚長（股関節〜足首）の身長に対する比率
+LEG_LENGTH_RATIO = 0.53
+
+# GAIT_PRESETS の cadence が想定する身長 (m)
+REFERENCE_HEIGHT = 1.58
+
+# 速度段階ごとの既定パラメータ
+#   stride:    1歩の歩幅（身長に対する比率）
+#   cadence:   1分あたりの歩数（REFERENCE_HEIGHT の身長での値）
+#   arm_swing: 腕振りの振幅 (rad)
+#   lean:      体幹の前傾 (rad)
+GAIT_PRESETS = {
+    'Walk':   {'stride': 0.41, 'cadence': 110, 'arm_swing': 0.30, 'lean': 0.05},
+    'Jog':    {'stride': 0.65, 'cadence': 160, 'arm_swing': 0.45, 'lean': 0.12},
+    'Sprint': {'stride': 0.95, 'cadence': 190, 'arm_swing': 0.60, 'lean': 0.20},
+}
+
+# 出力するチャンネル: (役割, 成分)。回転軸の向きは motions/*.json の手付けモーションに合わせる
+CHANNELS = (
+    ('torso', 0), ('torso', 1), ('torso', 2),
+    ('arm_l', 2), ('arm_r', 2),
+    ('leg_l', 0), ('leg_r', 0),
+)
+
+def cycle_length(cadence, fps):
+    """1周期（2歩）のフレーム数"""
+    return max(2, int(round(fps * 120.0 / cadence)))
+
+def scaled_cadence(cadence, height):
+    """身長に合わせたケイデンス（脚の固有周期は脚長の平方根に比例する）"""
+    return cadence * np.sqrt(REFERENCE_HEIGHT / height)
+
+def gait_speed(height, stride, cadence):
+    """移動速度 (m/s)。cadence は身長に合わせた後の値"""
+    return stride * height * cadence / 60.0
+
+def gait_channels(phase, stride, arm_swing, lean):
+    """
+    位相配列 phase (rad, shape [N]) に対する全チャンネルの値を返す。
+    歩幅は身長に対する比率なので、角度は身長によらない（身長は周期の長さに効く）。
+    戻り値: float32 配列 shape [len(CHANNELS), N]
+    """
+    # 1歩で脚が前後に振れる角度: 半歩ぶんの水平距離を脚長で割った逆正弦
+    leg_amplitude = np.arcsin(np.clip(0.5 * stride / LEG_LENGTH_RATIO, 0.0, 1.0))
+    twist = 0.15 * arm_swing
+
+    s = np.sin(phase)
+    values = np.empty((len(CHANNELS), len(phase)), dtype=np.float32)
+    values[0] = lean + 0.5 * lean * (1.0 - np.cos(2.0 * phase))  # 前傾（着地ごとに上下）
+    values[1] = 0.5 * twist * np.cos(phase)                         # 横揺れ（支持脚側へ、ひねりより 1/4 周期遅れ）
+    values[2] = twist * s                                           # ひねり
+    values[3] = arm_swing * s
+    values[4] = -arm_swing * s
+    values[5] = leg_amplitude * s
+    values[6] = -leg_amplitude * s
+    return values
+
+def gait_ladder(height=1.58, presets=None, fps=24, frame_start=1, cycles=1):
+    """
+    presets の各速度段階について歩行周期を生成し、コンパイル済み形式でまとめて返す。
+    presets: {名前: {'stride', 'cadence', 'arm_swing', 'lean'}}（省略時は GAIT_PRESETS。
+             一部のキーだけ指定した場合は同名の既定値、なければ Walk の値で補う）
+    全フレームにキーを打ち、最終フレームは先頭と同じ値にしてループを閉じる。
+    """
+    presets = GAIT_PRESETS if presets is None else presets
+    frame_chunks, value_chunks, motions = [], [], {}
+    offset = 0
+    for name, overrides in presets.items():
+        params = dict(GAIT_PRESETS.get(name, GAIT_PRESETS['Walk']), **(overrides or {}))
+        cadence = scaled_cadence(params['cadence'], height)
+        length = cycle_length(cadence, fps) * cycles
+        steps = np.arange(length + 1, dtype=np.float32)
+        phase = (2.0 * np.pi * cycles / length) * steps
+        frames = steps + frame_start
+        values = gait_channels(phase, params['stride'], params['arm_swing'], params['lean'])
+        values[:, -1] = values[:, 0]
+
+        curves = []
+        for (role, index), channel in zip(CHANNELS, values):
+            curves.append([role, 'rotation_euler', index, offset, len(frames)])
+            frame_chunks.append(frames)
+            value_chunks.append(channel)
+            offset += len(frames)
+        motions[name] = {
+            'frame_range': [frame_start, frame_start + length],
+            'curves': curves,
+            'speed': round(float(gait_speed(height, params['stride'], cadence)), 3),
+        }
+
+    empty = np.empty(0, dtype=np.float32)
+    return {
+        'frames': np.concatenate(frame_chunks) if frame_chunks else empty,
+        'values': np.concatenate(value_chunks) if value_chunks else empty,
+        'motions': motions,
+    }
@@ -0,0 +1,82 @@
+"""
+パイプライン共通のロガー
+
+pipeline.py / utils.py / animation.py / apply_detail.py はここで設定した
+'charactor' ロガーに出力する。
+
+- 出力はメモリ上にバッファし、capacity 件たまるか WARNING 以上が来た時点でまとめて書き出す
+- DEBUG メッセージは logger.debug("... %s", x) の %-形式で渡し、設定レベル未満では文字列化させない
+  （INFO 以上は常に出力される前提で f-string を使う）。引数の計算自体は省けないため、
+  ホットループでは is_debug() の結果をループ外で一度だけ取り、分岐で丸ごと省く
+- json_path を指定すると機械処理向けに JSON Lines でも書き出す
+"""
+import sys
+import json
+import atexit
+import logging
+import logging.handlers
+
+LOGGER_NAME = 'charactor'
+LOG_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_CAPACITY = 256
+
+class JsonLinesFormatter(logging.Formatter):
+    """1レコード1行の JSON に整形する"""
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+_configured = {'done': False}
+
+def _buffered(handler, capacity):
+    return logging.handlers.MemoryHandler(capacity, flushLevel=logging.WARNING, target=handler)
+
+def configure(level='INFO', json_path=None, capacity=DEFAULT_CAPACITY, stream=None):
+    """
+    ロガーを設定する。繰り返し呼ぶと既存のハンドラを書き出してから置き換える。
+    level: 'DEBUG' / 'INFO' / 'WARNING' / 'ERROR'
+    """
+    root = logging.getLogger(LOGGER_NAME)
+    for handler in list(root.handlers):
+        handler.flush()
+        handler.close()
+        root.removeHandler(handler)
+
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    root.propagate = False
+
+    console = logging.StreamHandler(stream or sys.stdout)
+    console.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    root.addHandler(_buffered(console, capacity))
+
+    if json_path:
+        json_handler = logging.FileHandler(json_path, mode='a', encoding='utf-8')
+        json_handler.setFormatter(JsonLinesFormatter())
+        root.addHandler(_buffered(json_handler, capacity))
+
+    _configured['done'] = True
+    return root
+
+def get_logger(name=None):
+    """'charactor' または 'charactor.<name>' ロガーを返す（未設定なら INFO で初期化）"""
+    if not _configured['done']:
+        configure()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+def is_debug(logger):
+    return logger.isEnabledFor(logging.DEBUG)
+
+def flush():
+    """バッファ中のログを書き出す（ステージ境界や外部プロセスへの応答前に呼ぶ）"""
+    for handler in logging.getLogger(LOGGER_NAME).handlers:
+        handler.flush()
+
+atexit.register(flush)
@@ -0,0 +1,76 @@
+"""
+メッシュの計測（バウンディングボックス・高さ・頂点数・三角形数・重心）
+
+頂点座標は vertices.foreach_get で NumPy 配列に取り込み、matrix_world を
+1回の行列積で適用する。evaluated=True ならモディファイア適用後のメッシュを計測する。
+
+  metrics = scene_metrics()                 # シーン内の全メッシュ
+  metrics['height'], metrics['objects'][0]['triangles']
+"""
+import bpy
+import numpy as np
+
+def _mesh_arrays(mesh):
+    """メッシュの頂点座標 (N, 3) と三角形数"""
+    count = len(mesh.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    return co.reshape(count, 3), int(np.sum(loop_totals - 2))
+
+def world_coordinates(co, matrix_world):
+    """ローカル座標 (N, 3) をワールド座標に変換する"""
+    matrix = np.array(matrix_world, dtype=np.float64)
+    return co @ matrix[:3, :3].T + matrix[:3, 3]
+
+def object_metrics(obj, evaluated=False, depsgraph=None):
+    """
+    1オブジェクト分の計測結果を返す。
+    戻り値: {'name', 'vertices', 'triangles', 'bounds_min', 'bounds_max', 'centroid'}
+            （頂点がない場合、bounds_min / bounds_max / centroid は None）
+    """
+    if evaluated:
+        depsgraph = depsgraph or bpy.context.evaluated_depsgraph_get()
+        source = obj.evaluated_get(depsgraph)
+        mesh = source.to_mesh()
+    else:
+        source = obj
+        mesh = obj.data
+    try:
+        co, triangles = _mesh_arrays(mesh)
+    finally:
+        if evaluated:
+            source.to_mesh_clear()
+
+    result = {'name': obj.name, 'vertices': len(co), 'triangles': triangles,
+              'bounds_min': None, 'bounds_max': None, 'centroid': None}
+    if len(co):
+        world = world_coordinates(co, obj.matrix_world)
+        result['bounds_min'] = world.min(axis=0).tolist()
+        result['bounds_max'] = world.max(axis=0).tolist()
+        result['centroid'] = world.mean(axis=0).tolist()
+    return result
+
+def scene_metrics(objects=None, evaluated=False):
+    """
+    複数のメッシュオブジェクト（省略時はシーン内の全メッシュ）をまとめて計測する。
+    戻り値: {'objects': [object_metrics, ...], 'vertices', 'triangles',
+             'bounds_min', 'bounds_max', 'height'}（メッシュがなければ bounds は None、height は 0）
+    """
+    if objects is None:
+        objects = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    depsgraph = bpy.context.evaluated_depsgraph_get() if evaluated else None
+    per_object = [object_metrics(obj, evaluated, depsgraph) for obj in objects]
+
+    measured = [m for m in per_object if m['bounds_min'] is not None]
+    bounds_min = np.min([m['bounds_min'] for m in measured], axis=0).tolist() if measured else None
+    bounds_max = np.max([m['bounds_max'] for m in measured], axis=0).tolist() if measured else None
+    return {
+        'objects': per_object,
+        'vertices': sum(m['vertices'] for m in per_object),
+        'triangles': sum(m['triangles'] for m in per_object),
+        'bounds_min': bounds_min,
+        'bounds_max': bounds_max,
+        'height': bounds_max[2] - bounds_min[2] if measured else 0.0,
+    }
@@ -0,0 +1,165 @@
+"""
+モーション定義ファイルの読み込みとコンパイル
+
+モーションは blender_pipeline/motions/*.json に、ボーン名ではなく役割
+（torso / arm_l / arm_r / leg_l / leg_r）をキーにして定義する:
+
+  {"version": 1,
+   "motions": {
+     "Walk": {"frame_range": [1, 60],
+              "tracks": {"torso": {"rotation_euler": {"frames": [1, 15, ...],
+                                                      "values": [[0, 0, 0], [0.1, 0.05, 0.05], ...]}}}}}}
+
+load_motion_file() は JSON を一度だけ解析し、全カーブのフレーム・値を1本ずつの
+float32 配列に詰めた「コンパイル済み」形式に変換する。結果はファイルの SHA-256 を
+キーにプロセス内でメモ化し、cache_dir にも .npz として保存するため、
+以降のビルドでは JSON の解析も Python の辞書の組み立ても行わない。
+bind_motion() は役割をリグのボーン名に割り当て、animation.write_action_curves
+にそのまま渡せる {(data_path, index): (frames, values)} を返す。
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BASE_DIR)
+MOTIONS_DIR = os.path.join(BASE_DIR, 'motions')
+DEFAULT_MOTION_FILE = os.path.join(MOTIONS_DIR, 'default.json')
+ASSET_MOTION_FILE = os.path.join(MOTIONS_DIR, 'asset_library.json')
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'motions')
+
+# コンパイル済み形式のバージョン（変更時は既存の .npz を使わない）
+COMPILED_VERSION = 1
+
+# 役割ごとのコントロールボーン候補（config の control_bones で上書きできる）
+DEFAULT_CONTROL_BONES = {
+    'torso': ['chest_main_FK', 'spine_fk.003', 'spine_fk.002', 'spine_fk.001', 'torso'],
+    'arm_l': ['upper_arm_fk.L', 'forearm_fk.L'],
+    'arm_r': ['upper_arm_fk.R', 'forearm_fk.R'],
+    'leg_l': ['thigh_fk.L', 'shin_fk.L'],
+    'leg_r': ['thigh_fk.R', 'shin_fk.R'],
+}
+
+KEYABLE_PROPERTIES = ('location', 'rotation_euler', 'scale')
+
+_memo = {}
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def compile_motions(definition):
+    """
+    JSON を読み込んだ dict をコンパイル済み形式に変換する。
+    戻り値: {'frames': float32[N], 'values': float32[N],
+             'motions': {名前: {'frame_range': [開始, 終了],
+                                'curves': [[役割, プロパティ, 成分, オフセット, キー数], ...]}}}
+    同じカーブに同じフレームのキーが複数ある場合は後のものを採用する。
+    """
+    frame_chunks, value_chunks, motions = [], [], {}
+    offset = 0
+    for name, motion in definition.get('motions', {}).items():
+        curves = []
+        end = 1
+        for role, props in motion.get('tracks', {}).items():
+            for prop_name, track in props.items():
+                if prop_name not in KEYABLE_PROPERTIES:
+                    raise ValueError(f"モーション '{name}' の '{role}' に不明なプロパティ '{prop_name}' があります")
+                frames = np.asarray(track['frames'], dtype=np.float32)
+                if len(frames) == 0:
+                    continue
+                values = np.asarray(track['values'], dtype=np.float32).reshape(len(frames), -1)
+                # 重複フレームは後勝ち: 逆順で unique を取ると各フレームの最後の出現位置が
+                # フレーム昇順で得られる
+                _, last = np.unique(frames[::-1], return_index=True)
+                keep = len(frames) - 1 - last
+                frames, values = frames[keep], values[keep]
+                end = max(end, int(frames[-1]))
+                for index in range(values.shape[1]):
+                    curves.append([role, prop_name, index, offset, len(frames)])
+                    frame_chunks.append(frames)
+                    value_chunks.append(values[:, index])
+                    offset += len(frames)
+        motions[name] = {'frame_range': motion.get('frame_range', [1, end]), 'curves': curves}
+
+    empty = np.empty(0, dtype=np.float32)
+    return {
+        'frames': np.concatenate(frame_chunks) if frame_chunks else empty,
+        'values': np.concatenate(value_chunks) if value_chunks else empty,
+        'motions': motions,
+    }
+
+def _cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}.v{COMPILED_VERSION}.npz")
+
+def _load_npz(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            'frames': data['frames'],
+            'values': data['values'],
+            'motions': json.loads(str(data['index'])),
+        }
+
+def _save_npz(path, compiled):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}.npz"
+    np.savez(tmp_path, frames=compiled['frames'], values=compiled['values'],
+             index=np.array(json.dumps(compiled['motions'], ensure_ascii=False)))
+    os.replace(tmp_path, path)
+
+def load_motion_file(path=DEFAULT_MOTION_FILE, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    モーション定義ファイルをコンパイル済み形式で返す。
+    同じ内容のファイルはプロセス内のメモ、次に cache_dir の .npz から読み込む。
+    cache_dir に None を渡すとディスクキャッシュを使わない。
+    """
+    path = os.path.abspath(path)
+    digest = file_digest(path)
+    cached = _memo.get(path)
+    if cached and cached['hash'] == digest:
+        return cached
+
+    compiled = None
+    npz_path = _cache_path(cache_dir, digest) if cache_dir else None
+    if npz_path and os.path.exists(npz_path):
+        try:
+            compiled = _load_npz(npz_path)
+        except (OSError, ValueError, KeyError):
+            compiled = None
+    if compiled is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            compiled = compile_motions(json.load(f))
+        if npz_path:
+            _save_npz(npz_path, compiled)
+
+    compiled['hash'] = digest
+    compiled['path'] = path
+    _memo[path] = compiled
+    return compiled
+
+def motion_names(compiled):
+    return list(compiled['motions'])
+
+def frame_range(compiled, motion_name):
+    return tuple(compiled['motions'][motion_name]['frame_range'])
+
+def bind_motion(compiled, motion_name, role_bones):
+    """
+    モーションの役割をボーン名に割り当てる。
+    role_bones: {役割: ボーン名}（None の役割、割り当てのない役割のカーブは含めない）
+    戻り値: {(data_path, index): (frames, values)}  frames/values は共有配列のビュー
+    """
+    frames, values = compiled['frames'], compiled['values']
+    curves = {}
+    for role, prop_name, index, offset, count in compiled['motions'][motion_name]['curves']:
+        bone_name = role_bones.get(role)
+        if not bone_name:
+            continue
+        data_path = f'pose.bones["{bone_name}"].{prop_name}'
+        curves[(data_path, index)] = (frames[offset:offset + count], values[offset:offset + count])
+    return curves
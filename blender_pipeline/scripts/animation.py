@@ -1,10 +1,87 @@
 import bpy
 import math
+import json
+import numpy as np
 import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_rig_object, find_control_bone
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from utils import get_rig_object, resolve_control_bones
+from logger import get_logger, is_debug
+from motion_data import (KEYABLE_PROPERTIES, DEFAULT_CONTROL_BONES, DEFAULT_MOTION_FILE, DEFAULT_CACHE_DIR,
+                         file_digest, load_motion_file, bind_motion, frame_range)
+from gait import gait_ladder
+from retarget import retarget_actions
+import tracing
+
+logger = get_logger('animation')
+
+# ライブラリ .blend ごとのアクション一覧 {絶対パス: {'mtime', 'hash', 'actions'}}
+_library_index = {}
+
+# bpy.types.Keyframe.interpolation の列挙値 ('CONSTANT'=0, 'LINEAR'=1, 'BEZIER'=2)
+INTERPOLATION_BEZIER = 2
+
+def collect_curves(bone_frames):
+    """
+    bone_frames を Fカーブ単位の配列にまとめる。
+    戻り値: {(data_path, index): (frames, values)}  frames/values はフレーム昇順の numpy 配列。
+    同じフレームに複数のキーがある場合は後に指定した値を採用する。
+    """
+    columns = {}
+    for bone_name, keyframes in bone_frames.items():
+        for frame, props in keyframes:
+            for prop_name, value in props.items():
+                if prop_name not in KEYABLE_PROPERTIES:
+                    logger.warning(f"⚠     不明なプロパティ '{prop_name}' をスキップします。")
+                    continue
+                data_path = f'pose.bones["{bone_name}"].{prop_name}'
+                # スカラー値の場合（通常はない）はインデックス0のカーブにする
+                components = value if hasattr(value, "__len__") else (value,)
+                for i, val_comp in enumerate(components):
+                    columns.setdefault((data_path, i), {})[frame] = val_comp
+
+    curves = {}
+    for key, keys_by_frame in columns.items():
+        frames = np.fromiter(keys_by_frame.keys(), dtype=np.float32, count=len(keys_by_frame))
+        values = np.fromiter(keys_by_frame.values(), dtype=np.float32, count=len(keys_by_frame))
+        order = np.argsort(frames, kind='stable')
+        curves[key] = (frames[order], values[order])
+    return curves
+
+def _bone_name(data_path):
+    """'pose.bones["name"].prop' からボーン名を取り出す（ボーン以外は None）"""
+    if data_path.startswith('pose.bones["'):
+        return data_path[len('pose.bones["'):data_path.index('"]')]
+    return None
+
+def write_action_curves(action, curves, interpolation=INTERPOLATION_BEZIER):
+    """
+    {(data_path, index): (frames, values)} を action に書き込む。
+    既存の同名カーブは置き換え、keyframe_points.add + foreach_set で1カーブずつ一括設定する。
+    ボーンのカーブはボーン名のグループにまとめる。
+    """
+    written = []
+    for (data_path, index), (frames, values) in curves.items():
+        count = len(frames)
+        if count == 0:
+            continue
+        fc = action.fcurves.find(data_path=data_path, index=index)
+        if fc:
+            action.fcurves.remove(fc)
+        fc = action.fcurves.new(data_path=data_path, index=index, action_group=_bone_name(data_path) or '')
+
+        co = np.empty(count * 2, dtype=np.float32)
+        co[0::2] = frames
+        co[1::2] = values
+        fc.keyframe_points.add(count)
+        fc.keyframe_points.foreach_set('co', co)
+        fc.keyframe_points.foreach_set('interpolation', np.full(count, interpolation, dtype=np.int32))
+        # ハンドルの再計算
+        fc.update()
+        written.append(fc)
+    return written
 
 def create_action(obj, action_name, bone_frames):
     """
@@ -19,195 +96,243 @@ def create_action(obj, action_name, bone_frames):
       ...
     }
     """
-    print(f"--- create_action開始: アクション名='{action_name}', オブジェクト='{obj.name if obj else 'None'}' ---")
+    with tracing.span("create_action", action=action_name):
+        with tracing.span("create_action:collect", bones=len(bone_frames)):
+            curves = collect_curves(bone_frames)
+        return _create_action(obj, action_name, curves)
+
+def create_action_from_curves(obj, action_name, curves):
+    """
+    {(data_path, index): (frames, values)}（collect_curves / motion_data.bind_motion の戻り値）
+    からアクションを生成する。
+    """
+    with tracing.span("create_action", action=action_name):
+        return _create_action(obj, action_name, curves)
+
+def _create_action(obj, action_name, curves):
+    # フレーム・キー単位のログはループ外で一度だけ判定し、無効なら文字列化も行わない
+    debug = is_debug(logger)
+    logger.info(f"--- create_action開始: アクション名='{action_name}', オブジェクト='{obj.name if obj else 'None'}' ---")
 
     if obj is None or not hasattr(obj, 'pose') or obj.pose is None:
-        print(f"⚠ アニメーション対象のリグオブジェクト '{obj.name if obj else 'None'}' が不適切か、ポーズデータがありません。アクション '{action_name}' をスキップします。")
+        logger.warning(f"⚠ アニメーション対象のリグオブジェクト '{obj.name if obj else 'None'}' が不適切か、ポーズデータがありません。アクション '{action_name}' をスキップします。")
         return None
 
     original_mode = bpy.context.object.mode if bpy.context.object else 'OBJECT'
     if bpy.context.object and bpy.context.object.mode != 'OBJECT':
         bpy.ops.object.mode_set(mode='OBJECT')
-        print(f"  モードをOBJECTに変更しました。")
+        logger.debug("  モードをOBJECTに変更しました。")
 
     bpy.ops.object.select_all(action='DESELECT')
     obj.select_set(True)
     bpy.context.view_layer.objects.active = obj
-    print(f"  オブジェクト '{obj.name}' を選択しアクティブ化しました。")
+    logger.debug("  オブジェクト '%s' を選択しアクティブ化しました。", obj.name)
 
     bpy.ops.object.mode_set(mode='POSE')
-    print(f"  モードをPOSEに変更しました。")
+    logger.debug("  モードをPOSEに変更しました。")
 
     # 既存のアクションがあるか確認し、あれば再利用（名前が一致する場合）
     action = bpy.data.actions.get(action_name)
     if action:
-        print(f"  既存のアクション '{action_name}' を再利用します。")
+        logger.debug("  既存のアクション '%s' を再利用します。", action_name)
         # 既存のFカーブをクリア
         while action.fcurves:
             action.fcurves.remove(action.fcurves[0])
-        print(f"  既存のFカーブをクリアしました。")
+        logger.debug("  既存のFカーブをクリアしました。")
     else:
         action = bpy.data.actions.new(name=action_name)
         if not action:
-            print(f"⚠ アクション '{action_name}' の作成に失敗しました。")
+            logger.warning(f"⚠ アクション '{action_name}' の作成に失敗しました。")
             if bpy.context.object.mode != original_mode:
                 bpy.ops.object.mode_set(mode=original_mode)
             return None
-        print(f"  アクション '{action.name}' を新規作成しました。")
+        logger.debug("  アクション '%s' を新規作成しました。", action.name)
 
     # --- 重要: use_fake_userを設定 ---
     action.use_fake_user = True
-    print(f"  アクション '{action.name}' の use_fake_user を True に設定しました。")
+    logger.debug("  アクション '%s' の use_fake_user を True に設定しました。", action.name)
 
     if not obj.animation_data:
         obj.animation_data_create()
-        print(f"  オブジェクト '{obj.name}' にアニメーションデータを新規作成しました。")
+        logger.debug("  オブジェクト '%s' にアニメーションデータを新規作成しました。", obj.name)
     
     obj.animation_data.action = action
     if obj.animation_data.action == action:
-        print(f"  アクション '{action.name}' をオブジェクト '{obj.name}' に割り当てました。")
+        logger.debug("  アクション '%s' をオブジェクト '%s' に割り当てました。", action.name, obj.name)
     else:
-        print(f"⚠ アクション '{action.name}' のオブジェクト '{obj.name}' への割り当てに失敗した可能性があります。")
+        logger.warning(f"⚠ アクション '{action.name}' のオブジェクト '{obj.name}' への割り当てに失敗した可能性があります。")
 
     # 処理するボーン名のリストを用意（デバッグ用）
-    bone_names_list = list(bone_frames.keys())
-    print(f"  処理予定のボーン: {bone_names_list}")
+    bone_names_list = list(dict.fromkeys(_bone_name(data_path) for data_path, _ in curves))
+    logger.debug("  処理予定のボーン: %s", bone_names_list)
 
-    for bone_name, keyframes in bone_frames.items():
+    missing = set()
+    for bone_name in bone_names_list:
+        if bone_name is None:
+            continue
         bone = obj.pose.bones.get(bone_name)
         if not bone:
-            print(f"⚠ ボーン '{bone_name}' がリグ '{obj.name}' に見つかりません。スキップします。")
+            logger.warning(f"⚠ ボーン '{bone_name}' がリグ '{obj.name}' に見つかりません。スキップします。")
+            missing.add(bone_name)
             continue
-        
-        print(f"  ボーン '{bone_name}' の処理を開始...")
+
         original_rotation_mode = bone.rotation_mode
         bone.rotation_mode = 'XYZ'
         if bone.rotation_mode == 'XYZ':
-            print(f"    ボーン '{bone_name}' の回転モードを 'XYZ' に設定しました。(元: {original_rotation_mode})")
+            logger.debug("    ボーン '%s' の回転モードを 'XYZ' に設定しました。(元: %s)", bone_name, original_rotation_mode)
         else:
-            print(f"⚠ ボーン '{bone_name}' の回転モードを 'XYZ' に設定できませんでした。現在のモード: {bone.rotation_mode}")
+            logger.warning(f"⚠ ボーン '{bone_name}' の回転モードを 'XYZ' に設定できませんでした。現在のモード: {bone.rotation_mode}")
+    if missing:
+        curves = {key: curve for key, curve in curves.items() if _bone_name(key[0]) not in missing}
 
-        # 各プロパティタイプでの基本データパス（リファクタリング対象）
-        prop_data_paths = {
-            'location': f'pose.bones["{bone_name}"].location',
-            'rotation_euler': f'pose.bones["{bone_name}"].rotation_euler',
-            'scale': f'pose.bones["{bone_name}"].scale'
-        }
+    # Fカーブ単位の配列を1カーブずつ一括で書き込む
+    with tracing.span("create_action:write", curves=len(curves)):
+        write_action_curves(action, curves)
 
-        # 各キーフレームとプロパティを処理
-        for frame, props in keyframes:
-            print(f"    フレーム {frame} の処理中...")
-            
-            for prop_name, value in props.items():
-                if prop_name not in prop_data_paths:
-                    print(f"⚠     不明なプロパティ '{prop_name}' をスキップします。")
-                    continue
-                
-                data_path = prop_data_paths[prop_name]
-                
-                # 値が3次元タプルか確認し、各コンポーネントに対してFカーブを作成
-                if hasattr(value, "__len__") and len(value) == 3:
-                    for i, val_comp in enumerate(value): # valueの各要素をval_compに変更
-                        # FCurveを直接作成（存在すれば取得）
-                        fc = action.fcurves.find(data_path=data_path, index=i)
-                        if not fc:
-                            fc = action.fcurves.new(data_path=data_path, index=i)
-                            print(f"        新規Fカーブ作成: {data_path}[{i}]")
-                        
-                        # キーフレームポイントの追加
-                        existing_point = None
-                        for kp in fc.keyframe_points:
-                            if kp.co.x == frame:
-                                existing_point = kp
-                                break
-                        
-                        if existing_point:
-                            existing_point.co = (frame, val_comp) # valをval_compに変更
-                            print(f"        既存キーフレーム更新: {data_path}[{i}] @ フレーム {frame} = {val_comp}") # valをval_compに変更
-                        else:
-                            kp = fc.keyframe_points.insert(frame, val_comp) # valをval_compに変更
-                            print(f"        キーフレーム追加: {data_path}[{i}] @ フレーム {frame} = {val_comp}") # valをval_compに変更
-                else:
-                    # スカラー値の場合（通常はない）
-                    fc = action.fcurves.find(data_path=data_path, index=0)
-                    if not fc:
-                        fc = action.fcurves.new(data_path=data_path, index=0)
-                    kp = fc.keyframe_points.insert(frame, float(value))
-                    print(f"        スカラーキーフレーム: {data_path} @ フレーム {frame} = {value}")
-            
-            print(f"    フレーム {frame} の処理完了。")
-
-        # 後処理: 全てのFカーブに対して補間タイプを設定
-        for fc in action.fcurves:
-            if fc.data_path.startswith(f'pose.bones["{bone_name}"]'):
-                for kp in fc.keyframe_points:
-                    kp.interpolation = 'BEZIER'  # ベジェ補間を設定
-
-        print(f"  ボーン '{bone_name}' の処理完了。全てのキーフレームにベジェ補間を設定。")
-
-    # 全てのキーフレームポイントをアップデート
-    for fc in action.fcurves:
-        fc.update()
-    
-    print(f"  全Fカーブを更新しました。")
+    if debug:
+        for (data_path, index), (frames, values) in curves.items():
+            logger.debug("        Fカーブ %s[%s]: %s キー (フレーム %g-%g)", data_path, index, len(frames), frames[0], frames[-1])
+    logger.debug("  全Fカーブを一括で書き込み、ベジェ補間を設定しました。")
 
     # 最終確認: Fカーブとキーフレームポイントの数をログ出力
     fcurve_count = len(action.fcurves)
     keyframe_count = sum(len(fc.keyframe_points) for fc in action.fcurves)
-    print(f"  最終確認: アクション '{action.name}' の Fカーブ数={fcurve_count}, 合計キーフレームポイント数={keyframe_count}")
+    logger.info(f"  最終確認: アクション '{action.name}' の Fカーブ数={fcurve_count}, 合計キーフレームポイント数={keyframe_count}")
 
     if original_mode and bpy.context.object and bpy.context.object.mode != original_mode:
         bpy.ops.object.mode_set(mode=original_mode)
-        print(f"  モードを元の '{original_mode}' に戻しました。")
+        logger.debug("  モードを元の '%s' に戻しました。", original_mode)
     else:
         if bpy.context.object and bpy.context.object.mode != 'OBJECT':
             bpy.ops.object.mode_set(mode='OBJECT')
-            print(f"  モードをOBJECTに戻しました。")
+            logger.debug("  モードをOBJECTに戻しました。")
 
-    print(f"--- create_action完了: アクション名='{action_name}' ---")
+    logger.info(f"--- create_action完了: アクション名='{action_name}' ---")
     return action
 
 
-def load_action_from_library(rig, action_name, library_path):
+def library_action_index(library_path, cache_dir=DEFAULT_CACHE_DIR):
     """
-    外部ライブラリからアクションを読み込み、NLAトラックとして追加する
+    ライブラリ .blend に含まれるアクション名の一覧をキャッシュから返す。
+    ファイルの mtime が記録と同じならそのまま、異なれば SHA-256 を比較して使えるか判定する。
+    キャッシュにない・内容が変わった場合は None（load_actions_from_library が読み込み時に更新する）。
+    """
+    path = os.path.abspath(library_path)
+    entry = _library_index.get(path)
+    if entry is None and cache_dir:
+        entry = _read_library_index(cache_dir).get(path)
+    if not entry:
+        return None
+    mtime = os.path.getmtime(path)
+    if entry['mtime'] != mtime:
+        if entry['hash'] != file_digest(path):
+            return None
+        entry['mtime'] = mtime
+    _library_index[path] = entry
+    return entry['actions']
+
+def _library_index_path(cache_dir):
+    return os.path.join(cache_dir, 'library_index.json')
+
+def _read_library_index(cache_dir):
+    try:
+        with open(_library_index_path(cache_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _store_library_index(library_path, actions, cache_dir):
+    path = os.path.abspath(library_path)
+    entry = {'mtime': os.path.getmtime(path), 'hash': file_digest(path), 'actions': list(actions)}
+    _library_index[path] = entry
+    if not cache_dir:
+        return
+    index = _read_library_index(cache_dir)
+    index[path] = entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{_library_index_path(cache_dir)}.tmp{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, _library_index_path(cache_dir))
+
+def load_actions_from_library(rig, action_names, library_path, link=False, cache_dir=DEFAULT_CACHE_DIR,
+                              control_bones=None):
+    """
+    外部ライブラリから複数のアクションを1回の libraries.load でまとめて読み込み、
+    それぞれを NLA トラックとして追加する。
+    link=True ならリンク、False ならアペンドする。
+    アクションが rig にないボーンを参照している場合は、control_bones の役割と
+    Rigify の命名規則から作った対応表で rig のボーン名に付け替える（retarget.py）。
+    戻り値: {アクション名: 読み込んだアクション}（読み込めなかったものは含まない）
     """
     if not os.path.exists(library_path):
-        print(f"⚠ ライブラリパス '{library_path}' が存在しません。")
-        return False
+        logger.warning(f"⚠ ライブラリパス '{library_path}' が存在しません。")
+        return {}
     
     if not rig or not hasattr(rig, 'animation_data'):
-        print(f"⚠ 有効なリグが提供されていません。")
-        return False
+        logger.warning(f"⚠ 有効なリグが提供されていません。")
+        return {}
     
-    if not rig.animation_data:
-        rig.animation_data_create()
+    # 既知のアクション一覧があれば、ライブラリを開く前に存在しないものを除く
+    known = library_action_index(library_path, cache_dir)
+    if known is not None:
+        if not any(name in known for name in action_names):
+            for name in action_names:
+                logger.warning(f"⚠ アクション '{name}' がライブラリ '{library_path}' に見つかりません。")
+            return {}
     
-    with bpy.data.libraries.load(library_path, link=False) as (data_from, data_to):
-        if action_name not in data_from.actions:
-            print(f"⚠ アクション '{action_name}' がライブラリ '{library_path}' に見つかりません。")
-            print(f"  利用可能なアクション: {data_from.actions}")
-            return False
-        
-        data_to.actions = [action_name]
+    with tracing.span("load_actions_from_library", actions=len(action_names), link=link):
+        with bpy.data.libraries.load(library_path, link=link) as (data_from, data_to):
+            available = list(data_from.actions)
+            requested = [name for name in action_names if name in available]
+            data_to.actions = requested
+        if known != available:
+            _store_library_index(library_path, available, cache_dir)
     
-    loaded_action = bpy.data.actions.get(action_name)
-    if not loaded_action:
-        print(f"⚠ アクション '{action_name}' のロードに失敗しました。")
-        return False
+    for name in action_names:
+        if name not in available:
+            logger.warning(f"⚠ アクション '{name}' がライブラリ '{library_path}' に見つかりません。")
+            logger.debug("  利用可能なアクション: %s", available)
     
-    nla_track = rig.animation_data.nla_tracks.new()
-    nla_track.name = action_name
+    # libraries.load 後の data_to には読み込まれた ID が入る（同名のローカルアクションと取り違えない）
+    loaded = {}
+    for name, action in zip(requested, data_to.actions):
+        if action is None:
+            logger.warning(f"⚠ アクション '{name}' のロードに失敗しました。")
+            continue
+        loaded[name] = action
     
-    strip = nla_track.strips.new(action_name, 1, loaded_action)
-    strip.use_auto_blend = True
-    strip.blend_type = 'REPLACE'
+    if loaded:
+        loaded = retarget_actions(rig, loaded, control_bones)
+    add_nla_strips(rig, loaded)
+    return loaded
+
+def add_nla_strips(rig, actions):
+    """{トラック名: アクション} をそれぞれ NLA トラックとストリップとしてリグに追加する"""
+    if not rig.animation_data:
+        rig.animation_data_create()
+    
+    tracks = rig.animation_data.nla_tracks
+    for name, action in actions.items():
+        nla_track = tracks.new()
+        nla_track.name = name
+        strip = nla_track.strips.new(name, int(action.frame_range[0]), action)
+        strip.use_auto_blend = True
+        strip.blend_type = 'REPLACE'
     
-    print(f"✓ アクション '{action_name}' をNLAトラック '{nla_track.name}' に追加しました。")
-    return True
+    if actions:
+        logger.info(f"✓ アクション {list(actions)} を NLA トラックに追加しました。")
+
+def load_action_from_library(rig, action_name, library_path, link=False):
+    """
+    外部ライブラリからアクションを読み込み、NLAトラックとして追加する
+    （複数読み込む場合は load_actions_from_library を使う）
+    """
+    return action_name in load_actions_from_library(rig, [action_name], library_path, link=link)
 
 
-def do_animation(motions=None, use_asset_motions=False, motions_path=None):
+def do_animation(motions=None, use_asset_motions=False, motions_path=None, control_bones=None, motion_file=None,
+                 gait=None, height=1.58, link_asset_motions=False):
     """
     シーン内のArmatureを検索し、アニメーション用リグとして使用。
     Rigify生成済みのリグを優先する。
@@ -220,101 +345,89 @@ def do_animation(motions=None, use_asset_motions=False, motions_path=None):
         Trueの場合、Asset Browserからモーションを読み込む
     motions_path : str
         モーションアセットのパス（use_asset_motionsがTrueの場合に使用）
+    control_bones : dict
+        役割ごとのコントロールボーン候補 {'torso': [...], 'arm_l': [...], ...}
+        （省略時は motion_data.DEFAULT_CONTROL_BONES）
+    motion_file : str
+        プログラム生成に使うモーション定義ファイル（省略時は motions/default.json）
+    gait : bool or dict
+        True または {名前: {'stride', 'cadence', 'arm_swing', 'lean'}} の場合、
+        gait.gait_ladder で歩行・走行サイクルを生成し、同名のモーションより優先する
+    height : float
+        キャラクターの身長 (m)。gait の歩幅の基準になる
+    link_asset_motions : bool
+        Trueの場合、アセットモーションをアペンドではなくリンクで読み込む
     """
-    print("--- do_animation開始 ---")
+    logger.info("--- do_animation開始 ---")
     
     if motions is None:
         motions = ['Idle']
     
     rig = get_rig_object()
     if not rig:
-        print("⚠ アニメーションターゲットリグが見つかりませんでした。")
+        logger.warning("⚠ アニメーションターゲットリグが見つかりませんでした。")
         return
 
-    print(f"ℹ 最終的なアニメーションターゲットリグ: {rig.name}")
+    logger.info(f"ℹ 最終的なアニメーションターゲットリグ: {rig.name}")
 
     if rig.animation_data and rig.animation_data.action:
-        print(f"  リグ '{rig.name}' の既存アクティブアクション '{rig.animation_data.action.name}' をクリアします。")
+        logger.debug("  リグ '%s' の既存アクティブアクション '%s' をクリアします。", rig.name, rig.animation_data.action.name)
         rig.animation_data.action = None
     
-    torso_candidates = ['chest_main_FK', 'spine_fk.003', 'spine_fk.002', 'spine_fk.001', 'torso']
-    
-    torso_bone = find_control_bone(rig, torso_candidates)
-    if not torso_bone:
-        print(f"⚠ コントロールボーン未検出: 候補 {torso_candidates} はリグに存在しません。")
+    role_bones = resolve_control_bones(rig, dict(DEFAULT_CONTROL_BONES, **(control_bones or {})))
+    if not role_bones.get('torso'):
+        logger.warning(f"⚠ 'torso' のコントロールボーンが見つからないため、アニメーションを生成しません。")
         return
     
+    frame_end = 60
     if use_asset_motions and motions_path:
-        print(f"  アセットモーションを使用: {motions_path}")
+        logger.info(f"  アセットモーションを使用: {motions_path}")
         
+        loaded = load_actions_from_library(rig, motions, motions_path, link=link_asset_motions,
+                                           control_bones=control_bones)
         for motion_name in motions:
-            success = load_action_from_library(rig, motion_name, motions_path)
-            if success:
-                print(f"✓ モーション '{motion_name}' を読み込みました。")
+            if motion_name in loaded:
+                logger.info(f"✓ モーション '{motion_name}' を読み込みました。")
             else:
-                print(f"⚠ モーション '{motion_name}' の読み込みに失敗しました。")
+                logger.warning(f"⚠ モーション '{motion_name}' の読み込みに失敗しました。")
         
-        print("✓ アセットモーションの読み込み完了")
+        logger.info("✓ アセットモーションの読み込み完了")
         
     else:
-        print(f"  プログラムでアニメーションを生成します。")
+        logger.info(f"  プログラムでアニメーションを生成します。")
+        sources = []
+        if gait:
+            fps = bpy.context.scene.render.fps / bpy.context.scene.render.fps_base
+            ladder = gait_ladder(height, presets=None if gait is True else gait, fps=fps)
+            for name, motion in ladder['motions'].items():
+                logger.info(f"  歩行サイクル '{name}': {motion['frame_range'][1] - motion['frame_range'][0]} フレーム/周期, 速度 {motion['speed']} m/s")
+            sources.append(ladder)
+        sources.append(load_motion_file(motion_file or DEFAULT_MOTION_FILE))
         
-        if 'Idle' in motions:
-            idle_frames = {
-                torso_bone: [
-                    (1,  {'rotation_euler': (0, 0, 0)}),
-                    (15, {'rotation_euler': (0.5, 0.3, 0.2)}),
-                    (30, {'rotation_euler': (0, -0.03, 0)}),
-                    (45, {'rotation_euler': (-0.5, 0.3, -0.2)}),
-                    (60, {'rotation_euler': (0, 0, 0)}),
-                ],
-            }
-            
-            print(f"  'Idle' アクションをリグ '{rig.name}' に作成します。")
-            create_action(rig, 'Idle', idle_frames)
-        
-        if 'Walk' in motions:
-            walk_frames = {
-                torso_bone: [
-                    (1,  {'rotation_euler': (0, 0, 0)}),
-                    (15, {'rotation_euler': (0.2, 0.1, 0.1)}),
-                    (30, {'rotation_euler': (0, 0, 0)}),
-                    (45, {'rotation_euler': (0.2, -0.1, -0.1)}),
-                    (60, {'rotation_euler': (0, 0, 0)}),
-                ],
-            }
-            
-            print(f"  'Walk' アクションをリグ '{rig.name}' に作成します。")
-            create_action(rig, 'Walk', walk_frames)
-        
-        if 'Run' in motions:
-            run_frames = {
-                torso_bone: [
-                    (1,  {'rotation_euler': (0, 0, 0)}),
-                    (10, {'rotation_euler': (0.3, 0.2, 0.2)}),
-                    (20, {'rotation_euler': (0, 0, 0)}),
-                    (30, {'rotation_euler': (0.3, -0.2, -0.2)}),
-                    (40, {'rotation_euler': (0, 0, 0)}),
-                ],
-            }
-            
-            print(f"  'Run' アクションをリグ '{rig.name}' に作成します。")
-            create_action(rig, 'Run', run_frames)
+        for motion_name in motions:
+            compiled = next((c for c in sources if motion_name in c['motions']), None)
+            if compiled is None:
+                logger.warning(f"⚠ モーション '{motion_name}' は {sources[-1]['path']} に定義されていません。スキップします。")
+                continue
+            logger.debug("  '%s' アクションをリグ '%s' に作成します。", motion_name, rig.name)
+            create_action_from_curves(rig, motion_name, bind_motion(compiled, motion_name, role_bones))
+            frame_end = max(frame_end, frame_range(compiled, motion_name)[1])
     
     bpy.context.scene.frame_start = 1
-    bpy.context.scene.frame_end = 60
+    bpy.context.scene.frame_end = frame_end
     bpy.context.scene.frame_current = 1
-    print(f"  シーンのフレーム範囲を {bpy.context.scene.frame_start}-{bpy.context.scene.frame_end} に、現在フレームを {bpy.context.scene.frame_current} に設定しました。")
+    logger.debug("  シーンのフレーム範囲を %s-%s に、現在フレームを %s に設定しました。",
+                 bpy.context.scene.frame_start, bpy.context.scene.frame_end, bpy.context.scene.frame_current)
     
     # アニメーションの確認を促す情報を追加
-    print(f"✔ アニメーション生成完了")
-    print(f"  アニメーション確認方法: ")
-    print(f"  1. ドープシート/アクションエディタを開く")
-    print(f"  2. 作成したアクションが選択されていることを確認")
-    print(f"  3. ポーズモードでコントロールボーンを選択")
-    print(f"  4. タイムラインで再生ボタンを押す")
+    logger.info(f"✔ アニメーション生成完了")
+    logger.info(f"  アニメーション確認方法: ")
+    logger.info(f"  1. ドープシート/アクションエディタを開く")
+    logger.info(f"  2. 作成したアクションが選択されていることを確認")
+    logger.info(f"  3. ポーズモードでコントロールボーンを選択")
+    logger.info(f"  4. タイムラインで再生ボタンを押す")
     
-    print("--- do_animation完了 ---")
+    logger.info("--- do_animation完了 ---")
 
 if __name__ == '__main__':
     do_animation()
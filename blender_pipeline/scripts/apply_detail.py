@@ -1,7 +1,17 @@
 import bpy
 import os
+import sys
 import json
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tracing
+from logger import get_logger
+from utils import bake_modifiers
+
+logger = get_logger('apply_detail')
+
+DETAIL_MODIFIERS = ('DetailBevel', 'DetailDisplace')
+
 def load_detail_config(char_prefix):
     # リポジトリルートを基点に設定ファイルを検索
     # apply_detail.py は blender_pipeline/scripts 内にあるため、3階層上がリポジトリルート
@@ -35,8 +45,27 @@ def load_detail_config(char_prefix):
         raise KeyError(f"'detail_config' セクションが設定ファイル ({config_source_path}) に見つかりません。config.json を確認してください。")
 
 
-def apply_to_collection(char_prefix):
-    settings = load_detail_config(char_prefix) # ここで config_source_path を受け取ることも可能
+def detail_texture(noise_scale):
+    """
+    ディスプレイス用の CLOUDS テクスチャを設定値ごとに1つだけ作り、全オブジェクトで共有する。
+    """
+    tex_name = f"DetailNoise_{noise_scale:g}"
+    tex = bpy.data.textures.get(tex_name)
+    if tex is None or tex.type != 'CLOUDS':
+        tex = bpy.data.textures.new(name=tex_name, type='CLOUDS')
+    tex.noise_scale = noise_scale
+    return tex
+
+def apply_to_collection(char_prefix, settings=None, bake=None):
+    """
+    コレクション '{char_prefix}Human' のメッシュに DetailBevel / DetailDisplace を追加する（既存なら設定を更新）。
+    bake（省略時は settings の 'bake'）が真なら、追加したモディファイアを評価済みメッシュから
+    1回でメッシュに適用し、後続のステージやエクスポートで再評価しないようにする。
+    """
+    if settings is None:
+        settings = load_detail_config(char_prefix) # ここで config_source_path を受け取ることも可能
+    if bake is None:
+        bake = settings.get('bake', False)
 
     # bevel 設定
     bevel_settings = settings.get('bevel', {})
@@ -55,42 +84,40 @@ def apply_to_collection(char_prefix):
     if not coll:
         raise ValueError(f"コレクション '{coll_name}' が見つかりません。detail 適用を中止します。")
 
-    print(f"Applying details to objects in collection: {coll_name}")
+    logger.info(f"Applying details to objects in collection: {coll_name}")
     object_count = 0
+    tex = detail_texture(noise_scale)
+    detailed = []
 
     # 各オブジェクトにモディファイアを追加
     for obj in coll.objects:
         if obj.type != 'MESH':
             continue
+
+        with tracing.span("apply_to_collection:object", object=obj.name):
+            logger.debug("  Processing object: %s", obj.name)
+            object_count +=1
+            detailed.append(obj)
+
+            # bevel モディファイア（既存の同名モディファイアがあれば設定を更新）
+            mod_b = obj.modifiers.get('DetailBevel') or obj.modifiers.new(name='DetailBevel', type='BEVEL')
+            mod_b.width = width
+            mod_b.segments = segments
         
-        print(f"  Processing object: {obj.name}")
-        object_count +=1
-
-        # bevel モディファイア
-        # 既存の同名モディファイアがあれば設定を更新、なければ新規作成する方が安全かもしれません
-        # (例: mod_b = obj.modifiers.get('DetailBevel') or obj.modifiers.new(name='DetailBevel', type='BEVEL'))
-        mod_b = obj.modifiers.new(name='DetailBevel', type='BEVEL')
-        mod_b.width = width
-        mod_b.segments = segments
-        
-        # displace モディファイア
-        mod_d = obj.modifiers.new(name='DetailDisplace', type='DISPLACE')
-        
-        # テクスチャの作成 (同名のテクスチャが既に存在する場合の処理も考慮するとより堅牢)
-        # (例: tex_name = f"DetailNoise_{obj.name}"; tex = bpy.data.textures.get(tex_name) or bpy.data.textures.new(name=tex_name, type='CLOUDS'))
-        tex_name = f"DetailNoise_{char_prefix}_{obj.name}" # オブジェクトごとにユニークなテクスチャ名にする
-        tex = bpy.data.textures.new(name=tex_name, type='CLOUDS')
-        
-        mod_d.texture = tex
-        mod_d.strength = strength
-        tex.noise_scale = noise_scale
+            # displace モディファイア（テクスチャは同じ設定のオブジェクトで共有）
+            mod_d = obj.modifiers.get('DetailDisplace') or obj.modifiers.new(name='DetailDisplace', type='DISPLACE')
+            mod_d.texture = tex
+            mod_d.strength = strength
 
     if object_count > 0:
         # どの設定ファイルが使われたか明確にするため、load_detail_config からパスも取得すると良いでしょう。
         # 例えば、 print(f"✓ Detail applied to {object_count} objects using settings from '{char_prefix}' (config: {actual_config_file_path}).")
-        print(f"✓ Detail applied to {object_count} objects using settings for '{char_prefix}'.")
+        logger.info(f"✓ Detail applied to {object_count} objects using settings for '{char_prefix}'.")
+        if bake:
+            with tracing.span("apply_to_collection:bake", objects=object_count):
+                bake_modifiers(detailed, DETAIL_MODIFIERS)
     else:
-        print(f"No mesh objects found in collection '{coll_name}'. Nothing to apply.")
+        logger.info(f"No mesh objects found in collection '{coll_name}'. Nothing to apply.")
 
 # スクリプトとして実行する場合のサンプル呼び出し (Blenderのテキストエディタから実行する場合など)
 # if __name__ == "__main__":
@@ -0,0 +1,305 @@
+# scripts/bake_deform.py
+"""
+Rigify のコントロールアニメーションをデフォームボーンにベイクする
+
+コントロールリグ（FK/IK コントロール + MCH/ORG の拘束）はエクスポーターがフレームごとに
+評価するため、長いクリップではエクスポート時間の大半を占める。
+bake_deform_actions() は各アクションのフレーム範囲を1回だけ評価し、
+デフォームボーン（use_deform）のアーマチュア空間の行列を配列に取り込んで、
+拘束を持たないデフォーム専用アーマチュア上のローカル変形（位置・クォータニオン・スケール）
+に NumPy で一括変換し、animation.write_action_curves で書き込む。
+
+prepare_deform_only_export() はメッシュの変形先をデフォーム専用アーマチュアに付け替え、
+コントロールリグと元のアクションをシーンから外す（エクスポート直前にのみ呼ぶ）。
+デフォーム専用でエクスポートしない場合は drop_baked_actions() でベイク結果を外す
+（prepare_export() がどちらかを呼ぶ）。
+ベイク済みアクションのカーブはコントロールリグにもある DEF- ボーンを対象にしているため、
+残したままだとエクスポーターがコントロールリグの追加クリップとして書き出してしまう。
+"""
+import bpy
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from logger import get_logger
+from animation import write_action_curves, add_nla_strips
+import tracing
+
+logger = get_logger('bake_deform')
+
+# デフォーム専用アーマチュアに記録する元のリグ名 / ベイク済みアクションに記録する元のアクション名
+DEFORM_OF_PROP = 'charactor_deform_of'
+BAKED_FROM_PROP = 'charactor_baked_from'
+
+# bpy.types.Keyframe.interpolation の 'LINEAR'
+INTERPOLATION_LINEAR = 1
+
+def _matrices(collection, prop, count):
+    """
+    foreach_get で行列プロパティを (count, 4, 4) の配列として取り出す。
+    RNA の行列は列優先で並ぶため転置して行優先にそろえる。
+    """
+    buf = np.empty(count * 16, dtype=np.float32)
+    collection.foreach_get(prop, buf)
+    return buf.reshape(count, 4, 4).transpose(0, 2, 1).astype(np.float64)
+
+def create_deform_armature(rig):
+    """
+    rig のデフォームボーンだけを持つ拘束なしのアーマチュアを作る。
+    各ボーンの親は最も近いデフォームボーンの祖先に付け替え、継承はすべて有効にする。
+    シーンにはリンクせず use_fake_user で保持する。
+    戻り値: (アーマチュアオブジェクト, {ボーン名: 親ボーン名 または None})
+    """
+    name = f"{rig.name}_deform"
+    old = bpy.data.objects.get(name)
+    if old:
+        old_data = old.data
+        bpy.data.objects.remove(old, do_unlink=True)
+        if old_data and old_data.users == 0:
+            bpy.data.armatures.remove(old_data)
+
+    data = rig.data.copy()
+    data.name = name
+    deform = bpy.data.objects.new(name, data)
+    deform.matrix_world = rig.matrix_world.copy()
+    deform[DEFORM_OF_PROP] = rig.name
+    deform.use_fake_user = True
+
+    # 編集モードに入るため一時的にシーンへリンクする
+    bpy.context.scene.collection.objects.link(deform)
+    if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+    deform.select_set(True)
+    bpy.context.view_layer.objects.active = deform
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    edit_bones = data.edit_bones
+    keep = {b.name for b in edit_bones if b.use_deform}
+    parents = {}
+    for bone in edit_bones:
+        if bone.name not in keep:
+            continue
+        parent = bone.parent
+        while parent and parent.name not in keep:
+            parent = parent.parent
+        parents[bone.name] = parent.name if parent else None
+    for bone in list(edit_bones):
+        if bone.name not in keep:
+            edit_bones.remove(bone)
+    for bone in edit_bones:
+        bone.use_connect = False
+        bone.parent = edit_bones[parents[bone.name]] if parents[bone.name] else None
+        bone.use_inherit_rotation = True
+        bone.inherit_scale = 'FULL'
+        bone.use_local_location = True
+    bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.context.scene.collection.objects.unlink(deform)
+
+    for pose_bone in deform.pose.bones:
+        while pose_bone.constraints:
+            pose_bone.constraints.remove(pose_bone.constraints[0])
+        pose_bone.rotation_mode = 'QUATERNION'
+    return deform, parents
+
+def _rest_relative_inverse(deform, bone_names, parents):
+    """各ボーンの (親の rest 行列^-1 · 自身の rest 行列)^-1（親がなければ rest 行列^-1）"""
+    bones = deform.data.bones
+    rest = _matrices(bones, 'matrix_local', len(bones))
+    index = {b.name: i for i, b in enumerate(bones)}
+    own = rest[[index[n] for n in bone_names]]
+    parent_rest = np.array([rest[index[parents[n]]] if parents[n] else np.eye(4) for n in bone_names])
+    return np.linalg.inv(np.linalg.inv(parent_rest) @ own)
+
+def matrix_to_quaternion(m):
+    """回転行列 (..., 3, 3) を正規化したクォータニオン (..., 4) [w, x, y, z] に変換する"""
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    q = np.empty(m.shape[:-2] + (4,))
+    q[..., 0] = 0.5 * np.sqrt(np.maximum(0.0, 1.0 + m00 + m11 + m22))
+    q[..., 1] = 0.5 * np.sqrt(np.maximum(0.0, 1.0 + m00 - m11 - m22))
+    q[..., 2] = 0.5 * np.sqrt(np.maximum(0.0, 1.0 - m00 + m11 - m22))
+    q[..., 3] = 0.5 * np.sqrt(np.maximum(0.0, 1.0 - m00 - m11 + m22))
+    q[..., 1] = np.copysign(q[..., 1], m[..., 2, 1] - m[..., 1, 2])
+    q[..., 2] = np.copysign(q[..., 2], m[..., 0, 2] - m[..., 2, 0])
+    q[..., 3] = np.copysign(q[..., 3], m[..., 1, 0] - m[..., 0, 1])
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+def decompose(basis):
+    """
+    ローカル変形行列 (F, B, 4, 4) を位置 (F, B, 3)・クォータニオン (F, B, 4)・スケール (F, B, 3) に分解する。
+    クォータニオンはフレーム間で符号が反転しないようにそろえる。
+    """
+    location = basis[..., :3, 3]
+    linear = basis[..., :3, :3]
+    scale = np.linalg.norm(linear, axis=-2)
+    rotation = matrix_to_quaternion(linear / np.where(scale > 1e-12, scale, 1.0)[..., None, :])
+    if len(rotation) > 1:
+        dots = np.sum(rotation[1:] * rotation[:-1], axis=-1)
+        rotation[1:] *= np.cumprod(np.where(dots < 0, -1.0, 1.0), axis=0)[..., None]
+    return location, rotation, scale
+
+def sample_pose(rig, bone_indices, frames):
+    """フレームごとに rig を評価し、指定ボーンのアーマチュア空間の行列 (F, B, 4, 4) を返す"""
+    scene = bpy.context.scene
+    pose_bones = rig.pose.bones
+    count = len(pose_bones)
+    buf = np.empty(count * 16, dtype=np.float32)
+    result = np.empty((len(frames), len(bone_indices), 4, 4))
+    for i, frame in enumerate(frames):
+        scene.frame_set(int(frame))
+        pose_bones.foreach_get('matrix', buf)
+        result[i] = buf.reshape(count, 4, 4)[bone_indices].transpose(0, 2, 1)
+    return result
+
+def bake_action(rig, action, deform, bone_names, parents, rest_relative_inv):
+    """1アクション分をベイクし、デフォーム専用アーマチュア用のアクションを返す"""
+    start, end = (int(round(f)) for f in action.frame_range)
+    frames = np.arange(start, end + 1)
+    rig_index = {b.name: i for i, b in enumerate(rig.pose.bones)}
+
+    rig.animation_data.action = action
+    with tracing.span("bake_deform:sample", action=action.name, frames=len(frames)):
+        world = sample_pose(rig, [rig_index[n] for n in bone_names], frames)
+
+    with tracing.span("bake_deform:solve", action=action.name):
+        # 親（なければ単位行列）からの相対行列を rest 基準のローカル変形に直す
+        parent_slot = np.array([bone_names.index(parents[n]) if parents[n] else len(bone_names)
+                                for n in bone_names])
+        extended = np.concatenate([world, np.broadcast_to(np.eye(4), (len(frames), 1, 4, 4))], axis=1)
+        local = np.linalg.inv(extended[:, parent_slot]) @ world
+        location, rotation, scale = decompose(rest_relative_inv[None] @ local)
+
+    frames = frames.astype(np.float32)
+    curves = {}
+    for b, name in enumerate(bone_names):
+        for prop, values in (('location', location), ('rotation_quaternion', rotation), ('scale', scale)):
+            for index in range(values.shape[-1]):
+                curves[(f'pose.bones["{name}"].{prop}', index)] = (frames, values[:, b, index].astype(np.float32))
+
+    baked_name = f"{action.name}_deform"
+    baked = bpy.data.actions.get(baked_name)
+    if baked:
+        bpy.data.actions.remove(baked)
+    baked = bpy.data.actions.new(baked_name)
+    baked.use_fake_user = True
+    baked[BAKED_FROM_PROP] = action.name
+    with tracing.span("bake_deform:write", action=action.name, curves=len(curves)):
+        write_action_curves(baked, curves, interpolation=INTERPOLATION_LINEAR)
+    return baked
+
+def rig_actions(rig):
+    """rig のボーンをアニメーションするローカルのアクション（ベイク済みを除く）"""
+    bone_names = {b.name for b in rig.pose.bones}
+    actions = []
+    for action in bpy.data.actions:
+        if action.library is not None or action.get(BAKED_FROM_PROP):
+            continue
+        if any(fc.data_path.startswith('pose.bones["') and fc.data_path.split('"')[1] in bone_names
+               for fc in action.fcurves):
+            actions.append(action)
+    return actions
+
+def bake_deform_actions(rig, actions=None):
+    """
+    rig の各アクションをデフォーム専用アーマチュアにベイクする。
+    戻り値: (デフォーム専用アーマチュア, {元のアクション名: ベイク済みアクション})
+    """
+    actions = rig_actions(rig) if actions is None else actions
+    deform, parents = create_deform_armature(rig)
+    bone_names = list(parents)
+    rest_relative_inv = _rest_relative_inverse(deform, bone_names, parents)
+
+    if not rig.animation_data:
+        rig.animation_data_create()
+    anim = rig.animation_data
+    saved = (anim.action, [(t, t.mute) for t in anim.nla_tracks], bpy.context.scene.frame_current)
+    # ベイク中はメッシュの評価を止める（リグの姿勢だけを評価すればよい）
+    hidden = [o for o in bpy.context.scene.objects if o.type == 'MESH' and not o.hide_viewport]
+    for obj in hidden:
+        obj.hide_viewport = True
+    for track, _ in saved[1]:
+        track.mute = True
+    try:
+        baked = {}
+        for action in actions:
+            baked[action.name] = bake_action(rig, action, deform, bone_names, parents, rest_relative_inv)
+            logger.info(f"✓ {action.name}: デフォームボーン {len(bone_names)} 本を "
+                        f"{int(action.frame_range[1] - action.frame_range[0]) + 1} フレーム分ベイクしました。")
+    finally:
+        anim.action = saved[0]
+        for track, mute in saved[1]:
+            track.mute = mute
+        for obj in hidden:
+            obj.hide_viewport = False
+        bpy.context.scene.frame_set(saved[2])
+
+    add_nla_strips(deform, {name: action for name, action in baked.items()})
+    return deform, baked
+
+def prepare_deform_only_export():
+    """
+    エクスポートをデフォーム専用アーマチュアとベイク済みアクションだけで行えるようにする:
+    メッシュのアーマチュアモディファイアと親を付け替え、コントロールリグ・メタリグ・
+    ベイク元のアクションを削除し、ベイク済みアクションを元の名前に戻す。
+    保存後（またはエクスポート用の別プロセス）でのみ呼ぶこと。
+    """
+    deform = next((o for o in bpy.data.objects if o.get(DEFORM_OF_PROP)), None)
+    if not deform:
+        raise RuntimeError("デフォーム専用アーマチュアがありません。bake ステージを有効にしてください。")
+    rig = bpy.data.objects.get(deform[DEFORM_OF_PROP])
+    scene = bpy.context.scene
+    if deform.name not in scene.objects:
+        scene.collection.objects.link(deform)
+
+    for obj in scene.objects:
+        if obj.type != 'MESH':
+            continue
+        for mod in obj.modifiers:
+            if mod.type == 'ARMATURE' and mod.object == rig:
+                mod.object = deform
+        if rig and obj.parent == rig:
+            world = obj.matrix_world.copy()
+            obj.parent = deform
+            obj.matrix_world = world
+
+    for obj in [o for o in scene.objects if o.type == 'ARMATURE' and o != deform]:
+        bpy.data.objects.remove(obj, do_unlink=True)
+
+    baked = [a for a in bpy.data.actions if a.get(BAKED_FROM_PROP)]
+    for action in baked:
+        source = bpy.data.actions.get(action[BAKED_FROM_PROP])
+        if source:
+            bpy.data.actions.remove(source)
+    # NLA トラックとストリップは bake_deform_actions で元の名前になっている
+    for action in baked:
+        action.name = action[BAKED_FROM_PROP]
+    logger.info(f"✓ デフォーム専用アーマチュア '{deform.name}' とベイク済みアクション {len(baked)} 個でエクスポートします。")
+    return deform
+
+def drop_baked_actions():
+    """
+    ベイク済みアクションとデフォーム専用アーマチュアを削除する（コントロールリグのままエクスポートする場合）。
+    保存後（またはエクスポート用の別プロセス）でのみ呼ぶこと。
+    戻り値: 削除したアクションの数
+    """
+    baked = [a for a in bpy.data.actions if a.get(BAKED_FROM_PROP)]
+    for action in baked:
+        bpy.data.actions.remove(action)
+    for obj in [o for o in bpy.data.objects if o.get(DEFORM_OF_PROP)]:
+        data = obj.data
+        bpy.data.objects.remove(obj, do_unlink=True)
+        if data and data.users == 0:
+            bpy.data.armatures.remove(data)
+    if baked:
+        logger.info(f"✓ コントロールリグでエクスポートするため、ベイク済みアクション {len(baked)} 個を外しました。")
+    return len(baked)
+
+def prepare_export(deform_only=False):
+    """エクスポート直前に呼び、deform_only なら prepare_deform_only_export、それ以外は drop_baked_actions を行う"""
+    if deform_only:
+        return prepare_deform_only_export()
+    drop_baked_actions()
+    return None
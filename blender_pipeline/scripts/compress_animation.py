@@ -0,0 +1,245 @@
+# scripts/compress_animation.py
+"""
+アニメーションカーブの圧縮（エクスポート前の冗長キー・定数カーブの削除）
+
+- 前後のキーから補間できるキーを許容誤差の範囲で削除する
+  （Ramer-Douglas-Peucker で候補を選び、書き戻した F カーブを元のカーブと比較して
+  許容誤差を超えたフレームのキーを戻す）
+- 全キーが許容誤差内で一定のカーブは、値がプロパティの既定値なら削除し、
+  そうでなければキー1つにまとめる
+- アクションごとに削減前後のキー数と、回転・位置・スケールの最大誤差を返す
+- 書き戻しはキー全体に同じ補間・自動ハンドルを使うため、補間が混在するカーブや
+  自動以外のハンドル（手で調整したベジェ）を持つカーブは対象外にする。
+  検証でキーが全て戻った場合は元のカーブをそのまま復元する
+"""
+import bpy
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from logger import get_logger
+from animation import write_action_curves, INTERPOLATION_BEZIER
+import tracing
+
+logger = get_logger('compress_animation')
+
+# 既定の許容誤差
+DEFAULT_TOLERANCES = {
+    'angle_deg': 0.1,    # 回転 (度)
+    'location': 0.0005,  # 位置 (m)
+    'scale': 0.001,      # スケール
+}
+
+# 許容誤差の書き戻し後の検証で、キーを戻して再試行する最大回数
+MAX_REFINE_PASSES = 4
+
+# 書き戻しで再計算しても形が変わらないハンドルの種類（foreach_get で得られる列挙値）
+_HANDLE_TYPES = bpy.types.Keyframe.bl_rna.properties['handle_left_type'].enum_items
+AUTO_HANDLE_TYPES = (_HANDLE_TYPES['AUTO'].value, _HANDLE_TYPES['AUTO_CLAMPED'].value)
+
+# 復元のために退避するキーのプロパティ: (名前, 成分数, dtype)
+KEY_PROPERTIES = (
+    ('co', 2, np.float32), ('handle_left', 2, np.float32), ('handle_right', 2, np.float32),
+    ('interpolation', 1, np.int32), ('easing', 1, np.int32),
+    ('handle_left_type', 1, np.int32), ('handle_right_type', 1, np.int32),
+)
+
+def channel_kind(data_path):
+    """data_path の末尾のプロパティから 'rotation' / 'location' / 'scale' を返す（それ以外は None）"""
+    prop = data_path.rsplit('.', 1)[-1]
+    if prop.startswith('rotation_'):
+        return 'rotation'
+    if prop in ('location', 'scale'):
+        return prop
+    return None
+
+def channel_tolerance(data_path, tolerances):
+    kind = channel_kind(data_path)
+    if kind == 'rotation':
+        angle = math.radians(tolerances['angle_deg'])
+        # クォータニオンの成分は回転角の半分の正弦で変化する
+        return math.sin(angle / 2) if data_path.endswith('rotation_quaternion') else angle
+    if kind:
+        return tolerances[kind]
+    return None
+
+def default_value(data_path, index):
+    """プロパティの既定値（定数カーブを削除できる値）。不明なプロパティは None"""
+    prop = data_path.rsplit('.', 1)[-1]
+    if prop == 'scale':
+        return 1.0
+    if prop == 'rotation_quaternion':
+        return 1.0 if index == 0 else 0.0
+    if prop == 'rotation_axis_angle':
+        # (角度, X, Y, Z) の既定値は (0, 0, 1, 0)
+        return 1.0 if index == 2 else 0.0
+    if prop in ('location', 'rotation_euler'):
+        return 0.0
+    return None
+
+def rdp_keep(frames, values, tolerance):
+    """
+    線形補間で tolerance 以内に再現できるキーを除いた、残すキーのマスクを返す。
+    先頭と末尾のキーは常に残す。
+    """
+    count = len(frames)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        t = (frames[a + 1:b] - frames[a]) / (frames[b] - frames[a])
+        error = np.abs(values[a + 1:b] - (values[a] + t * (values[b] - values[a])))
+        i = int(np.argmax(error))
+        if error[i] > tolerance:
+            m = a + 1 + i
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return keep
+
+def snapshot_keys(fc):
+    """キーのプロパティを {名前: 配列} で退避する"""
+    count = len(fc.keyframe_points)
+    keys = {}
+    for name, width, dtype in KEY_PROPERTIES:
+        keys[name] = np.empty(count * width, dtype=dtype)
+        fc.keyframe_points.foreach_get(name, keys[name])
+    return keys
+
+def restore_keys(action, fc, keys):
+    """snapshot_keys で退避したキーでカーブを書き直す"""
+    co = keys['co']
+    (fc,) = write_action_curves(action, {(fc.data_path, fc.array_index): (co[0::2], co[1::2])})
+    # ハンドルの種類を先に設定してから座標を戻す（種類の設定でハンドルが再計算されるため）
+    for name in ('interpolation', 'easing', 'handle_left_type', 'handle_right_type', 'handle_left', 'handle_right'):
+        fc.keyframe_points.foreach_set(name, keys[name])
+    return fc
+
+def rewritable(keys):
+    """補間が1種類で、ベジェなら自動ハンドルだけのカーブか（書き戻しで同じ形を再現できるか）"""
+    interpolation = keys['interpolation']
+    if np.any(interpolation != interpolation[0]):
+        return False
+    if interpolation[0] != INTERPOLATION_BEZIER:
+        return True
+    return all(np.isin(keys[name], AUTO_HANDLE_TYPES).all() for name in ('handle_left_type', 'handle_right_type'))
+
+def sample_frames(frames):
+    """元のカーブを比較するフレーム（キーのフレームと、その間の整数フレーム）"""
+    return np.union1d(frames, np.arange(math.ceil(frames[0]), math.floor(frames[-1]) + 1, dtype=np.float32))
+
+def evaluate(fc, frames):
+    return np.fromiter((fc.evaluate(f) for f in frames), dtype=np.float64, count=len(frames))
+
+def compress_curve(action, fc, tolerances):
+    """
+    1本の F カーブを圧縮する。
+    戻り値: (削減前キー数, 削減後キー数, 最大誤差, 種類)。削除したカーブは削減後 0。
+    最大誤差はカーブの値の単位（クォータニオン成分の場合も成分の差）。
+    """
+    data_path, index = fc.data_path, fc.array_index
+    tolerance = channel_tolerance(data_path, tolerances)
+    before = len(fc.keyframe_points)
+    kind = channel_kind(data_path)
+    if tolerance is None or before < 2 or fc.modifiers:
+        return before, before, 0.0, kind
+
+    keys = snapshot_keys(fc)
+    if not rewritable(keys):
+        return before, before, 0.0, kind
+    frames, values = keys['co'][0::2].copy(), keys['co'][1::2].copy()
+    interpolation = int(keys['interpolation'][0])
+    samples = sample_frames(frames)
+    original = evaluate(fc, samples)
+
+    # 定数カーブ
+    if np.ptp(original) <= tolerance:
+        default = default_value(data_path, index)
+        if default is not None and np.max(np.abs(original - default)) <= tolerance:
+            action.fcurves.remove(fc)
+            return before, 0, float(np.max(np.abs(original - default))), kind
+        keep = np.zeros(before, dtype=bool)
+        keep[0] = True
+    else:
+        keep = rdp_keep(frames, values, tolerance)
+
+    if keep.all():
+        return before, before, 0.0, kind
+
+    # 書き戻した結果を元のカーブと比較し、超えた区間のキーを戻す
+    for _ in range(MAX_REFINE_PASSES):
+        (fc,) = write_action_curves(action, {(data_path, index): (frames[keep], values[keep])},
+                                    interpolation=interpolation)
+        error = np.abs(evaluate(fc, samples) - original)
+        bad = samples[error > tolerance]
+        if len(bad) == 0:
+            break
+        # 許容誤差を超えたサンプルに最も近い元のキーを戻す
+        nearest = np.abs(frames[:, None] - bad[None, :]).argmin(axis=0)
+        keep[nearest] = True
+        if keep.all():
+            # 全キーが必要なら、作り直したカーブではなく元のカーブに戻す
+            restore_keys(action, fc, keys)
+            return before, before, 0.0, kind
+    else:
+        (fc,) = write_action_curves(action, {(data_path, index): (frames[keep], values[keep])},
+                                    interpolation=interpolation)
+        error = np.abs(evaluate(fc, samples) - original)
+        if error.max() > tolerance:
+            restore_keys(action, fc, keys)
+            return before, before, 0.0, kind
+
+    return before, int(keep.sum()), float(error.max()), kind
+
+def compress_action(action, tolerances=None):
+    """
+    アクションの全 F カーブを圧縮し、結果を返す。
+    戻り値: {'curves_before', 'curves_after', 'keys_before', 'keys_after',
+             'max_error': {'rotation_deg', 'location', 'scale'}}
+    """
+    tolerances = dict(DEFAULT_TOLERANCES, **(tolerances or {}))
+    report = {
+        'curves_before': len(action.fcurves), 'curves_after': 0,
+        'keys_before': 0, 'keys_after': 0,
+        'max_error': {'rotation_deg': 0.0, 'location': 0.0, 'scale': 0.0},
+    }
+    with tracing.span("compress_action", action=action.name):
+        for fc in list(action.fcurves):
+            # compress_curve はカーブを作り直す・削除するため、先にパスを取っておく
+            data_path = fc.data_path
+            before, after, error, kind = compress_curve(action, fc, tolerances)
+            report['keys_before'] += before
+            report['keys_after'] += after
+            if kind == 'rotation':
+                if data_path.endswith('rotation_quaternion'):
+                    # 成分の誤差を回転角に換算する
+                    error = 2 * math.asin(min(1.0, error))
+                report['max_error']['rotation_deg'] = max(report['max_error']['rotation_deg'], math.degrees(error))
+            elif kind:
+                report['max_error'][kind] = max(report['max_error'][kind], error)
+    report['curves_after'] = len(action.fcurves)
+    return report
+
+def compress_animations(tolerances=None, actions=None):
+    """
+    ローカルの全アクション（actions 指定時はそのアクション）を圧縮し、
+    {アクション名: compress_action の結果} を返す。
+    """
+    actions = actions if actions is not None else [a for a in bpy.data.actions if a.library is None]
+    results = {}
+    for action in actions:
+        report = compress_action(action, tolerances)
+        results[action.name] = report
+        ratio = report['keys_after'] / report['keys_before'] if report['keys_before'] else 1.0
+        error = report['max_error']
+        logger.info(f"✓ {action.name}: キー {report['keys_before']} → {report['keys_after']} ({ratio:.0%}), "
+                    f"Fカーブ {report['curves_before']} → {report['curves_after']}, "
+                    f"最大誤差 回転 {error['rotation_deg']:.4f}° / 位置 {error['location']:.5f}m / スケール {error['scale']:.5f}")
+    return results
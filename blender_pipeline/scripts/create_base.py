@@ -1,148 +1,268 @@
 # scripts/gen_base.py
+"""
+素体メッシュ（胴体・頭・両腕・両脚）の生成
+
+各パーツの頂点と面、ループごとの UV を NumPy 配列で組み立て、メッシュデータに foreach_set で直接書き込む。
+オペレーター（primitive_*_add / origin_set）を使わないため、コンテキストに依存せず
+バックグラウンド実行でも同じ結果になり、1ファイル内で大量の体型バリエーションを生成できる。
+
+  build_body('Var01_', height=1.45, proportions={'head_radius': 0.26})
+
+プロポーションは BODY_PROPORTIONS と同じ相対単位で指定し、全体は足元 z=0 から
+頭頂が height になるように拡大縮小する。各オブジェクトの原点はパーツの中心に置く。
+"""
 import bpy
-import math
 import sys
+import os
 import argparse
+from functools import lru_cache
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
 
-def get_3d_view_context():
+logger = get_logger('create_base')
+
+DEFAULT_HEIGHT = 1.58
+
+# パーツの寸法（相対単位。全体の高さで正規化する）
+#   arm_offset: 体の中心から腕の中心までの距離 / arm_drop: 胴体上面から肩の高さまでの距離
+#   leg_offset: 体の中心から脚の中心までの距離 / leg_overlap: 脚が胴体にめり込む長さ
+BODY_PROPORTIONS = {
+    'torso_radius': 0.2, 'torso_length': 1.2,
+    'head_radius': 0.2,
+    'arm_radius': 0.05, 'arm_length': 1.0, 'arm_offset': 0.45, 'arm_drop': 0.3,
+    'leg_radius': 0.07, 'leg_length': 1.4, 'leg_offset': 0.15, 'leg_overlap': 0.1,
+}
+
+# 分割数の既定値（primitive_*_add の既定値と同じ）
+#   segments: 円周方向の分割数 / rings: 頭の緯度方向の分割数 / length_segments: 円柱の長さ方向の分割数
+DEFAULT_SEGMENTS = {'segments': 32, 'rings': 16, 'length_segments': 1}
+
+@lru_cache(maxsize=None)
+def cylinder_topology(segments, length_segments):
     """
-    VIEW_3D エリア／リージョンを探して
-    override 用のコンテキスト辞書を返します。
-    バックグラウンド実行時はそのまま現在のコピーを返します。
+    円柱の面（側面の四角形 + 上下の N 角形）を、ループの頂点番号の並びと面ごとの頂点数で返す。
+    頂点は下の輪から順に、各輪 segments 個。
     """
-    for window in bpy.context.window_manager.windows:
-        for area in window.screen.areas:
-            if area.type == 'VIEW_3D':
-                for region in area.regions:
-                    if region.type == 'WINDOW':
-                        return {
-                            "window": window,
-                            "screen": window.screen,
-                            "area": area,
-                            "region": region,
-                            "scene": bpy.context.scene,
-                            "blend_data": bpy.context.blend_data,
-                            "view_layer": bpy.context.view_layer,
-                        }
-    return bpy.context.copy()
-
-def generate_base(prefix):
-    # 1. シーンを空にリセット
-    bpy.ops.wm.read_factory_settings(use_empty=True)
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    base = (np.arange(length_segments) * segments)[:, None]
+    quads = np.stack([base + i, base + j, base + segments + j, base + segments + i], axis=-1)
+    bottom = i[::-1]
+    top = length_segments * segments + i
+    loops = np.concatenate([quads.ravel(), bottom, top]).astype(np.int32)
+    sizes = np.concatenate([np.full(quads.shape[0] * quads.shape[1], 4), [segments, segments]]).astype(np.int32)
+    return loops, sizes
+
+@lru_cache(maxsize=None)
+def cylinder_uvs(segments, length_segments):
+    """
+    cylinder_topology のループ順の UV (L, 2)。primitive_cylinder_add と同じく、
+    側面を下半分（v 0〜0.5）に展開し、上下の面を上半分の2つの円に置く。
+    """
+    u = np.arange(segments + 1) / segments
+    v = 0.5 * np.arange(length_segments + 1) / length_segments
+    i = np.arange(segments)
+    r = np.arange(length_segments)[:, None]
+    quads = np.stack([np.stack(np.broadcast_arrays(u[i], v[r]), axis=-1),
+                      np.stack(np.broadcast_arrays(u[i + 1], v[r]), axis=-1),
+                      np.stack(np.broadcast_arrays(u[i + 1], v[r + 1]), axis=-1),
+                      np.stack(np.broadcast_arrays(u[i], v[r + 1]), axis=-1)], axis=-2)
+    angles = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    circle = 0.25 * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    # 下の面は下から見て裏返らないように V を反転する
+    bottom = (np.array([0.75, 0.75]) + circle * (1.0, -1.0))[::-1]
+    top = np.array([0.25, 0.75]) + circle
+    return np.concatenate([quads.reshape(-1, 2), bottom, top]).astype(np.float32)
+
+def cylinder_arrays(radius, depth, segments=32, length_segments=1):
+    """Z 軸方向・中心が原点の円柱。戻り値: (頂点 (N, 3), ループの頂点番号, 面ごとの頂点数, ループの UV (L, 2))"""
+    angles = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    ring = radius * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    heights = np.linspace(-depth / 2, depth / 2, length_segments + 1)
+    verts = np.empty(((length_segments + 1) * segments, 3), dtype=np.float32)
+    verts[:, :2] = np.tile(ring, (length_segments + 1, 1))
+    verts[:, 2] = np.repeat(heights, segments)
+    return (verts,) + cylinder_topology(segments, length_segments) + (cylinder_uvs(segments, length_segments),)
+
+@lru_cache(maxsize=None)
+def uv_sphere_topology(segments, rings):
+    """
+    UV 球の面（極の三角形 + 間の四角形）を返す。
+    頂点は上の極、上から順に rings - 1 本の輪（各 segments 個）、下の極の順。
+    """
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    bottom_pole = 1 + (rings - 1) * segments
+    upper = (1 + np.arange(rings - 2) * segments)[:, None]
+    top = np.stack([np.zeros(segments, dtype=int), 1 + i, 1 + j], axis=-1)
+    quads = np.stack([upper + i, upper + segments + i, upper + segments + j, upper + j], axis=-1)
+    last = bottom_pole - segments
+    bottom = np.stack([last + i, np.full(segments, bottom_pole), last + j], axis=-1)
+    loops = np.concatenate([top.ravel(), quads.ravel(), bottom.ravel()]).astype(np.int32)
+    sizes = np.concatenate([np.full(segments, 3), np.full(quads.shape[0] * segments, 4),
+                            np.full(segments, 3)]).astype(np.int32)
+    return loops, sizes
+
+@lru_cache(maxsize=None)
+def uv_sphere_uvs(segments, rings):
+    """
+    uv_sphere_topology のループ順の UV (L, 2)。u は経度（継ぎ目で 0 と 1 に分かれる）、
+    v は緯度（上の極が 1）で、極の三角形では極の u を両隣の中間に置く。
+    """
+    u = np.arange(segments + 1) / segments
+    v = 1.0 - np.arange(rings + 1) / rings
+    i = np.arange(segments)
+    mid = (i + 0.5) / segments
 
-    # 2. 胴体（Torso）を Cylinder で作成
-    bpy.ops.mesh.primitive_cylinder_add(radius=0.2, depth=1.2, location=(0, 0, 0.9))
-    torso = bpy.context.view_layer.objects.active
-    torso.name = f"{prefix}Torso"
-
-    # 3. 頭部（Head）を UV Sphere で追加
-    head_radius = 0.2
-    top_of_torso = torso.location.z + (1.2 / 2) # torsoの上面のZ座標
-    bpy.ops.mesh.primitive_uv_sphere_add(
-        radius=head_radius,
-        location=(0, 0, top_of_torso + head_radius)
-    )
-    head = bpy.context.view_layer.objects.active
-    head.name = f"{prefix}Head"
-
-    # 4. 腕（Arms）を両腕シリンダーで追加
-    # side = +1 をキャラクターの右側 (X軸プラス方向)
-    # side = -1 をキャラクターの左側 (X軸マイナス方向) と想定
-    print("--- Generating Arms ---")
-    for side in (+1, -1):
-        location_x = side * 0.45 # 胴体の中心からX軸方向に離れた位置
-        bpy.ops.mesh.primitive_cylinder_add(
-            radius=0.05, depth=1.0,
-            location=(location_x, 0, 1.2), # Y軸中心、Zは胴体と同じ高さあたり
-            rotation=(0, math.radians(90), 0) # Y軸周りに90度回転して横向きに
-        )
-        arm = bpy.context.view_layer.objects.active
-        # sideが+1なら'R'、-1なら'L'
-        suffix = 'R' if side > 0 else 'L'
-        arm.name = f"{prefix}Arm_{suffix}"
-        print(f"  Generated: {arm.name}, SideVal: {side}, LocationX: {arm.location.x}, Suffix: {suffix}")
-
-
-    # 5. 脚（Legs）を両脚シリンダーで追加
-    # side = +1 をキャラクターの右側 (X軸プラス方向)
-    # side = -1 をキャラクターの左側 (X軸マイナス方向) と想定
-    print("--- Generating Legs ---")
-    for side in (+1, -1):
-        location_x = side * 0.15 # 胴体の中心からX軸方向に少し離れた位置
-        bpy.ops.mesh.primitive_cylinder_add(
-            radius=0.07, depth=1.4,
-            location=(location_x, 0, 0) # 脚の付け根が原点近くに来るように調整 (0.7から変更)
-                                        # あとで胴体と合わせるか、初期位置を調整
-        )
-        leg = bpy.context.view_layer.objects.active
-        # sideが+1なら'R'、-1なら'L'
-        suffix = 'R' if side > 0 else 'L'
-        leg.name = f"{prefix}Leg_{suffix}"
-        print(f"  Generated: {leg.name}, SideVal: {side}, LocationX: {leg.location.x}, Suffix: {suffix}")
-        # 脚の初期位置を胴体の下部に合わせる (例)
-        leg.location.z = torso.location.z - (1.2 / 2) - (1.4 / 2) + 0.1 # 微調整値
-
-
-    # 6. コレクションを作成して移動
+    def corner(us, k):
+        return np.stack(np.broadcast_arrays(us, v[k]), axis=-1)
+
+    top = np.stack([corner(mid, 0), corner(u[i], 1), corner(u[i + 1], 1)], axis=-2)
+    k = np.arange(1, rings - 1)[:, None]
+    quads = np.stack([corner(u[i], k), corner(u[i], k + 1), corner(u[i + 1], k + 1), corner(u[i + 1], k)], axis=-2)
+    bottom = np.stack([corner(u[i], rings - 1), corner(mid, rings), corner(u[i + 1], rings - 1)], axis=-2)
+    return np.concatenate([top.reshape(-1, 2), quads.reshape(-1, 2), bottom.reshape(-1, 2)]).astype(np.float32)
+
+def uv_sphere_arrays(radius, segments=32, rings=16):
+    """中心が原点の UV 球。戻り値: (頂点 (N, 3), ループの頂点番号, 面ごとの頂点数, ループの UV (L, 2))"""
+    angles = np.linspace(0.0, 2.0 * np.pi, segments, endpoint=False)
+    theta = np.pi * np.arange(1, rings) / rings
+    verts = np.empty((2 + (rings - 1) * segments, 3), dtype=np.float32)
+    verts[0] = (0.0, 0.0, radius)
+    verts[-1] = (0.0, 0.0, -radius)
+    verts[1:-1, 0] = (radius * np.sin(theta)[:, None] * np.cos(angles)).ravel()
+    verts[1:-1, 1] = (radius * np.sin(theta)[:, None] * np.sin(angles)).ravel()
+    verts[1:-1, 2] = np.repeat(radius * np.cos(theta), segments)
+    return (verts,) + uv_sphere_topology(segments, rings) + (uv_sphere_uvs(segments, rings),)
+
+def _along_x(verts):
+    """Z 軸方向のパーツを Y 軸周りに 90° 回転して X 軸方向にする"""
+    return np.stack([verts[:, 2], verts[:, 1], -verts[:, 0]], axis=1)
+
+def body_parts(height=DEFAULT_HEIGHT, proportions=None, segments=None):
+    """
+    素体の各パーツを NumPy 配列で組み立てる（bpy を使わない）。
+    proportions / segments は BODY_PROPORTIONS / DEFAULT_SEGMENTS の一部だけ指定してもよい。
+    戻り値: [(パーツ名, 中心座標, 頂点 (N, 3), ループの頂点番号, 面ごとの頂点数, ループの UV (L, 2)), ...]
+    """
+    p = dict(BODY_PROPORTIONS, **(proportions or {}))
+    seg = dict(DEFAULT_SEGMENTS, **(segments or {}))
+    unknown = set(p) - set(BODY_PROPORTIONS)
+    if unknown:
+        raise ValueError(f"不明なプロポーションのキー: {sorted(unknown)}")
+
+    # 相対単位での配置（足元を z=0 とする）
+    hip = p['leg_length'] - p['leg_overlap']
+    torso_top = hip + p['torso_length']
+    total = torso_top + 2 * p['head_radius']
+    scale = height / total
+
+    circle, length = seg['segments'], seg['length_segments']
+    parts = [
+        ('Torso', (0.0, 0.0, hip + p['torso_length'] / 2),
+         cylinder_arrays(p['torso_radius'], p['torso_length'], circle, length)),
+        ('Head', (0.0, 0.0, torso_top + p['head_radius']),
+         uv_sphere_arrays(p['head_radius'], circle, seg['rings'])),
+    ]
+    # side = +1 をキャラクターの右側 (X軸プラス方向)、-1 を左側とする
+    for side, suffix in ((+1, 'R'), (-1, 'L')):
+        verts, loops, sizes, uvs = cylinder_arrays(p['arm_radius'], p['arm_length'], circle, length)
+        parts.append((f'Arm_{suffix}', (side * p['arm_offset'], 0.0, torso_top - p['arm_drop']),
+                      (_along_x(verts), loops, sizes, uvs)))
+    for side, suffix in ((+1, 'R'), (-1, 'L')):
+        parts.append((f'Leg_{suffix}', (side * p['leg_offset'], 0.0, p['leg_length'] / 2),
+                      cylinder_arrays(p['leg_radius'], p['leg_length'], circle, length)))
+
+    return [(name, tuple(scale * c for c in center), verts * scale, loops, sizes, uvs)
+            for name, center, (verts, loops, sizes, uvs) in parts]
+
+def write_mesh(mesh, verts, loops, sizes, uvs=None):
+    """
+    空のメッシュデータに頂点・ループ・面（uvs があればループごとの UV も）を foreach_set で一括で書き込む。
+    Blender 4.x では面の頂点数は loop_start の差から決まる。
+    """
+    starts = np.zeros(len(sizes), dtype=np.int32)
+    np.cumsum(sizes[:-1], out=starts[1:])
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set('co', np.ascontiguousarray(verts, dtype=np.float32).ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set('vertex_index', loops)
+    mesh.polygons.add(len(sizes))
+    mesh.polygons.foreach_set('loop_start', starts)
+    if uvs is not None:
+        mesh.uv_layers.new(name='UVMap').data.foreach_set('uv', np.ascontiguousarray(uvs, dtype=np.float32).ravel())
+    mesh.update(calc_edges=True)
+    return mesh
+
+def _replace_object(name, mesh):
+    """同名のオブジェクトとメッシュがあれば削除してから作り直す（再生成で .001 が付かないように）"""
+    old = bpy.data.objects.get(name)
+    if old is not None:
+        old_mesh = old.data if old.type == 'MESH' else None
+        bpy.data.objects.remove(old, do_unlink=True)
+        if old_mesh is not None and old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
+    mesh.name = name
+    return bpy.data.objects.new(name, mesh)
+
+def build_body(prefix, height=DEFAULT_HEIGHT, proportions=None, segments=None, subdivisions=1, scene=None):
+    """
+    現在のファイルに素体を生成し、コレクション '{prefix}Human' にまとめる（シーンはリセットしない）。
+    subdivisions が 1 以上なら各パーツに Subsurf を追加する。
+    戻り値: 生成したオブジェクトのリスト
+    """
+    scene = scene or bpy.context.scene
     coll_name = f"{prefix}Human"
-    if coll_name in bpy.data.collections:
-        coll = bpy.data.collections[coll_name]
-    else:
+    coll = bpy.data.collections.get(coll_name)
+    if coll is None:
         coll = bpy.data.collections.new(coll_name)
-        bpy.context.scene.collection.children.link(coll)
-
-    # 生成されたメッシュオブジェクトを新しいコレクションに移動
-    objects_to_move = [torso, head]
-    for suffix_coll in ['L', 'R']: # LとRのオブジェクトを確実に取得
-        arm_obj = bpy.data.objects.get(f"{prefix}Arm_{suffix_coll}")
-        if arm_obj: objects_to_move.append(arm_obj)
-        leg_obj = bpy.data.objects.get(f"{prefix}Leg_{suffix_coll}")
-        if leg_obj: objects_to_move.append(leg_obj)
-    
-    for obj in objects_to_move:
-        if obj and obj.name in bpy.context.scene.view_layers[0].objects: # オブジェクトがシーンに存在するか確認
-            # 既存のコレクションからアンリンク
-            for c_unlink in list(obj.users_collection):
-                c_unlink.objects.unlink(obj)
-            # 新しいコレクションにリンク
-            coll.objects.link(obj)
-
-
-    # 7. Subsurf を軽く追加 (コレクション内のメッシュオブジェクトに適用)
-    for obj in coll.objects:
-        if obj.type == 'MESH': # メッシュオブジェクトのみ
-            mod = obj.modifiers.new(name="Subsurf", type='SUBSURF')
-            mod.levels = 1
-            mod.render_levels = 1
+    if coll.name not in scene.collection.children:
+        scene.collection.children.link(coll)
 
-    # 8. 原点をジオメトリの中心にリセット (コレクション内のメッシュオブジェクトに適用)
-    for obj in coll.objects:
-        if obj.type == 'MESH': # メッシュオブジェクトのみ
-            bpy.context.view_layer.objects.active = obj
-            try:
-                bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='MEDIAN')
-            except RuntimeError as e:
-                print(f"Warning: Could not set origin for {obj.name} using default context. Error: {e}")
+    objects = []
+    for name, center, verts, loops, sizes, uvs in body_parts(height, proportions, segments):
+        mesh = write_mesh(bpy.data.meshes.new(f"{prefix}{name}"), verts, loops, sizes, uvs)
+        obj = _replace_object(f"{prefix}{name}", mesh)
+        obj.location = center
+        coll.objects.link(obj)
+        if subdivisions > 0:
+            mod = obj.modifiers.new(name="Subsurf", type='SUBSURF')
+            mod.levels = subdivisions
+            mod.render_levels = subdivisions
+        objects.append(obj)
+    return objects
 
-    print(f"✔ Base mesh generated and setup in collection '{coll_name}': {[o.name for o in coll.objects if o.type == 'MESH']}")
+def generate_base(prefix, subdivisions=1, height=DEFAULT_HEIGHT, proportions=None, segments=None):
+    # シーンを空にリセットしてから素体を生成
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    objects = build_body(prefix, height=height, proportions=proportions,
+                         segments=segments, subdivisions=subdivisions)
+    logger.info(f"✓ Base mesh generated in collection '{prefix}Human': {[o.name for o in objects]}")
+    return objects
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Generate base humanoid or chibi mesh")
     parser.add_argument('--prefix',   type=str, required=True, help='名前の接頭辞（例: BaseHuman）')
-    parser.add_argument('--height',   type=float, default=None, help='生成後のモデル高さ（m）')
+    parser.add_argument('--height',   type=float, default=DEFAULT_HEIGHT, help='生成後のモデル高さ（m）')
     parser.add_argument('--output',   type=str, required=True, help='保存先 .blend ファイルパス')
+    parser.add_argument('--subdivisions', type=int, default=1, help='Subsurf の分割レベル')
+    parser.add_argument('--segments', type=int, default=DEFAULT_SEGMENTS['segments'], help='円周方向の分割数')
+    parser.add_argument('--rings',    type=int, default=DEFAULT_SEGMENTS['rings'], help='頭の緯度方向の分割数')
+    parser.add_argument('--length_segments', type=int, default=DEFAULT_SEGMENTS['length_segments'],
+                        help='胴体・腕・脚の長さ方向の分割数')
     args_known, _ = parser.parse_known_args(sys.argv[sys.argv.index("--")+1:])
     return args_known
 
 def main():
     args = parse_args()
-    generate_base(args.prefix)
-
-    # if args.height: # 高さ調整はコメントアウトしたまま (前回のやり取りより)
-    #     # ... (高さ調整のコード) ...
+    segments = {'segments': args.segments, 'rings': args.rings, 'length_segments': args.length_segments}
+    generate_base(args.prefix, subdivisions=args.subdivisions, height=args.height, segments=segments)
 
     bpy.ops.wm.save_mainfile(filepath=args.output)
-    print(f"✔ Saved base blend to: {args.output}")
+    logger.info(f"✓ Saved base blend to: {args.output}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
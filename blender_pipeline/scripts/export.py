@@ -1,22 +1,160 @@
 # scripts/export.py
+"""
+FBX/GLB エクスポート
+
+単体実行:
+  blender --background file.blend --python export.py -- --fbx out.fbx --glb out.glb
+  blender --background file.blend --python export.py -- --format glb --output out.glb --options '{"export_format": "GLB"}'
+  blender --background file.blend --python export.py -- --format fbx --output out.fbx --deform_only
+
+export_parallel() は保存済みの .blend から形式ごとに Blender プロセスを起動し、
+各形式のエクスポートを並列に実行する。
+
+GLB は options に compression（config の export.glb_compression）を渡すと、
+Draco 圧縮・頂点属性の量子化・未使用属性の削除を行い、サイズとデコード時間のレポートを返す（glb_compression.py）。
+"""
 import bpy
+import os
 import sys
+import json
+import time
 import argparse
+import tempfile
+import subprocess
+
+# 単体実行 (--fbx/--glb) 時の既定オプション
+DEFAULT_FBX_OPTIONS = {
+    'use_custom_props': False,
+    'bake_space_transform': True,
+    'add_leaf_bones': False,
+    'embed_textures': True,
+}
+DEFAULT_GLB_OPTIONS = {
+    'export_format': 'GLB',
+}
+
+def export_fbx(filepath, **options):
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    bpy.ops.export_scene.fbx(filepath=filepath, **options)
+
+def export_gltf(filepath, **options):
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    bpy.ops.export_scene.gltf(filepath=filepath, **options)
+
+def export_glb(filepath, compression=None, **options):
+    """compression を指定した場合は圧縮して書き出し、glb_compression のレポートを返す"""
+    if not compression:
+        export_gltf(filepath, **options)
+        return None
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from glb_compression import export_compressed_glb
+    return export_compressed_glb(filepath, compression, export_gltf, **options)
+
+EXPORTERS = {
+    'fbx': export_fbx,
+    'glb': export_glb,
+}
+
+def export_parallel(blend_path, targets, log_dir=None, timeout=1800, blender_bin=None):
+    """
+    blend_path を形式ごとに別の Blender プロセスで開き、並列にエクスポートする。
+
+    targets: [{'format': 'fbx', 'path': '.../x.fbx', 'options': {...}, 'deform_only': False}, ...]
+    deform_only が真のターゲットは、ベイク済みのデフォーム専用アーマチュアだけでエクスポートする
+    （bake_deform.prepare_deform_only_export）。
+    戻り値: [{'format', 'path', 'returncode', 'duration', 'size', 'log', 'report'}, ...]
+    （report はエクスポート関数の戻り値。GLB の圧縮レポートなど）
+    いずれかが失敗した場合は RuntimeError を送出する。
+    """
+    blender_bin = blender_bin or bpy.app.binary_path
+    script = os.path.abspath(__file__)
+    procs = []
+    for target in targets:
+        log_path = None
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            log_path = os.path.join(log_dir, f"export_{target['format']}.log")
+        report_fd, report_path = tempfile.mkstemp(prefix=f"export_{target['format']}_", suffix='.json')
+        os.close(report_fd)
+        cmd = [blender_bin, "--background", blend_path, "--python-exit-code", "1",
+               "--python", script, "--",
+               "--format", target['format'],
+               "--output", target['path'],
+               "--options", json.dumps(target.get('options', {})),
+               "--report", report_path]
+        if target.get('deform_only'):
+            cmd.append("--deform_only")
+        log_file = open(log_path, 'w', encoding='utf-8') if log_path else subprocess.DEVNULL
+        procs.append((target, subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT),
+                      log_file, log_path, report_path, time.time()))
+
+    results = []
+    deadline = time.time() + timeout
+    for target, proc, log_file, log_path, report_path, started in procs:
+        try:
+            proc.wait(timeout=max(0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        finally:
+            if log_path:
+                log_file.close()
+        report = None
+        if os.path.getsize(report_path):
+            with open(report_path, encoding='utf-8') as f:
+                report = json.load(f)
+        os.remove(report_path)
+        path = target['path']
+        results.append({
+            'format': target['format'],
+            'path': path,
+            'returncode': proc.returncode,
+            'duration': time.time() - started,
+            'size': os.path.getsize(path) if os.path.exists(path) else None,
+            'log': log_path,
+            'report': report,
+        })
+
+    failed = [r for r in results if r['returncode'] != 0 or r['size'] is None]
+    if failed:
+        details = ', '.join(f"{r['format']} (returncode={r['returncode']}, log={r['log']})" for r in failed)
+        raise RuntimeError(f"並列エクスポートに失敗しました: {details}")
+    return results
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--fbx', required=True)
-    parser.add_argument('--glb', required=True)
+    parser.add_argument('--fbx')
+    parser.add_argument('--glb')
+    parser.add_argument('--format', choices=sorted(EXPORTERS))
+    parser.add_argument('--output')
+    parser.add_argument('--options', default='{}', help='エクスポーターに渡すオプション (JSON)')
+    parser.add_argument('--report', help='エクスポート関数の戻り値を書き出す JSON ファイル (--format 指定時)')
+    parser.add_argument('--deform_only', action='store_true',
+                        help='ベイク済みのデフォーム専用アーマチュアだけでエクスポートする（指定しない場合はベイク済みアクションを外す）')
     args, _ = parser.parse_known_args(sys.argv[sys.argv.index("--")+1:])
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from bake_deform import prepare_export
+    prepare_export(args.deform_only)
+
+    if args.format:
+        if not args.output:
+            parser.error('--format には --output が必要です')
+        report = EXPORTERS[args.format](args.output, **json.loads(args.options))
+        if args.report and report is not None:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✔ Exported {args.format.upper()}: {args.output}")
+        return
+
+    if not (args.fbx or args.glb):
+        parser.error('--fbx / --glb / --format のいずれかを指定してください')
     # FBX 出力
-    bpy.ops.export_scene.fbx(filepath=args.fbx,
-                             use_custom_props=False,
-                             bake_space_transform=True,
-                             add_leaf_bones=False,
-                             embed_textures=True)
+    if args.fbx:
+        export_fbx(args.fbx, **DEFAULT_FBX_OPTIONS)
     # GLB 出力
-    bpy.ops.export_scene.gltf(filepath=args.glb,
-                              export_format='GLB')
+    if args.glb:
+        export_glb(args.glb, **DEFAULT_GLB_OPTIONS)
 
 if __name__ == "__main__":
     main()
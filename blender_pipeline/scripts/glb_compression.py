@@ -0,0 +1,584 @@
+# scripts/glb_compression.py
+"""
+GLB の圧縮・量子化と、サイズ・デコード時間の計測
+
+config の export.glb_compression でキャラクターごとに指定する:
+  "glb_compression": {
+    "draco": {"level": 6, "position_bits": 14, "normal_bits": 10, "texcoord_bits": 12},
+    "quantize": {"normal": 8, "texcoord": 16, "weights": 8},
+    "strip_unused": true,
+    "vertex_order": true,
+    "compare": true,
+    "benchmark": true
+  }
+
+  draco         Blender の glTF エクスポーターの Draco 圧縮（true なら DRACO_DEFAULTS）
+  quantize      書き出した GLB の頂点属性を正規化整数に置き換える（true なら QUANTIZE_DEFAULTS、ビット数は 8 か 16）
+                法線・接線は KHR_mesh_quantization、UV・頂点カラー・ウェイトは glTF 本体の正規化整数で表す
+  strip_unused  マテリアルが参照しない UV セット・法線マップのない接線・白一色の頂点カラーを削除する
+  vertex_order  書き出した GLB のインデックスバッファを Tipsify で並べ替え、頂点を初めて参照される順に
+                並べ替えて、前後の ACMR を計測する（true またはキャッシュサイズ）。
+                glTF エクスポーターはプリミティブごとに頂点を重複排除して作り直すため、
+                vertex_cache ステージの並べ替えだけでは GLB の頂点順は最適にならない
+  compare       圧縮なしの GLB も書き出してサイズを比較する（比較用のファイルは一時ディレクトリに作って消す）
+  benchmark     別の Blender プロセスで GLB をインポートし、デコード（読み込み）時間を計測する
+
+glTF には half float の成分型がないため、float16 の代わりに 16 ビットの正規化整数を使う。
+位置はスキンメッシュではノードの変換で逆量子化できないため量子化せず、Draco の量子化に任せる。
+Draco 圧縮したプリミティブの属性はバッファビューを持たないので、後処理（quantize / strip_unused / vertex_order）の対象外になる。
+"""
+import bpy
+import os
+import sys
+import json
+import time
+import shutil
+import struct
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from logger import get_logger
+from vertex_cache import acmr, tipsify, DEFAULT_CACHE_SIZE
+import tracing
+
+logger = get_logger('glb_compression')
+
+DRACO_DEFAULTS = {
+    'level': 6,
+    'position_bits': 14,
+    'normal_bits': 10,
+    'texcoord_bits': 12,
+    'color_bits': 10,
+    'generic_bits': 12,
+}
+# DRACO_DEFAULTS のキー → glTF エクスポーターのオプション名
+DRACO_OPTIONS = {
+    'level': 'export_draco_mesh_compression_level',
+    'position_bits': 'export_draco_position_quantization',
+    'normal_bits': 'export_draco_normal_quantization',
+    'texcoord_bits': 'export_draco_texcoord_quantization',
+    'color_bits': 'export_draco_color_quantization',
+    'generic_bits': 'export_draco_generic_quantization',
+}
+QUANTIZE_DEFAULTS = {
+    'normal': 8,
+    'tangent': 8,
+    'texcoord': 16,
+    'color': 16,
+    'weights': 8,
+}
+COMPRESSION_KEYS = ('draco', 'quantize', 'strip_unused', 'vertex_order', 'compare', 'benchmark')
+
+GLB_MAGIC = b'glTF'
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+COMPONENT_DTYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+FLOAT = 5126
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+# 量子化のビット数 → (符号付きの成分型, 符号なしの成分型)
+QUANTIZED_TYPES = {8: (5120, 5121), 16: (5122, 5123)}
+
+def compression_settings(compression):
+    """config の glb_compression を {'draco', 'quantize', 'strip_unused', 'vertex_order', 'compare', 'benchmark'} にそろえる"""
+    compression = compression or {}
+    draco = compression.get('draco', False)
+    quantize = compression.get('quantize', False)
+    vertex_order = compression.get('vertex_order', False)
+    return {
+        'draco': {**DRACO_DEFAULTS, **(draco if isinstance(draco, dict) else {})} if draco else None,
+        'quantize': {**QUANTIZE_DEFAULTS, **(quantize if isinstance(quantize, dict) else {})} if quantize else None,
+        'strip_unused': compression.get('strip_unused', False),
+        # vertex_order はキャッシュサイズ（true なら vertex_cache.DEFAULT_CACHE_SIZE）
+        'vertex_order': (DEFAULT_CACHE_SIZE if vertex_order is True else vertex_order) or None,
+        'compare': compression.get('compare', True),
+        'benchmark': compression.get('benchmark', True),
+    }
+
+def exporter_options(settings):
+    """Draco の設定を glTF エクスポーターのオプションにする"""
+    if not settings['draco']:
+        return {}
+    options = {'export_draco_mesh_compression_enable': True}
+    options.update({DRACO_OPTIONS[k]: v for k, v in settings['draco'].items()})
+    return options
+
+# --- GLB の読み書き ---
+
+def read_glb(path):
+    """GLB を読み、(JSON, バッファビューごとのバイト列のリスト) を返す"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from('<4sII', data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError(f"GLB 2.0 ではありません: {path}")
+    gltf, binary, offset = None, b'', 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk.decode('utf-8'))
+        elif chunk_type == CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+    if any('uri' in b for b in gltf.get('buffers', [])):
+        raise ValueError(f"外部バッファを参照する GLB は後処理できません: {path}")
+    views = [binary[v.get('byteOffset', 0):v.get('byteOffset', 0) + v['byteLength']]
+             for v in gltf.get('bufferViews', [])]
+    return gltf, views
+
+def write_glb(path, gltf, views):
+    """バッファビューを 4 バイト境界で詰め直して GLB を書き出す"""
+    binary = bytearray()
+    for view, data in zip(gltf.get('bufferViews', []), views):
+        binary.extend(b'\0' * (-len(binary) % 4))
+        view['buffer'] = 0
+        view['byteOffset'] = len(binary)
+        view['byteLength'] = len(data)
+        binary.extend(data)
+    binary.extend(b'\0' * (-len(binary) % 4))
+    if views:
+        gltf['buffers'] = [{'byteLength': len(binary)}]
+    else:
+        gltf.pop('buffers', None)
+
+    text = json.dumps(gltf, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    text += b' ' * (-len(text) % 4)
+    length = 12 + 8 + len(text) + (8 + len(binary) if binary else 0)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4sII', GLB_MAGIC, 2, length))
+        f.write(struct.pack('<II', len(text), CHUNK_JSON))
+        f.write(text)
+        if binary:
+            f.write(struct.pack('<II', len(binary), CHUNK_BIN))
+            f.write(binary)
+
+def read_accessor(gltf, views, index):
+    """アクセサーの値を (count, 成分数) の配列で返す（疎アクセサー・バッファビューなしは None）"""
+    accessor = gltf['accessors'][index]
+    if 'bufferView' not in accessor or 'sparse' in accessor:
+        return None
+    return _read_dense(gltf, views, accessor)
+
+def _read_dense(gltf, views, accessor):
+    """アクセサーのバッファビュー部分（疎アクセサーの置き換え前の値）を読む"""
+    view = gltf['bufferViews'][accessor['bufferView']]
+    dtype = np.dtype(COMPONENT_DTYPES[accessor['componentType']])
+    width = TYPE_SIZES[accessor['type']]
+    element = dtype.itemsize * width
+    stride = view.get('byteStride', element)
+    count = accessor['count']
+    if not count:
+        return np.zeros((0, width), dtype=dtype)
+    raw = views[accessor['bufferView']][accessor.get('byteOffset', 0):]
+    raw = np.frombuffer(raw[:(count - 1) * stride + element] + b'\0' * (stride - element), dtype=np.uint8)
+    return raw.reshape(count, stride)[:, :element].copy().view(dtype).reshape(count, width)
+
+def _accessor_users(gltf):
+    """アクセサーを参照している (辞書, キー) の一覧"""
+    refs = []
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh['primitives']:
+            refs.extend((prim['attributes'], k) for k in prim['attributes'])
+            if 'indices' in prim:
+                refs.append((prim, 'indices'))
+            for target in prim.get('targets', []):
+                refs.extend((target, k) for k in target)
+    for skin in gltf.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            refs.append((skin, 'inverseBindMatrices'))
+    for animation in gltf.get('animations', []):
+        for sampler in animation['samplers']:
+            refs.extend([(sampler, 'input'), (sampler, 'output')])
+    for node in gltf.get('nodes', []):
+        instancing = node.get('extensions', {}).get('EXT_mesh_gpu_instancing', {})
+        refs.extend((instancing['attributes'], k) for k in instancing.get('attributes', {}))
+    return refs
+
+def _view_users(gltf):
+    """バッファビューを参照している (辞書, キー) の一覧"""
+    refs = []
+    for accessor in gltf.get('accessors', []):
+        if 'bufferView' in accessor:
+            refs.append((accessor, 'bufferView'))
+        sparse = accessor.get('sparse')
+        if sparse:
+            refs.extend([(sparse['indices'], 'bufferView'), (sparse['values'], 'bufferView')])
+    for image in gltf.get('images', []):
+        if 'bufferView' in image:
+            refs.append((image, 'bufferView'))
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh['primitives']:
+            draco = prim.get('extensions', {}).get('KHR_draco_mesh_compression')
+            if draco:
+                refs.append((draco, 'bufferView'))
+    return refs
+
+def _compact(items, refs):
+    """refs から参照されていない要素を items から除き、参照の番号を詰め直す"""
+    used = sorted({owner[key] for owner, key in refs})
+    remap = {old: new for new, old in enumerate(used)}
+    for owner, key in refs:
+        owner[key] = remap[owner[key]]
+    return [items[i] for i in used]
+
+def compact(gltf, views):
+    """使われなくなったアクセサーとバッファビューを削除する。戻り値: 詰め直したバッファビューのバイト列"""
+    if 'accessors' in gltf:
+        gltf['accessors'] = _compact(gltf['accessors'], _accessor_users(gltf))
+    pairs = _compact(list(zip(gltf.get('bufferViews', []), views)), _view_users(gltf))
+    if 'bufferViews' in gltf:
+        gltf['bufferViews'] = [view for view, _ in pairs]
+    return [data for _, data in pairs]
+
+# --- 後処理 ---
+
+def _material_texcoords(material):
+    """マテリアルのテクスチャが参照する UV セット番号"""
+    used = set()
+
+    def walk(value, key=''):
+        if isinstance(value, dict):
+            if key.endswith('Texture') and 'index' in value:
+                transform = value.get('extensions', {}).get('KHR_texture_transform', {})
+                used.add(transform.get('texCoord', value.get('texCoord', 0)))
+            for k, v in value.items():
+                walk(v, k)
+        elif isinstance(value, list):
+            for v in value:
+                walk(v, key)
+    walk(material or {})
+    return used
+
+def strip_unused_attributes(gltf, views):
+    """
+    レンダリングに使われない頂点属性をプリミティブから外す。
+      TEXCOORD_n  マテリアルが参照する最大の UV セット番号より後ろのもの（番号の付け直しはしない）
+      TANGENT     マテリアルに法線マップがないもの
+      COLOR_0     全頂点が白 (1, 1, 1, 1) のもの（COLOR_1 以降は glTF のマテリアルが参照しないため常に外す）
+    戻り値: 外した属性の数
+    """
+    materials = gltf.get('materials', [])
+    removed = 0
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh['primitives']:
+            if 'KHR_draco_mesh_compression' in prim.get('extensions', {}):
+                continue
+            material = materials[prim['material']] if 'material' in prim else None
+            texcoords = _material_texcoords(material)
+            last_texcoord = max(texcoords, default=-1)
+            drop = []
+            for name, index in prim['attributes'].items():
+                if name.startswith('TEXCOORD_') and int(name.split('_')[1]) > last_texcoord:
+                    drop.append(name)
+                elif name == 'TANGENT' and 'normalTexture' not in (material or {}):
+                    drop.append(name)
+                elif name.startswith('COLOR_') and name != 'COLOR_0':
+                    drop.append(name)
+                elif name == 'COLOR_0':
+                    values = read_accessor(gltf, views, index)
+                    if values is not None and values.dtype == np.float32 and np.all(values == 1.0):
+                        drop.append(name)
+            for name in drop:
+                del prim['attributes'][name]
+                for target in prim.get('targets', []):
+                    target.pop(name, None)
+            removed += len(drop)
+    return removed
+
+def _quantize(values, bits, signed):
+    """[-1, 1]（符号付き）または [0, 1]（符号なし）の値を正規化整数にする"""
+    component = QUANTIZED_TYPES[bits][0 if signed else 1]
+    dtype = COMPONENT_DTYPES[component]
+    scale = np.iinfo(dtype).max
+    low = -1.0 if signed else 0.0
+    return np.round(np.clip(values, low, 1.0) * scale).astype(dtype), component
+
+def _quantize_weights(values, bits):
+    """ウェイトを正規化整数にし、丸め誤差を最大のウェイトに寄せて合計を 1 に保つ"""
+    quantized, component = _quantize(values, bits, signed=False)
+    scale = np.iinfo(quantized.dtype).max
+    totals = quantized.sum(axis=1, dtype=np.int64)
+    rows = np.nonzero(totals)[0]
+    largest = np.argmax(quantized[rows], axis=1)
+    quantized[rows, largest] = (quantized[rows, largest] + (scale - totals[rows])).astype(quantized.dtype)
+    return quantized, component
+
+def _append_view(gltf, views, data, target=None, stride=None):
+    """バイト列を新しいバッファビューとして追加し、その番号を返す"""
+    view = {'buffer': 0, 'byteLength': len(data)}
+    if target:
+        view['target'] = target
+    if stride:
+        view['byteStride'] = stride
+    gltf['bufferViews'].append(view)
+    views.append(data)
+    return len(gltf['bufferViews']) - 1
+
+def _write_vertex_values(gltf, views, accessor, values):
+    """頂点属性の値を新しいバッファビューに書き、アクセサーを差し替える（要素は 4 バイト境界に揃える）"""
+    count, width = values.shape
+    element = values.dtype.itemsize * width
+    stride = element + (-element % 4)
+    data = np.zeros((count, stride), dtype=np.uint8)
+    data[:, :element] = np.ascontiguousarray(values).view(np.uint8).reshape(count, element)
+    accessor['bufferView'] = _append_view(gltf, views, data.tobytes(), ARRAY_BUFFER,
+                                          stride if stride != element else None)
+    accessor['byteOffset'] = 0
+
+def _replace_accessor(gltf, views, index, quantized, component):
+    """アクセサーを量子化した値の新しいバッファビューに差し替える"""
+    accessor = gltf['accessors'][index]
+    _write_vertex_values(gltf, views, accessor, quantized)
+    accessor.update({'componentType': component, 'normalized': True})
+    accessor.pop('min', None)
+    accessor.pop('max', None)
+
+def quantize_attributes(gltf, views, bits):
+    """
+    float の頂点属性を正規化整数に置き換える（bits: {'normal', 'tangent', 'texcoord', 'color', 'weights'}）。
+    範囲外の値を含む属性（[0, 1] に収まらない UV、長さ 1 を超えるモーフの法線差分など）はそのまま残す。
+    戻り値: 置き換えたアクセサーの数
+    """
+    done = set()
+    extension = False
+
+    def convert(index, kind):
+        nonlocal extension
+        if index in done:
+            return
+        accessor = gltf['accessors'][index]
+        if accessor['componentType'] != FLOAT:
+            return
+        values = read_accessor(gltf, views, index)
+        if values is None:
+            return
+        if kind in ('normal', 'tangent'):
+            if np.abs(values).max(initial=0.0) > 1.0:
+                return
+            quantized, component = _quantize(values, bits[kind], signed=True)
+            extension = True
+        elif kind == 'weights':
+            quantized, component = _quantize_weights(values, bits[kind])
+        else:
+            if values.min(initial=0.0) < 0.0 or values.max(initial=0.0) > 1.0:
+                return
+            quantized, component = _quantize(values, bits[kind], signed=False)
+        _replace_accessor(gltf, views, index, quantized, component)
+        done.add(index)
+
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh['primitives']:
+            if 'KHR_draco_mesh_compression' in prim.get('extensions', {}):
+                continue
+            attributes = prim['attributes']
+            for name, index in attributes.items():
+                if name == 'NORMAL':
+                    convert(index, 'normal')
+                elif name == 'TANGENT':
+                    convert(index, 'tangent')
+                elif name.startswith('TEXCOORD_'):
+                    convert(index, 'texcoord')
+                elif name.startswith('COLOR_'):
+                    convert(index, 'color')
+                elif name == 'WEIGHTS_0' and 'WEIGHTS_1' not in attributes:
+                    # 複数セットのウェイトは合計を揃えられないため対象外
+                    convert(index, 'weights')
+            for target in prim.get('targets', []):
+                if 'NORMAL' in target:
+                    convert(target['NORMAL'], 'normal')
+
+    if extension:
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            if 'KHR_mesh_quantization' not in gltf.setdefault(key, []):
+                gltf[key].append('KHR_mesh_quantization')
+    return len(done)
+
+def _index_component(max_index):
+    """max_index を表せる最小の符号なし整数の成分型"""
+    return 5121 if max_index < 2 ** 8 else 5123 if max_index < 2 ** 16 else 5125
+
+def _permute_accessor(gltf, views, accessor, order, rank):
+    """頂点属性のアクセサーを新しい頂点順（order: 新 → 旧、rank: 旧 → 新）に並べ替える"""
+    if 'bufferView' in accessor:
+        _write_vertex_values(gltf, views, accessor, _read_dense(gltf, views, accessor)[order])
+    sparse = accessor.get('sparse')
+    if sparse:
+        # 疎アクセサー（Blender のモーフターゲット）は置き換える頂点の番号を付け替えて並べ直す
+        width = TYPE_SIZES[accessor['type']]
+        indices = _read_dense(gltf, views, {'bufferView': sparse['indices']['bufferView'],
+                                            'byteOffset': sparse['indices'].get('byteOffset', 0),
+                                            'componentType': sparse['indices']['componentType'],
+                                            'type': 'SCALAR', 'count': sparse['count']}).ravel()
+        values = _read_dense(gltf, views, {'bufferView': sparse['values']['bufferView'],
+                                           'byteOffset': sparse['values'].get('byteOffset', 0),
+                                           'componentType': accessor['componentType'],
+                                           'type': accessor['type'], 'count': sparse['count']})
+        new_indices = rank[indices.astype(np.int64)]
+        by_index = np.argsort(new_indices, kind='stable')
+        component = _index_component(int(new_indices.max(initial=0)))
+        sparse['indices'] = {'bufferView': _append_view(gltf, views, new_indices[by_index].astype(
+                                 COMPONENT_DTYPES[component]).tobytes()),
+                             'componentType': component}
+        sparse['values'] = {'bufferView': _append_view(gltf, views, np.ascontiguousarray(
+                                values[by_index]).reshape(-1, width).tobytes())}
+
+def reorder_vertices(gltf, views, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    三角形プリミティブの三角形を Tipsify で並べ替え（頂点キャッシュ）、続けて頂点を
+    インデックスバッファで初めて参照される順に並べ替える（頂点フェッチの局所性）。
+    インデックスを他のプリミティブと共有するプリミティブは三角形を、頂点属性を共有するものは頂点を並べ替えない。
+    ACMR は並べ替えの前後とも全三角形プリミティブのインデックスバッファで計測する。
+    戻り値: {'reordered': 並べ替えたプリミティブ数,
+             'acmr_before', 'acmr_after': 三角形数で重み付けした ACMR}
+    """
+    users = {}
+    for owner, key in _accessor_users(gltf):
+        users[owner[key]] = users.get(owner[key], 0) + 1
+    reordered, triangles, misses_before, misses_after = 0, 0, 0.0, 0.0
+    for mesh in gltf.get('meshes', []):
+        for prim in mesh['primitives']:
+            if prim.get('mode', TRIANGLES) != TRIANGLES or 'indices' not in prim \
+                    or 'KHR_draco_mesh_compression' in prim.get('extensions', {}):
+                continue
+            indices = read_accessor(gltf, views, prim['indices'])
+            if indices is None or not len(indices):
+                continue
+            tris = indices.ravel().astype(np.int64).reshape(-1, 3)
+            before = acmr(tris, cache_size)
+            triangles += len(tris)
+            misses_before += before * len(tris)
+            if users[prim['indices']] > 1:
+                misses_after += before * len(tris)
+                continue
+
+            count = gltf['accessors'][prim['attributes']['POSITION']]['count']
+            tris = tris[tipsify(tris, count, cache_size)]
+            indices = tris.ravel()
+            misses_after += acmr(tris, cache_size) * len(tris)
+
+            attributes = list(prim['attributes'].values()) + [i for t in prim.get('targets', []) for i in t.values()]
+            if any(users[i] > 1 for i in attributes):
+                rank = np.arange(count)
+            else:
+                first = np.full(count, len(indices), dtype=np.int64)
+                np.minimum.at(first, indices, np.arange(len(indices)))
+                order = np.argsort(first, kind='stable')
+                rank = np.empty(count, dtype=np.int64)
+                rank[order] = np.arange(count)
+                for index in attributes:
+                    _permute_accessor(gltf, views, gltf['accessors'][index], order, rank)
+            accessor = gltf['accessors'][prim['indices']]
+            accessor['bufferView'] = _append_view(gltf, views, rank[indices].astype(
+                COMPONENT_DTYPES[accessor['componentType']]).tobytes(), ELEMENT_ARRAY_BUFFER)
+            accessor['byteOffset'] = 0
+            reordered += 1
+    return {'reordered': reordered,
+            'acmr_before': round(misses_before / triangles, 4) if triangles else None,
+            'acmr_after': round(misses_after / triangles, 4) if triangles else None}
+
+def postprocess_glb(path, settings):
+    """
+    GLB に strip_unused / quantize / vertex_order を適用して書き戻す。
+    戻り値: {'stripped', 'quantized'}（vertex_order 指定時は 'reordered', 'acmr_before', 'acmr_after' も）
+    """
+    gltf, views = read_glb(path)
+    stripped = strip_unused_attributes(gltf, views) if settings['strip_unused'] else 0
+    quantized = quantize_attributes(gltf, views, settings['quantize']) if settings['quantize'] else 0
+    result = {'stripped': stripped, 'quantized': quantized}
+    if settings['vertex_order']:
+        result.update(reorder_vertices(gltf, views, settings['vertex_order']))
+    write_glb(path, gltf, compact(gltf, views))
+    return result
+
+# --- デコード時間 ---
+
+DECODE_SCRIPT = """
+import bpy, sys, time
+path, repeat = sys.argv[-2], int(sys.argv[-1])
+best = None
+for _ in range(repeat):
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    started = time.perf_counter()
+    bpy.ops.import_scene.gltf(filepath=path)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+print(f"DECODE_SECONDS {best}")
+"""
+
+def measure_decode(path, repeat=3, blender_bin=None, timeout=600):
+    """
+    空のシーンを開いた別の Blender プロセスで GLB をインポートし、最短のインポート時間（秒）を返す。
+    Draco の展開と正規化整数の逆量子化を含む、読み込み側のコストの目安になる。
+    """
+    blender_bin = blender_bin or bpy.app.binary_path
+    cmd = [blender_bin, "--background", "--factory-startup", "--python-exit-code", "1",
+           "--python-expr", DECODE_SCRIPT, "--", os.path.abspath(path), str(repeat)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    for line in proc.stdout.splitlines():
+        if line.startswith("DECODE_SECONDS "):
+            return float(line.split()[1])
+    raise RuntimeError(f"GLB のデコード時間を計測できませんでした: {path} (returncode={proc.returncode})")
+
+# --- エクスポート ---
+
+def export_compressed_glb(filepath, compression, export, **options):
+    """
+    export(filepath, **options) で GLB を書き出し、compression の圧縮・後処理を適用する。
+    戻り値: {'size', 'baseline_size', 'size_ratio', 'stripped', 'quantized', 'reordered', 'acmr_before', 'acmr_after',
+             'export_seconds', 'postprocess_seconds', 'decode_seconds', 'baseline_decode_seconds', 'settings'}
+    """
+    settings = compression_settings(compression)
+    report = {'settings': settings}
+    scratch = tempfile.mkdtemp(prefix='glb_compression_') if settings['compare'] else None
+    baseline = os.path.join(scratch, 'baseline.glb') if scratch else None
+    try:
+        if baseline and settings['draco']:
+            with tracing.span("glb_compression:baseline"):
+                export(baseline, **options)
+
+        started = time.perf_counter()
+        with tracing.span("glb_compression:export", draco=bool(settings['draco'])):
+            export(filepath, **{**options, **exporter_options(settings)})
+        report['export_seconds'] = round(time.perf_counter() - started, 3)
+
+        if baseline and not settings['draco']:
+            shutil.copyfile(filepath, baseline)
+        if settings['quantize'] or settings['strip_unused'] or settings['vertex_order']:
+            started = time.perf_counter()
+            with tracing.span("glb_compression:postprocess"):
+                report.update(postprocess_glb(filepath, settings))
+            report['postprocess_seconds'] = round(time.perf_counter() - started, 3)
+
+        report['size'] = os.path.getsize(filepath)
+        if baseline:
+            report['baseline_size'] = os.path.getsize(baseline)
+            report['size_ratio'] = round(report['size'] / report['baseline_size'], 4) if report['baseline_size'] else None
+        if settings['benchmark']:
+            with tracing.span("glb_compression:decode"):
+                report['decode_seconds'] = round(measure_decode(filepath), 4)
+                if baseline:
+                    report['baseline_decode_seconds'] = round(measure_decode(baseline), 4)
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    summary = f"{report['size']} bytes"
+    if 'baseline_size' in report:
+        summary += f" (圧縮なし {report['baseline_size']} bytes, 比率 {report['size_ratio']})"
+    if report.get('acmr_before') is not None:
+        summary += (f", ACMR {report['acmr_before']:.3f} → {report['acmr_after']:.3f}"
+                    f" ({report['reordered']} プリミティブを並べ替え)")
+    if 'decode_seconds' in report:
+        summary += f", デコード {report['decode_seconds']:.3f}秒"
+        if 'baseline_decode_seconds' in report:
+            summary += f" (圧縮なし {report['baseline_decode_seconds']:.3f}秒)"
+    logger.info(f"✓ GLB を圧縮して書き出しました: {filepath}: {summary}")
+    return report
@@ -0,0 +1,141 @@
+# scripts/lod.py
+"""
+LOD（詳細度）メッシュの生成
+
+各メッシュの評価済みメッシュ（Subsurf / ディテール適用後）をコラプス方式の Decimate で
+三角形数の予算まで削減し、LOD0〜LODn のオブジェクトを作る。
+LOD0 は元のオブジェクトで、名前にはエンジンが LOD グループとして認識する接尾辞 `_LOD{n}` を付ける。
+全レベルで同じ形になるよう、LOD0 もモディファイア（アーマチュア以外）を適用したメッシュに置き換え、
+予算を超える場合はその場で削減する。シェイプキーを持つメッシュは、予算内なら LOD0 だけモディファイアを残す。
+LOD1 以降は元のオブジェクトの複製なので、親・頂点グループ・アーマチュアモディファイアを引き継ぐ
+（頂点グループのウェイトは Decimate が補間する）。このステージは rigging より前に実行されるため、
+リグへのバインドはベース .blend のメッシュが既にスキン済みの場合にだけ引き継がれる。
+
+予算はキャラクター全体の三角形数で指定し、各メッシュを同じ比率で削減する:
+  "lod": {"triangles": [20000, 8000, 3000, 1000]}     # LOD0〜LOD3
+"lod": true のときは元の三角形数に DEFAULT_RATIOS を掛けた値を予算にする。
+シェイプキーは評価済みメッシュに適用されるため、LOD1 以降には残らない。
+"""
+import bpy
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+from mesh_metrics import scene_metrics
+import tracing
+
+logger = get_logger('lod')
+
+# "lod": true のときの各レベルの三角形数の比率（LOD0〜LOD3）
+DEFAULT_RATIOS = (1.0, 0.5, 0.25, 0.1)
+
+LOD_SUFFIX_RE = re.compile(r'_LOD\d+$')
+
+# 評価済みメッシュを取るときに無効化するモディファイア（LOD にはそのまま残す）
+KEEP_MODIFIER_TYPES = {'ARMATURE'}
+
+def lod_name(name, level):
+    return f"{LOD_SUFFIX_RE.sub('', name)}_LOD{level}"
+
+def lod_budgets(lod, full_triangles):
+    """config の lod から各レベルの三角形数の予算を返す"""
+    if isinstance(lod, dict) and lod.get('triangles'):
+        return [int(t) for t in lod['triangles']]
+    return [max(1, int(full_triangles * r)) for r in DEFAULT_RATIOS]
+
+def decimated_meshes(objects, ratio):
+    """
+    各オブジェクトの評価済みメッシュを ratio でコラプス Decimate した新しいメッシュを返す。
+    アーマチュアなど KEEP_MODIFIER_TYPES のモディファイアは評価から外す（静止形状を取る）。
+    全オブジェクトを1回の depsgraph 評価でまとめて処理する。
+    戻り値: {オブジェクト: メッシュ}
+    """
+    disabled, temporary = [], []
+    for obj in objects:
+        for mod in obj.modifiers:
+            if mod.type in KEEP_MODIFIER_TYPES and mod.show_viewport:
+                mod.show_viewport = False
+                disabled.append(mod)
+        if ratio < 1.0:
+            mod = obj.modifiers.new(name='LODDecimate', type='DECIMATE')
+            mod.decimate_type = 'COLLAPSE'
+            mod.ratio = ratio
+            temporary.append((obj, mod))
+    try:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        return {obj: bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph),
+                                                     preserve_all_data_layers=True, depsgraph=depsgraph)
+                for obj in objects}
+    finally:
+        for obj, mod in temporary:
+            obj.modifiers.remove(mod)
+        for mod in disabled:
+            mod.show_viewport = True
+
+def has_live_modifiers(obj):
+    return any(mod.type not in KEEP_MODIFIER_TYPES for mod in obj.modifiers)
+
+def _strip_modifiers(obj):
+    """評価済みメッシュに適用済みのモディファイアを外す（アーマチュアなどは残す）"""
+    for mod in list(obj.modifiers):
+        if mod.type not in KEEP_MODIFIER_TYPES:
+            obj.modifiers.remove(mod)
+
+def generate_lods(lod=True, objects=None):
+    """
+    シーン内のメッシュ（objects 指定時はそのオブジェクト）から LOD0〜LODn を作る。
+    戻り値: [{'level', 'budget', 'triangles'}, ...]（triangles は達成した三角形数）
+    """
+    if objects is None:
+        objects = [o for o in bpy.context.scene.objects
+                   if o.type == 'MESH' and not LOD_SUFFIX_RE.search(o.name)]
+    if not objects:
+        logger.warning("⚠ LOD を作るメッシュがありません。")
+        return []
+
+    metrics = scene_metrics(objects, evaluated=True)
+    full = metrics['triangles']
+    budgets = lod_budgets(lod, full)
+    report = []
+    # LOD0 をその場で削減すると元のメッシュが失われるため、LOD1 以降を先に作る
+    for level in list(range(1, len(budgets))) + [0]:
+        budget = budgets[level]
+        ratio = min(1.0, budget / full) if full else 1.0
+        with tracing.span("lod_level", level=level, ratio=round(ratio, 4)):
+            if level == 0 and ratio >= 1.0:
+                # 予算内の LOD0 はモディファイアの適用だけを行う（シェイプキーを失うメッシュはそのまま残す）
+                for obj in objects:
+                    if has_live_modifiers(obj) and obj.data.shape_keys:
+                        logger.warning(f"⚠ '{obj.name}' はシェイプキーを持つため LOD0 のモディファイアを適用しません。")
+                pending = [o for o in objects if has_live_modifiers(o) and not o.data.shape_keys]
+                meshes = decimated_meshes(pending, 1.0) if pending else {}
+            else:
+                meshes = decimated_meshes(objects, ratio)
+            lods = []
+            for obj in objects:
+                if obj not in meshes:
+                    lods.append(obj)
+                    continue
+                if level == 0:
+                    old_mesh = obj.data
+                    obj.data = meshes[obj]
+                    if old_mesh.users == 0:
+                        bpy.data.meshes.remove(old_mesh)
+                    target = obj
+                else:
+                    target = obj.copy()
+                    target.data = meshes[obj]
+                    for coll in obj.users_collection:
+                        coll.objects.link(target)
+                _strip_modifiers(target)
+                lods.append(target)
+            triangles = scene_metrics(lods, evaluated=True)['triangles']
+            for obj, target in zip(objects, lods):
+                target.name = lod_name(obj.name, level)
+                target.data.name = target.name
+        report.append({'level': level, 'budget': budget, 'triangles': triangles})
+        logger.info(f"  LOD{level}: 三角形 {triangles} / 予算 {budget} (比率 {ratio:.3f})")
+    logger.info(f"✓ {len(objects)} メッシュから LOD0〜LOD{len(budgets) - 1} を生成しました。")
+    return sorted(report, key=lambda r: r['level'])
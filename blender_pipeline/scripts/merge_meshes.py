@@ -0,0 +1,310 @@
+# scripts/merge_meshes.py
+"""
+ドローコール削減のためのエクスポート前処理
+
+1. マテリアルの重複排除: ノードツリーの構成とパラメータのハッシュが同じマテリアルを1つにまとめる
+2. メッシュの結合: 同じアーマチュアで変形する（またはアーマチュアを持たない）パーツを
+   LOD レベルごとに1つのメッシュに結合する（ボーンの子として付いている小物は結合しない）
+3. パレットアトラス: テクスチャを使わない単色のマテリアル（Base_Skin / Base_Cloth / Base_Hair など）を、
+   生成した小さなパレットテクスチャを参照する1つのマテリアルに置き換え、
+   各面の UV レイヤー 'PaletteUV' をそのマテリアルの色のセルに寄せる
+
+ベースカラーのパレットに加え、ラフネス (G) とメタリック (B) を格納したパレットを作るため、
+glTF エクスポーターはそれぞれ baseColorTexture / metallicRoughnessTexture として書き出す。
+"""
+import bpy
+import os
+import re
+import sys
+import math
+import hashlib
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+from utils import bake_modifiers, export_meshes
+import tracing
+
+logger = get_logger('merge_meshes')
+
+PALETTE_UV = 'PaletteUV'
+
+# パレットの1色あたりのピクセル数（ミップマップで隣の色がにじまないよう余白を持たせる）
+PALETTE_CELL = 4
+
+LOD_RE = re.compile(r'_LOD(\d+)$')
+
+def _value_key(value):
+    """ソケットの既定値をハッシュ用の値にそろえる"""
+    if hasattr(value, '__len__') and not isinstance(value, str):
+        return tuple(round(float(v), 5) for v in value)
+    if isinstance(value, float):
+        return round(value, 5)
+    return value
+
+def material_hash(mat):
+    """ノードツリーの構成（ノード・未接続の入力値・画像・リンク）とブレンド設定のハッシュ"""
+    parts = [mat.blend_method if hasattr(mat, 'blend_method') else None]
+    if not mat.use_nodes or not mat.node_tree:
+        parts.append(('flat', _value_key(mat.diffuse_color), _value_key(mat.metallic), _value_key(mat.roughness)))
+    else:
+        for node in sorted(mat.node_tree.nodes, key=lambda n: n.name):
+            inputs = tuple((s.identifier, _value_key(s.default_value))
+                           for s in node.inputs if not s.is_linked and hasattr(s, 'default_value'))
+            image = node.image.name if getattr(node, 'image', None) else None
+            parts.append((node.name, node.bl_idname, inputs, image))
+        for link in mat.node_tree.links:
+            parts.append((link.from_node.name, link.from_socket.identifier,
+                          link.to_node.name, link.to_socket.identifier))
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+def _replace_slot_materials(objects, mapping):
+    """マテリアルスロットのマテリアルを mapping {元: 置換先} に従って置き換える"""
+    for obj in objects:
+        for slot in obj.material_slots:
+            if slot.material in mapping:
+                slot.material = mapping[slot.material]
+
+def dedupe_materials(objects):
+    """
+    objects が使うマテリアルのうちハッシュが同じものを最初の1つにまとめる。
+    戻り値: 置き換えたマテリアルの数
+    """
+    first, mapping = {}, {}
+    for obj in objects:
+        for slot in obj.material_slots:
+            mat = slot.material
+            if mat is None or mat in mapping or mat in first.values():
+                continue
+            key = material_hash(mat)
+            if key in first:
+                mapping[mat] = first[key]
+            else:
+                first[key] = mat
+    _replace_slot_materials(objects, mapping)
+    for mat in mapping:
+        logger.debug("  マテリアル '%s' を '%s' にまとめました", mat.name, mapping[mat].name)
+    return len(mapping)
+
+def flat_color(mat):
+    """
+    テクスチャを使わない単色の Principled BSDF マテリアルなら
+    {'base_color': (r, g, b) リニア, 'metallic', 'roughness'} を返す（それ以外は None）。
+    """
+    if mat is None or not mat.use_nodes or not mat.node_tree:
+        return None
+    nodes = mat.node_tree.nodes
+    if sorted(n.type for n in nodes) != ['BSDF_PRINCIPLED', 'OUTPUT_MATERIAL']:
+        return None
+    bsdf = next(n for n in nodes if n.type == 'BSDF_PRINCIPLED')
+    if any(s.is_linked for s in bsdf.inputs):
+        return None
+    inputs = bsdf.inputs
+    if inputs['Alpha'].default_value < 1.0:
+        return None
+    if 'Emission Strength' in inputs and inputs['Emission Strength'].default_value > 0.0:
+        return None
+    return {
+        'base_color': tuple(inputs['Base Color'].default_value[:3]),
+        'metallic': float(inputs['Metallic'].default_value),
+        'roughness': float(inputs['Roughness'].default_value),
+    }
+
+def _linear_to_srgb(c):
+    c = np.clip(c, 0.0, 1.0)
+    return np.where(c <= 0.0031308, c * 12.92, 1.055 * np.power(c, 1.0 / 2.4) - 0.055)
+
+def _palette_image(name, cells, columns, rows, colorspace):
+    """cells (N, 3) の色を PALETTE_CELL 四方のセルに並べた画像を作り、.blend に埋め込む"""
+    width, height = columns * PALETTE_CELL, rows * PALETTE_CELL
+    image = bpy.data.images.get(name)
+    if image is not None:
+        bpy.data.images.remove(image)
+    image = bpy.data.images.new(name, width, height, alpha=False)
+    image.colorspace_settings.name = colorspace
+    grid = np.ones((rows, columns, 4), dtype=np.float32)
+    index = np.arange(len(cells))
+    grid[index // columns, index % columns, :3] = cells
+    pixels = np.repeat(np.repeat(grid, PALETTE_CELL, axis=0), PALETTE_CELL, axis=1)
+    image.pixels.foreach_set(pixels.ravel())
+    image.pack()
+    return image
+
+def build_palette_material(name, colors):
+    """
+    単色マテリアルの色 [flat_color の結果, ...] からパレットテクスチャと、それを参照するマテリアルを作る。
+    戻り値: (マテリアル, セル中心の UV (N, 2))
+    """
+    count = len(colors)
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    base = _palette_image(f"{name}_BaseColor",
+                          _linear_to_srgb(np.array([c['base_color'] for c in colors])), columns, rows, 'sRGB')
+    orm = _palette_image(f"{name}_MetallicRoughness",
+                         np.array([(1.0, c['roughness'], c['metallic']) for c in colors]), columns, rows, 'Non-Color')
+
+    mat = bpy.data.materials.get(name) or bpy.data.materials.new(name)
+    mat.use_nodes = True
+    tree = mat.node_tree
+    tree.nodes.clear()
+    output = tree.nodes.new('ShaderNodeOutputMaterial')
+    bsdf = tree.nodes.new('ShaderNodeBsdfPrincipled')
+    uv = tree.nodes.new('ShaderNodeUVMap')
+    uv.uv_map = PALETTE_UV
+    base_tex = tree.nodes.new('ShaderNodeTexImage')
+    base_tex.image = base
+    orm_tex = tree.nodes.new('ShaderNodeTexImage')
+    orm_tex.image = orm
+    separate = tree.nodes.new('ShaderNodeSeparateColor')
+    for tex in (base_tex, orm_tex):
+        tex.interpolation = 'Closest'
+        tree.links.new(uv.outputs['UV'], tex.inputs['Vector'])
+    tree.links.new(base_tex.outputs['Color'], bsdf.inputs['Base Color'])
+    tree.links.new(orm_tex.outputs['Color'], separate.inputs['Color'])
+    tree.links.new(separate.outputs['Green'], bsdf.inputs['Roughness'])
+    tree.links.new(separate.outputs['Blue'], bsdf.inputs['Metallic'])
+    tree.links.new(bsdf.outputs['BSDF'], output.inputs['Surface'])
+
+    index = np.arange(count)
+    cell_uv = np.stack([(index % columns + 0.5) / columns,
+                        # 画像の1行目は下端（V = 0）
+                        (index // columns + 0.5) / rows], axis=1).astype(np.float32)
+    return mat, cell_uv
+
+def apply_palette(obj, palette_mat, palette_uv):
+    """
+    obj の面のうちパレットに置き換えるマテリアル（palette_uv {マテリアル: (u, v)}）の面の
+    'PaletteUV' をセルの中心に寄せ、マテリアルスロットを重複のないリストにまとめ直す。
+    戻り値: まとめ直した後のスロット数
+    """
+    mesh = obj.data
+    slots = [slot.material for slot in obj.material_slots]
+    if not slots or not len(mesh.polygons):
+        return len(slots)
+    count = len(mesh.polygons)
+    material_index = np.empty(count, dtype=np.int32)
+    loop_totals = np.empty(count, dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', material_index)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+
+    # パレット対象のスロットは palette_mat に置き換え、同じマテリアルのスロットを1つにまとめる
+    resolved = [palette_mat if mat in palette_uv else mat for mat in slots]
+    unique = list(dict.fromkeys(resolved))
+    remap = np.array([unique.index(mat) for mat in resolved], dtype=np.int32)
+    slot_uv = np.array([palette_uv.get(mat, (0.0, 0.0)) for mat in slots], dtype=np.float32)
+    on_palette = np.array([mat in palette_uv for mat in slots])
+
+    layer = mesh.uv_layers.get(PALETTE_UV) or mesh.uv_layers.new(name=PALETTE_UV, do_init=False)
+    uv = np.zeros(len(mesh.loops) * 2, dtype=np.float32)
+    layer.data.foreach_get('uv', uv)
+    uv = uv.reshape(-1, 2)
+    face_index = np.clip(material_index, 0, len(slots) - 1)
+    loop_slot = np.repeat(face_index, loop_totals)
+    mask = on_palette[loop_slot]
+    uv[mask] = slot_uv[loop_slot[mask]]
+    layer.data.foreach_set('uv', uv.ravel())
+
+    mesh.materials.clear()
+    for mat in unique:
+        mesh.materials.append(mat)
+    mesh.polygons.foreach_set('material_index', remap[face_index])
+    mesh.update()
+    return len(unique)
+
+def _armature_of(obj):
+    """obj を変形するアーマチュア（アーマチュアモディファイア / アーマチュア親）"""
+    for mod in obj.modifiers:
+        if mod.type == 'ARMATURE' and mod.object:
+            return mod.object
+    if obj.parent and obj.parent.type == 'ARMATURE' and obj.parent_type in ('OBJECT', 'ARMATURE'):
+        return obj.parent
+    return None
+
+def join_skinned(prefix, objects):
+    """
+    同じアーマチュアで変形する（またはアーマチュアを持たない）メッシュを LOD レベルごとに1つに結合する。
+    アーマチュア以外のモディファイアは結合前にレスト形状のメッシュに適用し、アーマチュアモディファイアは残す
+    （適用できないオブジェクトは結合しない）。
+    戻り値: 結合後のオブジェクトのリスト
+    """
+    groups, result = {}, []
+    for obj in objects:
+        if obj.parent_type == 'BONE':
+            result.append(obj)
+            continue
+        m = LOD_RE.search(obj.name)
+        key = (_armature_of(obj), int(m.group(1)) if m else None)
+        groups.setdefault(key, []).append(obj)
+
+    for (armature, level), members in groups.items():
+        if len(members) < 2:
+            result.extend(members)
+            continue
+        for obj in members:
+            names = [mod.name for mod in obj.modifiers if mod.type != 'ARMATURE']
+            if names:
+                bake_modifiers([obj], names)
+        skipped = [o for o in members if any(mod.type != 'ARMATURE' for mod in o.modifiers)]
+        for obj in skipped:
+            logger.warning(f"⚠ '{obj.name}' のモディファイアを適用できないため結合しません。")
+        result.extend(skipped)
+        members = [o for o in members if o not in skipped]
+        if not members:
+            continue
+        target = members[0]
+        if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.select_all(action='DESELECT')
+        for obj in members:
+            obj.select_set(True)
+        bpy.context.view_layer.objects.active = target
+        if len(members) > 1:
+            bpy.ops.object.join()
+        target.name = f"{prefix}Body" + (f"_LOD{level}" if level is not None else "")
+        target.data.name = target.name
+        logger.info(f"  {len(members)} パーツを '{target.name}' に結合しました"
+                    + (f"（アーマチュア '{armature.name}'）" if armature else ""))
+        result.append(target)
+    bpy.ops.object.select_all(action='DESELECT')
+    return result
+
+def merge_character(prefix, join=True, palette=True, objects=None):
+    """
+    マテリアルの重複排除 → パーツの結合 → 単色マテリアルのパレット化を行う。
+    戻り値: {'objects', 'draw_calls_before', 'draw_calls_after', 'materials_deduped', 'palette_colors'}
+    （draw_calls はメッシュごとのマテリアルスロット数の合計）
+    """
+    if objects is None:
+        objects = export_meshes()
+    draw_calls_before = sum(max(1, len(o.material_slots)) for o in objects)
+
+    with tracing.span("merge:dedupe_materials"):
+        deduped = dedupe_materials(objects)
+    if join:
+        with tracing.span("merge:join", objects=len(objects)):
+            objects = join_skinned(prefix, objects)
+
+    colors = []
+    if palette:
+        flat = {}
+        for obj in objects:
+            for slot in obj.material_slots:
+                if slot.material is not None and slot.material not in flat:
+                    color = flat_color(slot.material)
+                    if color is not None:
+                        flat[slot.material] = color
+        # 1色だけならパレットにしても描画回数は変わらない
+        if len(flat) > 1:
+            with tracing.span("merge:palette", colors=len(flat)):
+                palette_mat, cell_uv = build_palette_material(f"{prefix}Palette", list(flat.values()))
+                palette_uv = {mat: tuple(uv) for mat, uv in zip(flat, cell_uv)}
+                for obj in objects:
+                    apply_palette(obj, palette_mat, palette_uv)
+            colors = [mat.name for mat in flat]
+            logger.info(f"  単色マテリアル {len(flat)} 個をパレット '{palette_mat.name}' にまとめました: {colors}")
+
+    draw_calls_after = sum(max(1, len(o.material_slots)) for o in objects)
+    logger.info(f"✓ ドローコール（メッシュ×マテリアル）: {draw_calls_before} → {draw_calls_after}")
+    return {'objects': [o.name for o in objects], 'draw_calls_before': draw_calls_before,
+            'draw_calls_after': draw_calls_after, 'materials_deduped': deduped, 'palette_colors': colors}
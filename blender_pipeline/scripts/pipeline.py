@@ -5,10 +5,15 @@ import json
 import argparse
 import traceback
 import time
-from datetime import datetime
+import logging
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import cleanup_scene, detect_mesh_collection, get_rig_object, find_control_bone, load_asset_library
+import tracing
+import logger as pipeline_logger
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import stage_cache
+from export import EXPORTERS, export_parallel
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -20,13 +25,23 @@ def parse_args():
     parser.add_argument('--use_asset_motions', action='store_true', help='Asset Browserからモーションを読み込む')
     parser.add_argument('--log_level', type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO', 
                         help='ログレベル (DEBUG/INFO/WARNING/ERROR)')
+    parser.add_argument('--log_json', type=str, help='ログを JSON Lines でも書き出すパス')
+    parser.add_argument('--cache_dir', type=str, default=DEFAULT_CACHE_DIR,
+                        help='ステージキャッシュ（チェックポイント .blend）の保存先')
+    parser.add_argument('--cache_max_mb', type=int, default=stage_cache.DEFAULT_MAX_BYTES // (1024 ** 2),
+                        help='ステージキャッシュの上限サイズ (MB)。超えた分は古い順に削除')
+    parser.add_argument('--no_cache', action='store_true', help='ステージキャッシュを使わず全ステージを実行する')
+    parser.add_argument('--parallel_export', action='store_true',
+                        help='保存した .blend から形式ごとに Blender を起動し、FBX/GLB を並列にエクスポートする')
+    parser.add_argument('--trace', type=str, help='ステージごとの計測結果を Chrome trace-event JSON で書き出すパス')
+    parser.add_argument('--profile', action='store_true', help='各ステージを cProfile で計測し、上位の関数を出力する')
+    parser.add_argument('--profile_top', type=int, default=20, help='--profile で出力する関数の数')
     args, _ = parser.parse_known_args(sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else [])
     return args
 
 def log(level, message):
-    """ログ出力関数"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{level}] {message}")
+    """ログ出力関数（level: 'DEBUG' / 'INFO' / 'WARNING' / 'ERROR'）"""
+    pipeline_logger.get_logger('pipeline').log(getattr(logging, level, logging.INFO), message)
 
 def validate_config(config):
     """設定ファイルの検証"""
@@ -44,194 +59,596 @@ def validate_config(config):
     if 'motions' in config and not isinstance(config['motions'], list):
         raise ValueError(f"'motions' はリストでなければなりません: {config['motions']}")
     
+    if 'motion_file' in config and not isinstance(config['motion_file'], str):
+        raise ValueError(f"'motion_file' は文字列でなければなりません: {config['motion_file']}")
+    
+    if 'link_asset_motions' in config and not isinstance(config['link_asset_motions'], bool):
+        raise ValueError(f"'link_asset_motions' は真偽値でなければなりません: {config['link_asset_motions']}")
+    
+    if 'gait' in config and not isinstance(config['gait'], (bool, dict)):
+        raise ValueError(f"'gait' は真偽値または {{名前: パラメータ}} の辞書でなければなりません: {config['gait']}")
+    
+    if 'compression' in config:
+        compression = config['compression']
+        if not isinstance(compression, (bool, dict)):
+            raise ValueError(f"'compression' は真偽値または許容誤差の辞書でなければなりません: {compression}")
+        if isinstance(compression, dict):
+            for key, value in compression.items():
+                if key not in ('angle_deg', 'location', 'scale') or not isinstance(value, (int, float)) or value < 0:
+                    raise ValueError(f"'compression.{key}' は angle_deg / location / scale のいずれかの非負の数値でなければなりません: {value}")
+    
+    if 'bake' in config:
+        bake = config['bake']
+        if not isinstance(bake, (bool, dict)):
+            raise ValueError(f"'bake' は真偽値または辞書でなければなりません: {bake}")
+        if isinstance(bake, dict) and not all(isinstance(bake.get(k, False), bool) for k in ('enabled', 'deform_only_export')):
+            raise ValueError(f"'bake.enabled' / 'bake.deform_only_export' は真偽値でなければなりません: {bake}")
+    
+    if 'merge' in config:
+        merge = config['merge']
+        if not isinstance(merge, (bool, dict)):
+            raise ValueError(f"'merge' は真偽値または辞書でなければなりません: {merge}")
+        if isinstance(merge, dict) and not all(isinstance(merge.get(k, True), bool) for k in ('join', 'palette')):
+            raise ValueError(f"'merge.join' / 'merge.palette' は真偽値でなければなりません: {merge}")
+    
+    if 'vertex_cache' in config:
+        vertex_cache = config['vertex_cache']
+        if not isinstance(vertex_cache, (bool, dict)):
+            raise ValueError(f"'vertex_cache' は真偽値または辞書でなければなりません: {vertex_cache}")
+        if isinstance(vertex_cache, dict) and \
+                not (isinstance(vertex_cache.get('cache_size', 32), int) and vertex_cache.get('cache_size', 32) > 2):
+            raise ValueError(f"'vertex_cache.cache_size' は 3 以上の整数でなければなりません: {vertex_cache}")
+    
+    if 'lod' in config:
+        lod = config['lod']
+        if not isinstance(lod, (bool, dict)):
+            raise ValueError(f"'lod' は真偽値または辞書でなければなりません: {lod}")
+        if isinstance(lod, dict) and 'triangles' in lod:
+            if not isinstance(lod['triangles'], list) or not lod['triangles'] or \
+                    not all(isinstance(t, int) and t > 0 for t in lod['triangles']):
+                raise ValueError(f"'lod.triangles' は LOD0 から順の正の整数のリストでなければなりません: {lod['triangles']}")
+    
+    if 'budgets' in config:
+        from runtime_budget import METRICS
+        budgets = config['budgets']
+        if not isinstance(budgets, dict) or not isinstance(budgets.get('platforms', {}), dict):
+            raise ValueError(f"'budgets' は {{'platforms': {{プラットフォーム: {{指標: 上限}}}}}} の辞書でなければなりません: {budgets}")
+        for platform, limits in budgets.get('platforms', {}).items():
+            if not isinstance(limits, dict) or not all(k in METRICS and isinstance(v, (int, float)) for k, v in limits.items()):
+                raise ValueError(f"'budgets.platforms.{platform}' の指標は {', '.join(METRICS)} の数値でなければなりません: {limits}")
+        enforce = budgets.get('enforce', False)
+        if not isinstance(enforce, (bool, list)) or \
+                (isinstance(enforce, list) and not all(p in budgets.get('platforms', {}) for p in enforce)):
+            raise ValueError(f"'budgets.enforce' は真偽値または platforms に定義したプラットフォーム名のリストでなければなりません: {enforce}")
+    
+    if 'control_bones' in config:
+        if not isinstance(config['control_bones'], dict) or \
+                not all(isinstance(v, list) for v in config['control_bones'].values()):
+            raise ValueError(f"'control_bones' は {{役割: [候補ボーン, ...]}} の辞書でなければなりません: {config['control_bones']}")
+    
+    if 'variants' in config:
+        from variants import VARIANT_KEYS
+        variants = config['variants']
+        if not isinstance(variants, dict) or not all(isinstance(v, dict) for v in variants.values()):
+            raise ValueError(f"'variants' は {{名前: パラメータ}} の辞書でなければなりません: {variants}")
+        for name, params in variants.items():
+            for key, value in params.items():
+                if key not in VARIANT_KEYS or not isinstance(value, (int, float)) or value <= 0:
+                    raise ValueError(f"'variants.{name}.{key}' は {', '.join(VARIANT_KEYS)} のいずれかの正の数値でなければなりません: {value}")
+    
     if 'export' in config:
         if not isinstance(config['export'], dict):
             raise ValueError(f"'export' は辞書形式でなければなりません: {config['export']}")
-        for key in ['fbx', 'glb']:
+        for key in ['fbx', 'glb', 'budget_report', 'glb_report']:
             if key in config['export'] and not isinstance(config['export'][key], str):
                 raise ValueError(f"'export.{key}' は文字列でなければなりません: {config['export'][key]}")
+        if 'parallel' in config['export'] and not isinstance(config['export']['parallel'], bool):
+            raise ValueError(f"'export.parallel' は真偽値でなければなりません: {config['export']['parallel']}")
+        if 'glb_compression' in config['export']:
+            from glb_compression import COMPRESSION_KEYS, DRACO_DEFAULTS, QUANTIZE_DEFAULTS
+            compression = config['export']['glb_compression']
+            if not isinstance(compression, dict) or not set(compression) <= set(COMPRESSION_KEYS):
+                raise ValueError(f"'export.glb_compression' は {', '.join(COMPRESSION_KEYS)} をキーとする辞書でなければなりません: {compression}")
+            for key in ('strip_unused', 'compare', 'benchmark'):
+                if not isinstance(compression.get(key, False), bool):
+                    raise ValueError(f"'export.glb_compression.{key}' は真偽値でなければなりません: {compression[key]}")
+            vertex_order = compression.get('vertex_order', False)
+            if not (isinstance(vertex_order, bool) or isinstance(vertex_order, int) and vertex_order > 2):
+                raise ValueError(f"'export.glb_compression.vertex_order' は真偽値または 3 以上のキャッシュサイズでなければなりません: {vertex_order}")
+            draco = compression.get('draco', False)
+            if not isinstance(draco, (bool, dict)) or isinstance(draco, dict) and not all(
+                    k in DRACO_DEFAULTS and isinstance(v, int) and 0 <= v <= (10 if k == 'level' else 30)
+                    for k, v in draco.items()):
+                raise ValueError(f"'export.glb_compression.draco' は真偽値、または {', '.join(DRACO_DEFAULTS)} の整数"
+                                 f"（level は 0〜10、ビット数は 0〜30）の辞書でなければなりません: {draco}")
+            quantize = compression.get('quantize', False)
+            if not isinstance(quantize, (bool, dict)) or isinstance(quantize, dict) and not all(
+                    k in QUANTIZE_DEFAULTS and v in (8, 16) for k, v in quantize.items()):
+                raise ValueError(f"'export.glb_compression.quantize' は真偽値、または {', '.join(QUANTIZE_DEFAULTS)} "
+                                 f"のビット数（8 か 16）の辞書でなければなりません: {quantize}")
     
     log("INFO", "✓ 設定ファイルの検証に成功しました")
     return True
 
-def main():
+# ベースパス設定
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+REPO_ROOT = os.path.dirname(BASE_DIR)
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'stages')
+
+def stage_base(ctx):
+    """2-3. 不要オブジェクト削除と Meta-Rig 追加"""
+    # 2. 不要オブジェクト削除
+    cleanup_scene()
+    log("INFO", "✓ 不要オブジェクト削除完了")
+    
+    # 3. Meta-Rig 自動追加
     try:
-        start_time = time.time()
-        args = parse_args()
-        
-        log_level = args.log_level
-        
-        # ベースパス設定
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
-        if SCRIPTS_DIR not in sys.path:
-            sys.path.append(SCRIPTS_DIR)
-        
-        log("INFO", f"🚀 パイプライン開始: {args.config}")
-        
-        if not os.path.exists(args.config):
-            raise FileNotFoundError(f"設定ファイル '{args.config}' が見つかりません。")
-        
-        try:
-            with open(args.config, 'r') as f:
-                cfg = json.load(f)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"設定ファイル '{args.config}' の解析に失敗しました: {e}")
-        
-        validate_config(cfg)
-        
-        log("INFO", f"✓ キャラクター設定を読み込みました: {args.config}")
-        
-        char_prefix = cfg.get('prefix', 'Base')
-        height = cfg.get('height', 1.58)
-        detail = cfg.get('detail', False)
-        motions = cfg.get('motions', ['Idle', 'Walk', 'Run'])
-        
-        output_dir = args.output or os.path.dirname(args.config)
-        
-        # 1. ベース .blend を開く
-        blend_path = args.blend or os.path.join(os.path.dirname(args.config), 'models', 'base_humanoid.blend')
-        if not os.path.exists(blend_path):
-            raise FileNotFoundError(f"モデルファイル '{blend_path}' が見つかりません。")
-        
-        bpy.ops.wm.open_mainfile(filepath=blend_path)
-        log("INFO", f"✓ ベースファイルを開きました: {blend_path}")
-        
-        # 2. 不要オブジェクト削除
-        cleanup_scene()
-        log("INFO", "✓ 不要オブジェクト削除完了")
-        
-        # 3. Meta-Rig 自動追加
+        bpy.ops.object.armature_human_metarig_add()
+        log("INFO", "✓ Meta-Rig を自動追加しました。")
+    except Exception as e:
+        log("ERROR", f"⚠ Meta-Rig の追加に失敗しました: {e}")
+        raise
+
+def stage_detail(ctx):
+    """4. ディテール加工"""
+    char_prefix = ctx['prefix']
+    if not ctx['cfg'].get('detail', False):
+        return False
+    try:
+        from apply_detail import apply_to_collection
+        mesh_coll = detect_mesh_collection()
+        if not mesh_coll:
+            raise ValueError("メッシュコレクションが見つかりません。detail適用をスキップ。")
+        new_coll = f"{char_prefix}Human"
+        bpy.data.collections[mesh_coll].name = new_coll
+        log("INFO", f"✓ Collection '{mesh_coll}' renamed to '{new_coll}' for detail")
+        apply_to_collection(char_prefix)
+        log("INFO", f"✓ ディテール適用完了: {new_coll}")
+    except ImportError:
         try:
-            bpy.ops.object.armature_human_metarig_add()
-            log("INFO", "✓ Meta-Rig を自動追加しました。")
+            from gen_detail import apply_to_collection
+            mesh_coll = detect_mesh_collection()
+            if not mesh_coll:
+                raise ValueError("メッシュコレクションが見つかりません。detail適用をスキップ。")
+            new_coll = f"{char_prefix}Human"
+            bpy.data.collections[mesh_coll].name = new_coll
+            log("INFO", f"✓ Collection '{mesh_coll}' renamed to '{new_coll}' for detail")
+            apply_to_collection(char_prefix)
+            log("INFO", f"✓ ディテール適用完了: {new_coll}")
         except Exception as e:
-            log("ERROR", f"⚠ Meta-Rig の追加に失敗しました: {e}")
+            log("ERROR", f"⚠ ディテール適用に失敗しました: {e}")
             raise
+    except Exception as e:
+        log("ERROR", f"⚠ ディテール適用に失敗しました: {e}")
+        raise
+
+def stage_model(ctx):
+    """5. モデル高さ調整とスケール適用"""
+    height = ctx['cfg'].get('height', 1.58)
+    try:
+        try:
+            from setup_model import setup_model
+            setup_model(height)
+        except ImportError:
+            from model_setup import setup_model
+            setup_model(height)
+        log("INFO", f"✓ モデルを高さ {height}m にスケーリング完了")
+    except Exception as e:
+        log("ERROR", f"⚠ モデル高さ調整に失敗しました: {e}")
+        raise
+    
+    # スケール適用
+    try:
+        bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.select_all(action='DESELECT')
+        for obj in bpy.data.objects:
+            if obj.type == 'MESH' or (obj.type == 'ARMATURE' and ('metarig' in obj.name.lower() or obj.name.endswith('_rig'))):
+                obj.select_set(True)
+        bpy.ops.object.transform_apply(scale=True)
+        bpy.ops.object.select_all(action='DESELECT')
+        log("INFO", "✓ メッシュとリグに対してスケール適用完了")
+    except Exception as e:
+        log("ERROR", f"⚠ スケール適用に失敗しました: {e}")
+        raise
+
+def stage_lod(ctx):
+    """5.5 LOD メッシュの生成（評価済みメッシュをコラプス Decimate で三角形数の予算まで削減）"""
+    lod = ctx['cfg'].get('lod', False)
+    if not lod:
+        return False
+    try:
+        from lod import generate_lods
         
-        # 4. ディテール加工
-        if detail:
-            try:
-                from apply_detail import apply_to_collection
-                mesh_coll = detect_mesh_collection()
-                if not mesh_coll:
-                    raise ValueError("メッシュコレクションが見つかりません。detail適用をスキップ。")
-                new_coll = f"{char_prefix}Human"
-                bpy.data.collections[mesh_coll].name = new_coll
-                log("INFO", f"✓ Collection '{mesh_coll}' renamed to '{new_coll}' for detail")
-                apply_to_collection(char_prefix)
-                log("INFO", f"✓ ディテール適用完了: {new_coll}")
-            except ImportError:
-                try:
-                    from gen_detail import apply_to_collection
-                    mesh_coll = detect_mesh_collection()
-                    if not mesh_coll:
-                        raise ValueError("メッシュコレクションが見つかりません。detail適用をスキップ。")
-                    new_coll = f"{char_prefix}Human"
-                    bpy.data.collections[mesh_coll].name = new_coll
-                    log("INFO", f"✓ Collection '{mesh_coll}' renamed to '{new_coll}' for detail")
-                    apply_to_collection(char_prefix)
-                    log("INFO", f"✓ ディテール適用完了: {new_coll}")
-                except Exception as e:
-                    log("ERROR", f"⚠ ディテール適用に失敗しました: {e}")
-                    raise
-            except Exception as e:
-                log("ERROR", f"⚠ ディテール適用に失敗しました: {e}")
-                raise
+        report = generate_lods(lod)
+        summary = ', '.join(f"LOD{r['level']}={r['triangles']}" for r in report)
+        log("INFO", f"✓ LOD 生成完了: {summary}")
+    except Exception as e:
+        log("ERROR", f"⚠ LOD 生成に失敗しました: {e}")
+        raise
+
+def stage_rigging(ctx):
+    """6. リギング処理"""
+    try:
+        from rigging import do_rigging
+        do_rigging()
+        log("INFO", "✓ リギング完了")
+    except Exception as e:
+        log("ERROR", f"⚠ リギング処理に失敗しました: {e}")
+        raise
+
+def stage_animation(ctx):
+    """7. アニメーション生成"""
+    motions = ctx['cfg'].get('motions', ['Idle', 'Walk', 'Run'])
+    try:
+        from animation import do_animation
         
-        # 5. モデル高さ調整
-        try:
-            try:
-                from setup_model import setup_model
-                setup_model(height)
-            except ImportError:
-                from model_setup import setup_model
-                setup_model(height)
-            log("INFO", f"✓ モデルを高さ {height}m にスケーリング完了")
-        except Exception as e:
-            log("ERROR", f"⚠ モデル高さ調整に失敗しました: {e}")
-            raise
+        control_bones = ctx['cfg'].get('control_bones')
+        if ctx['use_asset_motions']:
+            motions_path = ctx['motions_path']
+            log("INFO", f"✓ アセットモーションを使用: {motions_path}")
+            do_animation(motions=motions, use_asset_motions=True, motions_path=motions_path,
+                         control_bones=control_bones,
+                         link_asset_motions=ctx['cfg'].get('link_asset_motions', False))
+        else:
+            do_animation(motions=motions, control_bones=control_bones, motion_file=ctx['motion_file'],
+                         gait=ctx['cfg'].get('gait'), height=ctx['cfg'].get('height', 1.58))
         
-        # スケール適用
-        try:
-            bpy.ops.object.mode_set(mode='OBJECT')
-            bpy.ops.object.select_all(action='DESELECT')
-            for obj in bpy.data.objects:
-                if obj.type == 'MESH' or (obj.type == 'ARMATURE' and ('metarig' in obj.name.lower() or obj.name.endswith('_rig'))):
-                    obj.select_set(True)
-            bpy.ops.object.transform_apply(scale=True)
-            bpy.ops.object.select_all(action='DESELECT')
-            log("INFO", "✓ メッシュとリグに対してスケール適用完了")
-        except Exception as e:
-            log("ERROR", f"⚠ スケール適用に失敗しました: {e}")
-            raise
+        log("INFO", "✓ アニメーション生成完了")
+    except Exception as e:
+        log("ERROR", f"⚠ アニメーション生成に失敗しました: {e}")
+        raise
+
+def bake_settings(cfg):
+    """config の bake を {'enabled', 'deform_only_export'} にそろえる"""
+    bake = cfg.get('bake', False)
+    if isinstance(bake, dict):
+        return {'enabled': bake.get('enabled', True), 'deform_only_export': bake.get('deform_only_export', False)}
+    return {'enabled': bool(bake), 'deform_only_export': False}
+
+def stage_bake(ctx):
+    """7.3 コントロールリグのアニメーションをデフォームボーンにベイク"""
+    if not bake_settings(ctx['cfg'])['enabled']:
+        return False
+    try:
+        from bake_deform import bake_deform_actions
         
-        # 6. リギング処理
-        try:
-            from rigging import do_rigging
-            do_rigging()
-            log("INFO", "✓ リギング完了")
-        except Exception as e:
-            log("ERROR", f"⚠ リギング処理に失敗しました: {e}")
-            raise
+        rig = get_rig_object()
+        if not rig:
+            raise RuntimeError("ベイク対象のリグが見つかりません")
+        deform, baked = bake_deform_actions(rig)
+        log("INFO", f"✓ デフォームボーンへのベイク完了: {deform.name} ({len(baked)} アクション)")
+    except Exception as e:
+        log("ERROR", f"⚠ デフォームボーンへのベイクに失敗しました: {e}")
+        raise
+
+def stage_compress(ctx):
+    """7.5 アニメーションカーブの圧縮（冗長キー・定数カーブの削除）"""
+    compression = ctx['cfg'].get('compression', False)
+    if compression is False:
+        return False
+    try:
+        from compress_animation import compress_animations
         
-        # 7. アニメーション生成
-        try:
-            from animation import do_animation
-            
-            if args.use_asset_motions:
-                motions_path = os.path.join(os.path.dirname(BASE_DIR), 'base_assets', 'motions', 'motions.blend')
-                log("INFO", f"✓ アセットモーションを使用: {motions_path}")
-                do_animation(motions=motions, use_asset_motions=True, motions_path=motions_path)
-            else:
-                do_animation(motions=motions)
-            
-            log("INFO", "✓ アニメーション生成完了")
-        except Exception as e:
-            log("ERROR", f"⚠ アニメーション生成に失敗しました: {e}")
-            raise
+        results = compress_animations(tolerances=compression if isinstance(compression, dict) else None)
+        keys_before = sum(r['keys_before'] for r in results.values())
+        keys_after = sum(r['keys_after'] for r in results.values())
+        log("INFO", f"✓ カーブ圧縮完了: {len(results)} アクション, キー {keys_before} → {keys_after}")
+    except Exception as e:
+        log("ERROR", f"⚠ カーブ圧縮に失敗しました: {e}")
+        raise
+
+def stage_merge(ctx):
+    """7.8 ドローコール削減（マテリアルの重複排除・パーツの結合・単色マテリアルのパレット化）"""
+    merge = ctx['cfg'].get('merge', False)
+    if not merge:
+        return False
+    try:
+        from merge_meshes import merge_character
         
-        # 8. .blend ファイルとして保存
-        try:
-            blend_out = os.path.join(output_dir, 'models', f'{char_prefix}_animated.blend')
-            os.makedirs(os.path.dirname(blend_out), exist_ok=True)
+        options = merge if isinstance(merge, dict) else {}
+        result = merge_character(ctx['prefix'], join=options.get('join', True), palette=options.get('palette', True))
+        log("INFO", f"✓ ドローコール削減完了: {result['draw_calls_before']} → {result['draw_calls_after']} "
+                    f"(メッシュ {len(result['objects'])})")
+    except Exception as e:
+        log("ERROR", f"⚠ ドローコール削減に失敗しました: {e}")
+        raise
+
+def stage_vertex_cache(ctx):
+    """7.9 頂点キャッシュに合わせた面・頂点の並べ替え"""
+    vertex_cache = ctx['cfg'].get('vertex_cache', False)
+    if not vertex_cache:
+        return False
+    try:
+        from vertex_cache import optimize_vertex_cache, DEFAULT_CACHE_SIZE
+        
+        options = vertex_cache if isinstance(vertex_cache, dict) else {}
+        results = optimize_vertex_cache(cache_size=options.get('cache_size', DEFAULT_CACHE_SIZE))
+        triangles = sum(r['triangles'] for r in results.values())
+        if triangles:
+            before = sum(r['acmr_before'] * r['triangles'] for r in results.values()) / triangles
+            after = sum(r['acmr_after'] * r['triangles'] for r in results.values()) / triangles
+            log("INFO", f"✓ 頂点キャッシュ最適化完了: {len(results)} メッシュ, ACMR {before:.3f} → {after:.3f}")
+        else:
+            log("INFO", "ℹ 頂点キャッシュ最適化の対象メッシュがありません")
+    except Exception as e:
+        log("ERROR", f"⚠ 頂点キャッシュ最適化に失敗しました: {e}")
+        raise
+
+def animation_inputs(ctx):
+    inputs = {'use_asset_motions': ctx['use_asset_motions']}
+    if ctx['use_asset_motions'] and os.path.exists(ctx['motions_path']):
+        inputs['motions_blend'] = stage_cache.file_digest(ctx['motions_path'])
+    if not ctx['use_asset_motions'] and os.path.exists(ctx['motion_file']):
+        inputs['motion_file'] = stage_cache.file_digest(ctx['motion_file'])
+    return inputs
+
+# チェックポイント対象のステージ。
+# config_keys / sources / inputs がキャッシュキーの入力になる。
+# run が False を返したステージはシーンを変更していないので、.blend を保存せず直前のチェックポイントを参照する。
+PIPELINE_STAGES = [
+    {'name': 'base', 'run': stage_base, 'config_keys': [],
+     'sources': [os.path.join(BASE_DIR, 'utils.py')]},
+    {'name': 'detail', 'run': stage_detail, 'config_keys': ['prefix', 'detail', 'detail_config'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'apply_detail.py')]},
+    {'name': 'model', 'run': stage_model, 'config_keys': ['height'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'setup_model.py'), os.path.join(BASE_DIR, 'mesh_metrics.py')]},
+    {'name': 'lod', 'run': stage_lod, 'config_keys': ['lod'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'lod.py'), os.path.join(BASE_DIR, 'mesh_metrics.py')]},
+    {'name': 'rigging', 'run': stage_rigging, 'config_keys': [],
+     'sources': [os.path.join(SCRIPTS_DIR, 'rigging.py')]},
+    {'name': 'animation', 'run': stage_animation, 'config_keys': ['motions', 'control_bones', 'motion_file', 'gait', 'height', 'link_asset_motions'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'animation.py'), os.path.join(BASE_DIR, 'motion_data.py'),
+                 os.path.join(BASE_DIR, 'gait.py'), os.path.join(SCRIPTS_DIR, 'retarget.py')],
+     'inputs': animation_inputs},
+    {'name': 'bake', 'run': stage_bake, 'config_keys': ['bake'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'bake_deform.py')]},
+    {'name': 'compress', 'run': stage_compress, 'config_keys': ['compression'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'compress_animation.py')]},
+    {'name': 'merge', 'run': stage_merge, 'config_keys': ['merge'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'merge_meshes.py')]},
+    {'name': 'vertex_cache', 'run': stage_vertex_cache, 'config_keys': ['vertex_cache'],
+     'sources': [os.path.join(SCRIPTS_DIR, 'vertex_cache.py')]},
+]
+
+def compute_stage_keys(ctx, blend_path):
+    """全ステージのキャッシュキーを先頭から連鎖的に計算する"""
+    keys = []
+    parent_key = stage_cache.file_digest(blend_path)
+    for stage in PIPELINE_STAGES:
+        inputs = {k: ctx['cfg'].get(k) for k in stage['config_keys']}
+        if 'inputs' in stage:
+            inputs.update(stage['inputs'](ctx))
+        sources = stage['sources'] + [os.path.abspath(__file__)]
+        parent_key = stage_cache.stage_key(parent_key, stage['name'], inputs, sources)
+        keys.append(parent_key)
+    return keys
+
+def find_resume_point(keys, cache_dir):
+    """有効なチェックポイントが残っている最後のステージ番号を返す（なければ -1）"""
+    for i in range(len(keys) - 1, -1, -1):
+        path = stage_cache.lookup(cache_dir, keys[i])
+        if path:
+            return i, path
+    return -1, None
+
+def log_info(message):
+    log("INFO", message)
+
+def run_pipeline(config_path, output_dir=None, blend_path=None, use_asset_motions=False,
+                 cache_dir=DEFAULT_CACHE_DIR, cache_max_bytes=stage_cache.DEFAULT_MAX_BYTES,
+                 trace_path=None, profile=False, profile_top=20, parallel_export=False):
+    """
+    1キャラクター分のパイプラインを実行する。失敗時は例外を送出する。
+    ベース .blend を開き直すところから始まるため、同じ Blender プロセスで
+    繰り返し呼び出せる（worker.py から利用）。
+    cache_dir が指定されていれば各ステージ後の .blend をチェックポイントし、
+    入力が変わっていない最後のステージから再開する。
+    trace_path / profile が指定されていればステージごとに計測する。
+    parallel_export (または config の export.parallel) が真なら FBX/GLB を並列に書き出す。
+    """
+    if SCRIPTS_DIR not in sys.path:
+        sys.path.append(SCRIPTS_DIR)
+
+    if trace_path or profile:
+        tracing.enable(profile=profile, profile_top=profile_top)
+    try:
+        with tracing.span("pipeline", config=config_path):
+            return _run_pipeline(config_path, output_dir, blend_path, use_asset_motions,
+                                 cache_dir, cache_max_bytes, parallel_export)
+    finally:
+        if trace_path:
+            count = tracing.write_trace(trace_path)
+            log("INFO", f"✓ トレースを書き出しました: {trace_path} ({count} spans)")
+        tracing.disable()
+
+def _run_pipeline(config_path, output_dir, blend_path, use_asset_motions, cache_dir, cache_max_bytes,
+                  parallel_export):
+    start_time = time.time()
+    
+    log("INFO", f"🚀 パイプライン開始: {config_path}")
+    
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"設定ファイル '{config_path}' が見つかりません。")
+    
+    try:
+        with open(config_path, 'r') as f:
+            cfg = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"設定ファイル '{config_path}' の解析に失敗しました: {e}")
+    
+    validate_config(cfg)
+    
+    log("INFO", f"✓ キャラクター設定を読み込みました: {config_path}")
+    
+    char_prefix = cfg.get('prefix', 'Base')
+    output_dir = output_dir or os.path.dirname(config_path)
+    ctx = {
+        'cfg': cfg,
+        'prefix': char_prefix,
+        'use_asset_motions': use_asset_motions,
+        'motions_path': os.path.join(REPO_ROOT, 'base_assets', 'motions', 'motions.blend'),
+        'motion_file': os.path.join(REPO_ROOT, cfg['motion_file']) if cfg.get('motion_file')
+                       else os.path.join(BASE_DIR, 'motions', 'default.json'),
+    }
+    
+    # 1. ベース .blend を開く（キャッシュがあれば最後のチェックポイントから再開）
+    blend_path = blend_path or os.path.join(os.path.dirname(config_path), 'models', 'base_humanoid.blend')
+    if not os.path.exists(blend_path):
+        raise FileNotFoundError(f"モデルファイル '{blend_path}' が見つかりません。")
+    
+    keys = compute_stage_keys(ctx, blend_path) if cache_dir else []
+    resume_index, resume_path = find_resume_point(keys, cache_dir) if cache_dir else (-1, None)
+    
+    with tracing.stage('open', log_info):
+        if resume_path:
+            bpy.ops.wm.open_mainfile(filepath=resume_path)
+            log("INFO", f"♻ キャッシュから再開: ステージ '{PIPELINE_STAGES[resume_index]['name']}' まで完了済み ({resume_path})")
+        else:
+            bpy.ops.wm.open_mainfile(filepath=blend_path)
+            log("INFO", f"✓ ベースファイルを開きました: {blend_path}")
+    
+    # 現在のシーンと同じ内容のチェックポイントのキー
+    current_key = keys[resume_index] if resume_path else None
+    for i, stage in enumerate(PIPELINE_STAGES):
+        if i <= resume_index:
+            continue
+        with tracing.stage(stage['name'], log_info):
+            changed = stage['run'](ctx) is not False
+        if cache_dir:
+            if not changed and current_key:
+                stage_cache.alias(cache_dir, keys[i], current_key)
+                log("INFO", f"✓ チェックポイント参照: ステージ '{stage['name']}' は変更なし")
+            else:
+                with tracing.span("checkpoint", stage=stage['name']):
+                    stage_cache.store(cache_dir, keys[i], cache_max_bytes)
+                log("INFO", f"✓ チェックポイント保存: ステージ '{stage['name']}'")
+            current_key = keys[i]
+        pipeline_logger.flush()
+    
+    # 8. .blend ファイルとして保存
+    try:
+        blend_out = os.path.join(output_dir, 'models', f'{char_prefix}_animated.blend')
+        os.makedirs(os.path.dirname(blend_out), exist_ok=True)
+        with tracing.stage('save', log_info):
             bpy.ops.wm.save_mainfile(filepath=blend_out)
-            log("INFO", f"✓ アニメーション入り .blend を保存: {blend_out}")
-        except Exception as e:
-            log("ERROR", f"⚠ .blend ファイルの保存に失敗しました: {e}")
-            raise
+        log("INFO", f"✓ アニメーション入り .blend を保存: {blend_out}")
+    except Exception as e:
+        log("ERROR", f"⚠ .blend ファイルの保存に失敗しました: {e}")
+        raise
+    
+    # 8.5 ランタイムコストの計測と予算チェック（予算超過ならエクスポート前に失敗させる）
+    export_cfg = cfg.get('export', {})
+    budget_report = os.path.join(output_dir, export_cfg.get('budget_report', f'assets/{char_prefix.lower()}_budget.json'))
+    try:
+        from runtime_budget import profile_character
+        with tracing.stage('budget', log_info):
+            budget_result = profile_character(cfg.get('budgets'), budget_report,
+                                              deform_only=bake_settings(cfg)['deform_only_export'])
+    except Exception as e:
+        log("ERROR", f"⚠ ランタイム予算のチェックに失敗しました: {e}")
+        raise
+    
+    # 9. 出力用ボーン制御（オプション）
+    rig = get_rig_object()
+    if rig:
+        for bone in rig.data.bones:
+            bone.use_deform = bone.use_deform
+    
+    # 10. FBX/GLB エクスポート
+    try:
+        fbx_path = os.path.join(output_dir, export_cfg.get('fbx', f'assets/fbx/{char_prefix.lower()}.fbx'))
+        glb_path = os.path.join(output_dir, export_cfg.get('glb', f'assets/glb/{char_prefix.lower()}.glb'))
         
-        # 9. 出力用ボーン制御（オプション）
-        rig = get_rig_object()
-        if rig:
-            for bone in rig.data.bones:
-                bone.use_deform = bone.use_deform
+        os.makedirs(os.path.dirname(fbx_path), exist_ok=True)
+        os.makedirs(os.path.dirname(glb_path), exist_ok=True)
         
-        # 10. FBX/GLB エクスポート
+        deform_only = bake_settings(cfg)['deform_only_export']
+        glb_compression = export_cfg.get('glb_compression')
+        glb_options = {'compression': glb_compression} if glb_compression else {}
+        vertex_cache = cfg.get('vertex_cache', False)
+        if vertex_cache:
+            # glTF エクスポーターは頂点を作り直すため、書き出した GLB の三角形と頂点もプリミティブごとに並べ替える
+            cache_size = vertex_cache.get('cache_size', True) if isinstance(vertex_cache, dict) else True
+            glb_options = {'compression': {'vertex_order': cache_size,
+                                           **(glb_compression or {'compare': False, 'benchmark': False})}}
+        targets = [
+            {'format': 'fbx', 'path': fbx_path, 'options': {'use_armature_deform_only': True}},
+            {'format': 'glb', 'path': glb_path, 'options': glb_options},
+        ]
+        for target in targets:
+            target['deform_only'] = deform_only
+        
+        with tracing.stage('export', log_info):
+            if parallel_export or export_cfg.get('parallel', False):
+                # 8. で保存した .blend から形式ごとに Blender を起動して並列に書き出す
+                results = export_parallel(blend_out, targets,
+                                          log_dir=os.path.join(output_dir, 'logs'),
+                                          timeout=export_cfg.get('timeout', 1800))
+                for r in results:
+                    log("INFO", f"  ✓ {r['format'].upper()}: {r['path']} ({r['size']} bytes, {r['duration']:.2f}秒)")
+                reports = {r['format']: r['report'] for r in results}
+            else:
+                # 保存済みなので、このセッションのシーンは書き換えてよい
+                from bake_deform import prepare_export
+                prepare_export(deform_only)
+                reports = {}
+                for target in targets:
+                    with tracing.span(f"export_{target['format']}"):
+                        reports[target['format']] = EXPORTERS[target['format']](target['path'], **target['options'])
+        log("INFO", f"✓ パイプライン完了: FBX→{fbx_path}, GLB→{glb_path}")
+    except Exception as e:
+        log("ERROR", f"⚠ エクスポートに失敗しました: {e}")
+        raise
+    
+    # 10.5 GLB の圧縮レポート（サイズの差分とデコード時間）
+    glb_report = None
+    if glb_compression:
+        glb_report = os.path.join(output_dir, export_cfg.get('glb_report', f'assets/{char_prefix.lower()}_glb.json'))
+        os.makedirs(os.path.dirname(glb_report), exist_ok=True)
+        with open(glb_report, 'w', encoding='utf-8') as f:
+            json.dump(reports.get('glb'), f, ensure_ascii=False, indent=2)
+        log("INFO", f"✓ GLB の圧縮レポートを書き出しました: {glb_report}")
+    
+    # 11. 体型バリエーションのエクスポート（同じセッションでメッシュとリグの静止位置だけを変形して書き出す）
+    variant_results = []
+    if cfg.get('variants'):
         try:
-            export_cfg = cfg.get('export', {})
-            fbx_path = os.path.join(output_dir, export_cfg.get('fbx', f'assets/fbx/{char_prefix.lower()}.fbx'))
-            glb_path = os.path.join(output_dir, export_cfg.get('glb', f'assets/glb/{char_prefix.lower()}.glb'))
-            
-            os.makedirs(os.path.dirname(fbx_path), exist_ok=True)
-            os.makedirs(os.path.dirname(glb_path), exist_ok=True)
-            
-            bpy.ops.export_scene.fbx(
-                filepath=fbx_path,
-                use_armature_deform_only=True
-            )
-            bpy.ops.export_scene.gltf(filepath=glb_path)
-            log("INFO", f"✓ パイプライン完了: FBX→{fbx_path}, GLB→{glb_path}")
+            from variants import export_variants
+            if parallel_export or export_cfg.get('parallel', False):
+                from bake_deform import prepare_export
+                prepare_export(deform_only)
+            if 'compression' in glb_options:
+                # 圧縮なしとの比較とデコード時間の計測は基本体型だけで行う
+                targets = [{**t, 'options': {**t['options'], 'compression': {**t['options']['compression'], 'compare': False, 'benchmark': False}}}
+                           if t['format'] == 'glb' else t for t in targets]
+            with tracing.stage('variants', log_info):
+                variant_results = export_variants(cfg['variants'], targets, EXPORTERS)
+            log("INFO", f"✓ 体型バリエーション {len(cfg['variants'])} 体をエクスポートしました")
         except Exception as e:
-            log("ERROR", f"⚠ エクスポートに失敗しました: {e}")
+            log("ERROR", f"⚠ 体型バリエーションのエクスポートに失敗しました: {e}")
             raise
-        
-        end_time = time.time()
-        elapsed = end_time - start_time
-        minutes = int(elapsed // 60)
-        seconds = int(elapsed % 60)
-        log("INFO", f"✅ パイプライン完了: 所要時間 {minutes}分 {seconds}秒")
-        
+    
+    end_time = time.time()
+    elapsed = end_time - start_time
+    minutes = int(elapsed // 60)
+    seconds = int(elapsed % 60)
+    log("INFO", f"✅ パイプライン完了: 所要時間 {minutes}分 {seconds}秒")
+    
+    return {'blend': blend_out, 'fbx': fbx_path, 'glb': glb_path, 'variants': variant_results,
+            'budget': budget_result['metrics'], 'budget_report': budget_report,
+            'glb_compression': reports.get('glb'), 'glb_report': glb_report, 'elapsed': elapsed}
+
+def main():
+    try:
+        args = parse_args()
+        pipeline_logger.configure(args.log_level, json_path=args.log_json)
+        run_pipeline(args.config, output_dir=args.output, blend_path=args.blend,
+                     use_asset_motions=args.use_asset_motions,
+                     cache_dir=None if args.no_cache else args.cache_dir,
+                     cache_max_bytes=args.cache_max_mb * 1024 ** 2,
+                     trace_path=args.trace, profile=args.profile, profile_top=args.profile_top,
+                     parallel_export=args.parallel_export)
         return 0
     except Exception as e:
         log("ERROR", f"❌ パイプライン実行中にエラーが発生しました: {e}")
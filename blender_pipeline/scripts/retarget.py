@@ -0,0 +1,175 @@
+# scripts/retarget.py
+"""
+ボーン名のリターゲット（ボーン名の異なるリグへのアクションの付け替え）
+
+ライブラリのアクションが参照するボーン名と、対象リグのボーン名から対応表を作る:
+  1. 同名のボーン
+  2. control_bones の役割（torso / arm_l / ...）ごとに、双方で最初に見つかった候補どうし
+  3. Rigify の命名規則に沿った正規化名（ORG-/DEF-/MCH- などの接頭辞、左右の表記
+     .L/_L/-L/Left、大文字小文字の違いを吸収）が一致するボーン
+
+対応表はボーン名集合のハッシュの組ごとに .cache/retarget/ に保存し、同じ組み合わせでは
+再計算しない。書き換えはユニークな data_path ごとに1回だけ文字列を作り、
+全アクションの F カーブに一括で適用する。
+"""
+import bpy
+import os
+import re
+import sys
+import json
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+from motion_data import DEFAULT_CONTROL_BONES, REPO_ROOT
+import tracing
+
+logger = get_logger('retarget')
+
+DEFAULT_CACHE_DIR = os.path.join(REPO_ROOT, '.cache', 'retarget')
+
+# 対応表の作り方を変えたら上げる（既存のキャッシュを使わない）
+MAP_VERSION = 1
+
+BONE_PATH_RE = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]')
+RIGIFY_PREFIX_RE = re.compile(r'^(?:org|def|mch|mixamorig:)[-_.]?', re.IGNORECASE)
+SIDE_SUFFIX_RE = re.compile(r'[-_. ](l|r|left|right)$', re.IGNORECASE)
+SIDE_PREFIX_RE = re.compile(r'^(left|right)[-_. ]?', re.IGNORECASE)
+
+_memo = {}
+
+def bone_set_hash(bone_names):
+    return hashlib.sha256("\n".join(sorted(bone_names)).encode('utf-8')).hexdigest()
+
+def normalize_bone_name(name):
+    """Rigify の命名規則で同じボーンを指す名前を同じ文字列にそろえる"""
+    name = RIGIFY_PREFIX_RE.sub('', name)
+    side = ''
+    m = SIDE_SUFFIX_RE.search(name) or SIDE_PREFIX_RE.search(name)
+    if m:
+        side = '.' + m.group(1)[0].lower()
+        name = name[:m.start()] + name[m.end():]
+    return re.sub(r'[-_ ]', '.', name.lower()) + side
+
+def action_bone_names(actions):
+    """アクションの F カーブが参照するボーン名の集合"""
+    names = set()
+    for action in actions:
+        for fc in action.fcurves:
+            m = BONE_PATH_RE.match(fc.data_path)
+            if m:
+                names.add(m.group(1))
+    return names
+
+def build_bone_map(source_bones, target_bones, control_bones=None):
+    """
+    ソースのボーン名 → ターゲットのボーン名の対応表を作る（対応のないボーンは含めない）。
+    """
+    target_set = set(target_bones)
+    bone_map = {name: name for name in source_bones if name in target_set}
+
+    roles = dict(DEFAULT_CONTROL_BONES, **(control_bones or {}))
+    for candidates in roles.values():
+        src = next((c for c in candidates if c in source_bones), None)
+        dst = next((c for c in candidates if c in target_set), None)
+        if src and dst and src not in bone_map:
+            bone_map[src] = dst
+
+    # 正規化名が一意に一致するものだけを対応させる
+    by_normalized = {}
+    for name in target_bones:
+        by_normalized.setdefault(normalize_bone_name(name), []).append(name)
+    for name in source_bones:
+        if name in bone_map:
+            continue
+        matches = by_normalized.get(normalize_bone_name(name), [])
+        if len(matches) == 1:
+            bone_map[name] = matches[0]
+    return bone_map
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.json")
+
+def cached_bone_map(source_bones, target_bones, control_bones=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    build_bone_map の結果を (ソースのハッシュ, ターゲットのハッシュ, control_bones) ごとにキャッシュして返す。
+    """
+    roles_hash = hashlib.sha256(json.dumps(control_bones or {}, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f"{bone_set_hash(source_bones)[:16]}_{bone_set_hash(target_bones)[:16]}_{roles_hash[:8]}_v{MAP_VERSION}"
+    if key in _memo:
+        return _memo[key]
+
+    path = _cache_path(cache_dir, key) if cache_dir else None
+    bone_map = None
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                bone_map = json.load(f)
+        except (OSError, ValueError):
+            bone_map = None
+    if bone_map is None:
+        bone_map = build_bone_map(source_bones, target_bones, control_bones)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(bone_map, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp_path, path)
+    _memo[key] = bone_map
+    return bone_map
+
+def rewrite_actions(actions, bone_map):
+    """
+    全アクションの F カーブの data_path とボーン名のグループを bone_map に従って書き換える。
+    戻り値: 書き換えた F カーブの数
+    """
+    new_paths = {}
+
+    def remap(data_path):
+        if data_path not in new_paths:
+            m = BONE_PATH_RE.match(data_path)
+            target = bone_map.get(m.group(1)) if m else None
+            new_paths[data_path] = (f'pose.bones["{target}"]' + data_path[m.end():]
+                                    if target and target != m.group(1) else None)
+        return new_paths[data_path]
+
+    rewritten = 0
+    for action in actions:
+        for fc in action.fcurves:
+            new_path = remap(fc.data_path)
+            if new_path:
+                fc.data_path = new_path
+                rewritten += 1
+        for group in action.groups:
+            target = bone_map.get(group.name)
+            if target and target != group.name:
+                group.name = target
+    return rewritten
+
+def retarget_actions(rig, actions, control_bones=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    アクションが参照するボーンのうち rig にないものを、対応表に従って rig のボーンに付け替える。
+    リンクされた（編集できない）アクションはローカル化してから書き換える。
+    戻り値: {元のアクション名: 書き換え後のアクション}
+    """
+    target_bones = [b.name for b in rig.pose.bones]
+    target_set = set(target_bones)
+    source_bones = action_bone_names(actions.values())
+    if source_bones <= target_set:
+        return actions
+
+    with tracing.span("retarget_actions", actions=len(actions)):
+        bone_map = cached_bone_map(sorted(source_bones), target_bones, control_bones, cache_dir)
+        unmapped = sorted(b for b in source_bones if b not in target_set and b not in bone_map)
+        if unmapped:
+            logger.warning(f"⚠ リグ '{rig.name}' に対応するボーンが見つかりません: {unmapped}")
+
+        result = {}
+        for name, action in actions.items():
+            if action.library is not None:
+                action = action.make_local()
+                logger.info(f"  リンクされたアクション '{name}' をリターゲットのためローカル化しました。")
+            result[name] = action
+        rewritten = rewrite_actions(result.values(), bone_map)
+    logger.info(f"✓ {len(actions)} アクションの Fカーブ {rewritten} 本をリグ '{rig.name}' のボーン名に付け替えました。")
+    return result
@@ -0,0 +1,176 @@
+# scripts/runtime_budget.py
+"""
+エクスポートするキャラクターのランタイムコストの計測と予算チェック
+
+評価済みメッシュ・アーマチュア・アクションから、エンジン上のコストに直結する指標を計測する:
+  triangles       モディファイア適用後の三角形数（LOD がある場合は LOD0 のみ）
+  draw_calls      メッシュごとに実際に使われているマテリアル数の合計
+  materials       使われているマテリアルの種類数
+  bones           デフォームボーン数
+  max_influences  1頂点あたりの最大ボーン影響数（デフォームボーンの頂点グループでウェイト > 0）
+  morph_targets   シェイプキー数（Basis を除く）の合計
+  keyframes       エクスポートされるアクションのキーフレーム数の合計
+
+config の budgets にプラットフォームごとの上限を書くと、計測値と比較して超過を報告する:
+  "budgets": {
+    "enforce": ["mobile"],
+    "platforms": {
+      "mobile": {"triangles": 8000, "draw_calls": 2, "bones": 60, "max_influences": 4},
+      "pc":     {"triangles": 30000, "draw_calls": 6}
+    }
+  }
+enforce が true（全プラットフォーム）またはプラットフォーム名のリストなら、超過時にビルドを失敗させる。
+"""
+import bpy
+import os
+import re
+import sys
+import json
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from logger import get_logger
+from utils import export_meshes
+from bake_deform import BAKED_FROM_PROP, DEFORM_OF_PROP
+import tracing
+
+logger = get_logger('runtime_budget')
+
+METRICS = ('triangles', 'draw_calls', 'materials', 'bones', 'max_influences', 'morph_targets', 'keyframes')
+
+# LOD1 以降（LOD0 と別に描画されるため三角形数・ドローコールには含めない）
+LOWER_LOD_RE = re.compile(r'_LOD[1-9]\d*$')
+
+def _mesh_costs(obj, depsgraph):
+    """評価済みメッシュの三角形数と、面で使われているマテリアルのリスト"""
+    source = obj.evaluated_get(depsgraph)
+    mesh = source.to_mesh()
+    try:
+        count = len(mesh.polygons)
+        loop_totals = np.empty(count, dtype=np.int32)
+        material_indices = np.empty(count, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', loop_totals)
+        mesh.polygons.foreach_get('material_index', material_indices)
+        materials = [mesh.materials[i] if i < len(mesh.materials) else None for i in np.unique(material_indices)]
+        return int(np.sum(loop_totals - 2)), materials
+    finally:
+        source.to_mesh_clear()
+
+def max_influences(obj, deform_bones):
+    """
+    デフォームボーンの頂点グループでウェイトが 0 より大きい、1頂点あたりの最大数。
+    頂点ごとのグループは foreach_get で取れないため、頂点の groups を順に数える。
+    """
+    deform_groups = {g.index for g in obj.vertex_groups if g.name in deform_bones}
+    if not deform_groups or not len(obj.data.vertices):
+        return 0
+    counts = np.fromiter((sum(1 for g in v.groups if g.group in deform_groups and g.weight > 0.0)
+                          for v in obj.data.vertices), dtype=np.int32, count=len(obj.data.vertices))
+    return int(counts.max())
+
+def export_armatures(deform_only=False):
+    """エクスポートされるアーマチュア（deform_only ならデフォーム専用アーマチュア）"""
+    if deform_only:
+        return [o for o in bpy.data.objects if o.type == 'ARMATURE' and o.get(DEFORM_OF_PROP)]
+    return [o for o in bpy.context.scene.objects
+            if o.type == 'ARMATURE' and 'metarig' not in o.name.lower()]
+
+def export_actions(deform_only=False):
+    """エクスポートされるアクション（deform_only ならベイク済みアクション、それ以外はベイク元）"""
+    actions = [a for a in bpy.data.actions if a.users > 0]
+    if deform_only:
+        return [a for a in actions if a.get(BAKED_FROM_PROP)]
+    return [a for a in actions if not a.get(BAKED_FROM_PROP)]
+
+def measure(deform_only=False):
+    """
+    シーンのランタイムコストを計測する。
+    戻り値: {指標: 値, ..., 'objects': [{'name', 'triangles', 'draw_calls', 'max_influences', 'morph_targets'}, ...],
+             'lods': [LOD ごとの三角形数] (LOD がある場合)}
+    """
+    meshes = export_meshes()
+    armatures = export_armatures(deform_only)
+    deform_bones = {b.name for arm in armatures for b in arm.data.bones if b.use_deform}
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    per_object, used_materials, lods = [], set(), {}
+    for obj in meshes:
+        triangles, materials = _mesh_costs(obj, depsgraph)
+        m = re.search(r'_LOD(\d+)$', obj.name)
+        if m:
+            level = int(m.group(1))
+            lods[level] = lods.get(level, 0) + triangles
+        if LOWER_LOD_RE.search(obj.name):
+            continue
+        used_materials.update(mat.name for mat in materials if mat is not None)
+        key_blocks = obj.data.shape_keys.key_blocks if obj.data.shape_keys else []
+        per_object.append({
+            'name': obj.name,
+            'triangles': triangles,
+            'draw_calls': len(materials) if triangles else 0,
+            'max_influences': max_influences(obj, deform_bones),
+            'morph_targets': max(0, len(key_blocks) - 1),
+        })
+
+    actions = export_actions(deform_only)
+    report = {
+        'triangles': sum(o['triangles'] for o in per_object),
+        'draw_calls': sum(o['draw_calls'] for o in per_object),
+        'materials': len(used_materials),
+        'bones': len(deform_bones),
+        'max_influences': max((o['max_influences'] for o in per_object), default=0),
+        'morph_targets': sum(o['morph_targets'] for o in per_object),
+        'keyframes': sum(len(fc.keyframe_points) for a in actions for fc in a.fcurves),
+        'objects': per_object,
+    }
+    if lods:
+        report['lods'] = [lods[level] for level in sorted(lods)]
+    return report
+
+def check_budgets(report, platforms):
+    """
+    計測値をプラットフォームごとの上限と比較する。
+    戻り値: {プラットフォーム: [{'metric', 'value', 'budget'}, ...]}（超過した指標のみ）
+    """
+    return {platform: [{'metric': metric, 'value': report[metric], 'budget': budget}
+                       for metric, budget in limits.items() if report[metric] > budget]
+            for platform, limits in platforms.items()}
+
+def profile_character(budgets=None, report_path=None, deform_only=False):
+    """
+    計測して予算と比較し、report_path に JSON で書き出す。
+    budgets.enforce で指定したプラットフォームの予算を超えていれば RuntimeError を送出する。
+    戻り値: レポート（{'metrics', 'budgets', 'exceeded'}）
+    """
+    budgets = budgets or {}
+    platforms = budgets.get('platforms', {})
+    with tracing.span("runtime_budget:measure"):
+        started = time.perf_counter()
+        metrics = measure(deform_only)
+        elapsed = time.perf_counter() - started
+    exceeded = check_budgets(metrics, platforms)
+
+    summary = ', '.join(f"{k}={metrics[k]}" for k in METRICS)
+    logger.info(f"✓ ランタイムコスト: {summary} ({elapsed:.2f}秒)")
+    for platform, over in exceeded.items():
+        for item in over:
+            logger.warning(f"⚠ [{platform}] {item['metric']} が予算を超えています: {item['value']} > {item['budget']}")
+
+    result = {'metrics': metrics, 'budgets': platforms, 'exceeded': exceeded}
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        logger.info(f"✓ ランタイムコストのレポートを書き出しました: {report_path}")
+
+    enforce = budgets.get('enforce', False)
+    enforced = list(platforms) if enforce is True else (enforce or [])
+    failed = [p for p in enforced if exceeded.get(p)]
+    if failed:
+        details = '; '.join(f"{p}: " + ', '.join(f"{i['metric']} {i['value']} > {i['budget']}" for i in exceeded[p])
+                            for p in failed)
+        raise RuntimeError(f"ランタイム予算を超えています ({details})")
+    return result
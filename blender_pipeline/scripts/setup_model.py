@@ -1,5 +1,11 @@
 # scripts/model_setup.py
 import bpy
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tracing
+from mesh_metrics import scene_metrics
 
 def setup_model(target_height=1.58):
     """
@@ -13,18 +19,10 @@ def setup_model(target_height=1.58):
         print("警告: メッシュオブジェクトが見つかりません。スケールをスキップします。")
         return
 
-    # 全頂点のZ座標から最小・最大を求める
-    min_z = float('inf')
-    max_z = float('-inf')
-    for obj in mesh_objs:
-        # グローバル座標系に変換して頂点を評価
-        mat = obj.matrix_world
-        for v in obj.data.vertices:
-            z_world = mat @ v.co
-            min_z = min(min_z, z_world.z)
-            max_z = max(max_z, z_world.z)
-
-    current_height = max_z - min_z
+    # 全頂点のワールド座標から高さを求める
+    with tracing.span("setup_model:measure", objects=len(mesh_objs)):
+        metrics = scene_metrics(mesh_objs)
+    current_height = metrics['height']
     if current_height <= 0:
         print("警告: モデルの高さを計測できません。スケールをスキップします。")
         return
@@ -0,0 +1,134 @@
+# scripts/stage_cache.py
+"""
+パイプラインのステージキャッシュ
+
+各ステージのキーは「直前ステージのキー + 依存する設定値 + ステージの
+スクリプトソース + Blender バージョン」のハッシュで決まる。先頭ステージの
+キーにはベース .blend の内容ハッシュが入るため、キーの連鎖がそのまま
+入力 .blend の内容アドレスになる。ステージ完了後の .blend を
+<cache_dir>/<key>.blend にチェックポイントし、合計サイズが上限を超えたら
+最終利用時刻の古い順に削除する (LRU)。
+シーンを変更しなかったステージは .blend を保存せず、<key>.alias に
+直前のチェックポイントのキーを書いて同じ .blend を参照させる。
+"""
+import bpy
+import os
+import json
+import hashlib
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """ファイル内容の SHA-256 を返す"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def stage_key(parent_key, stage_name, inputs, source_paths):
+    """
+    ステージのキャッシュキーを計算する。
+    inputs は JSON シリアライズ可能な辞書、source_paths はステージが依存するスクリプト。
+    """
+    payload = {
+        'parent': parent_key,
+        'stage': stage_name,
+        'inputs': inputs,
+        'sources': {os.path.basename(p): file_digest(p) for p in source_paths if os.path.exists(p)},
+        'blender': bpy.app.version_string,
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def checkpoint_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.blend")
+
+def alias_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.alias")
+
+def resolve(cache_dir, key):
+    """エイリアスをたどって、.blend を持つチェックポイントのキーを返す"""
+    seen = set()
+    while key not in seen:
+        seen.add(key)
+        try:
+            with open(alias_path(cache_dir, key), 'r', encoding='utf-8') as f:
+                key = f.read().strip()
+        except FileNotFoundError:
+            return key
+    return key
+
+def lookup(cache_dir, key):
+    """チェックポイントがあればパスを返し、LRU のため最終利用時刻を更新する"""
+    path = checkpoint_path(cache_dir, resolve(cache_dir, key))
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return None
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path
+
+def store(cache_dir, key, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    現在のシーンをチェックポイントとして保存する。
+    並列ビルドで同じキーを書き込んでも壊れないよう、一時ファイルに保存してから置き換える。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = checkpoint_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp.blend"
+    bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True, compress=False)
+    os.replace(tmp_path, path)
+    evict(cache_dir, max_bytes)
+    return path
+
+def alias(cache_dir, key, target_key):
+    """
+    シーンを変更しなかったステージのキー key を、直前のチェックポイント target_key の別名として記録する。
+    戻り値: 参照先の .blend のパス
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    target_key = resolve(cache_dir, target_key)
+    path = alias_path(cache_dir, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(target_key)
+    os.replace(tmp_path, path)
+    return checkpoint_path(cache_dir, target_key)
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """合計サイズが max_bytes 以下になるまで古いチェックポイントから削除する"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.blend') or '.tmp.' in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+
+    # 参照先の .blend が消えたエイリアスを削除する
+    for name in os.listdir(cache_dir):
+        if name.endswith('.alias'):
+            key = name[:-len('.alias')]
+            if not os.path.isfile(checkpoint_path(cache_dir, resolve(cache_dir, key))):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    pass
+    return removed
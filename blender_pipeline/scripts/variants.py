@@ -0,0 +1,240 @@
+# scripts/variants.py
+"""
+体型バリエーション（身長・頭身・手足の長さ・体格）の一括エクスポート
+
+1体分のパイプライン（Rigify・アニメーション・ベイク）を実行したシーンから、
+config の variants に挙げた体型ごとにメッシュとリグの静止位置だけを変形して書き出す。
+トポロジーとアクションは共通なので、22人分の身長違いでもビルドは1回で済む。
+
+変形はワールド座標の区分線形な写像で、メッシュの頂点（シェイプキーがあれば各キー）と
+全アーマチュアのエディットボーンの head / tail に同じ写像を適用する:
+  - 縦方向: 足元〜股関節 (legs)・股関節〜首 (torso)・首〜頭頂 (head) の区間ごとの伸縮
+  - 横方向: 肩より内側は width、外側（T ポーズの腕）は arms の伸縮。奥行きは width
+  - 首より上は頭の大きさ (head) で横方向にも拡大縮小する
+  - 最後に全体を一様に拡大縮小して、頭頂の高さを height に合わせる
+
+  "variants": {
+    "No07": {"height": 1.72},
+    "No10": {"height": 1.60, "legs": 1.05, "head": 0.95}
+  }
+
+頂点と静止位置は NumPy 配列で一括変換し、全バリエーションの書き出し後に元に戻す。
+位置キー（ルートモーションなど）は変形しない。
+"""
+import bpy
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from logger import get_logger
+from mesh_metrics import scene_metrics, world_coordinates
+from utils import export_meshes
+import tracing
+
+logger = get_logger('variants')
+
+# バリエーションに指定できるパラメータ（height は m、それ以外は元の体型に対する倍率）
+VARIANT_KEYS = ('height', 'legs', 'torso', 'head', 'arms', 'width')
+
+# 体型の区切りを取るボーン（Rigify のリグ / メタリグで最初に見つかったもの）
+LANDMARK_BONES = {
+    'hip': ['DEF-thigh.L', 'thigh.L', 'ORG-thigh.L'],
+    'neck': ['DEF-spine.004', 'spine.004', 'ORG-spine.004', 'neck'],
+    'shoulder': ['DEF-upper_arm.L', 'upper_arm.L', 'ORG-upper_arm.L'],
+}
+
+# ボーンが見つからないときの区切り（身長に対する比率。shoulder は体の中心からの距離）
+DEFAULT_LANDMARKS = {'hip': 0.47, 'neck': 0.82, 'shoulder': 0.12}
+
+# 首の上下でこの幅（身長に対する比率）をかけて横方向の倍率を width から head に切り替える
+HEAD_BLEND = 0.04
+
+def variant_path(path, name):
+    """出力パスのファイル名にバリエーション名を付ける（assets/fbx/x.fbx → assets/fbx/x_No07.fbx）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+def find_landmarks(armatures, floor, height):
+    """
+    体型の区切り {'hip': z, 'neck': z, 'shoulder': |x|}（ワールド座標）を返す。
+    ボーンが見つからない区切りは DEFAULT_LANDMARKS で補う。
+    """
+    landmarks = {}
+    for key, candidates in LANDMARK_BONES.items():
+        for arm in armatures:
+            bone = next((arm.data.bones[n] for n in candidates if n in arm.data.bones), None)
+            if bone is None:
+                continue
+            head = arm.matrix_world @ bone.head_local
+            landmarks[key] = abs(head.x) if key == 'shoulder' else head.z
+            break
+    for key, ratio in DEFAULT_LANDMARKS.items():
+        if key not in landmarks:
+            landmarks[key] = ratio * height + (floor if key != 'shoulder' else 0.0)
+            logger.debug("  区切り '%s' のボーンが見つからないため既定値を使います: %.3f", key, landmarks[key])
+    return landmarks
+
+def variant_mapping(params, landmarks, floor, height):
+    """
+    バリエーションのパラメータから、ワールド座標 (N, 3) を変形する関数を返す。
+    """
+    legs, torso, head = (params.get(k, 1.0) for k in ('legs', 'torso', 'head'))
+    arms, width = params.get('arms', 1.0), params.get('width', 1.0)
+    hip, neck, shoulder = landmarks['hip'], landmarks['neck'], landmarks['shoulder']
+    top = floor + height
+
+    # 縦方向: 区切りの新しい高さ（区間の外は端の区間の傾きで外挿する）
+    src = np.array([floor, hip, neck, top])
+    dst = floor + np.cumsum([0.0, legs * (hip - floor), torso * (neck - hip), head * (top - neck)])
+    slopes = np.array([legs, head])
+    # 全体の拡大縮小: 変形後の頭頂を target の高さに合わせる
+    uniform = params['height'] / (dst[-1] - floor) if 'height' in params else 1.0
+    blend = HEAD_BLEND * height
+
+    def remap(points):
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        new_z = np.interp(z, src, dst)
+        new_z = np.where(z < floor, dst[0] + (z - floor) * slopes[0], new_z)
+        new_z = np.where(z > top, dst[-1] + (z - top) * slopes[1], new_z)
+
+        ax = np.abs(x)
+        new_x = np.sign(x) * np.where(ax <= shoulder, ax * width, shoulder * width + (ax - shoulder) * arms)
+        # 首より上は頭の大きさで横方向も拡大縮小する（首の前後 blend の幅で切り替える）
+        t = np.clip((z - neck) / blend + 0.5, 0.0, 1.0) if blend > 0 else (z > neck).astype(np.float64)
+        lateral = (1.0 - t) + t * (head / width if width else 1.0)
+        new_x = new_x * lateral
+        new_y = y * width * lateral
+
+        result = np.stack([new_x, new_y, new_z], axis=1)
+        result[:, 2] = floor + (result[:, 2] - floor) * uniform
+        result[:, :2] *= uniform
+        return result
+
+    return remap
+
+def _matrix_pair(matrix):
+    m = np.array(matrix, dtype=np.float64)
+    return m, np.linalg.inv(m)
+
+def _to_local(points, inverse):
+    return points @ inverse[:3, :3].T + inverse[:3, 3]
+
+def capture_meshes(objects):
+    """
+    メッシュの元の座標を記録する。
+    戻り値: [(オブジェクト, matrix_world, 逆行列, {キー名 または None: 座標 (N, 3)}), ...]
+    """
+    captured = []
+    for obj in objects:
+        mesh = obj.data
+        count = len(mesh.vertices)
+        coords = {}
+        blocks = mesh.shape_keys.key_blocks if mesh.shape_keys else [None]
+        for block in blocks:
+            co = np.empty(count * 3, dtype=np.float32)
+            (block.data if block else mesh.vertices).foreach_get('co', co)
+            coords[block.name if block else None] = co.reshape(count, 3).astype(np.float64)
+        matrix, inverse = _matrix_pair(obj.matrix_world)
+        captured.append((obj, matrix, inverse, coords))
+    return captured
+
+def write_meshes(captured, remap=None):
+    """記録した座標（remap があれば変形した座標）をメッシュに書き戻す"""
+    for obj, matrix, inverse, coords in captured:
+        mesh = obj.data
+        for key, co in coords.items():
+            if remap is not None:
+                co = _to_local(remap(world_coordinates(co, matrix)), inverse)
+            target = mesh.shape_keys.key_blocks[key].data if key is not None else mesh.vertices
+            target.foreach_set('co', co.astype(np.float32).ravel())
+        mesh.update()
+
+def _edit_armature(arm):
+    """arm を編集モードにする（呼び出し側で OBJECT モードに戻す）"""
+    if bpy.context.object and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+    arm.select_set(True)
+    bpy.context.view_layer.objects.active = arm
+    bpy.ops.object.mode_set(mode='EDIT')
+    return arm.data.edit_bones
+
+def capture_armatures(armatures):
+    """
+    エディットボーンの head / tail（アーマチュア空間）を記録する。
+    戻り値: [(アーマチュア, matrix_world, 逆行列, head (N, 3), tail (N, 3)), ...]
+    """
+    captured = []
+    for arm in armatures:
+        edit_bones = _edit_armature(arm)
+        count = len(edit_bones)
+        heads = np.empty(count * 3, dtype=np.float32)
+        tails = np.empty(count * 3, dtype=np.float32)
+        edit_bones.foreach_get('head', heads)
+        edit_bones.foreach_get('tail', tails)
+        bpy.ops.object.mode_set(mode='OBJECT')
+        matrix, inverse = _matrix_pair(arm.matrix_world)
+        captured.append((arm, matrix, inverse,
+                         heads.reshape(count, 3).astype(np.float64), tails.reshape(count, 3).astype(np.float64)))
+    return captured
+
+def write_armatures(captured, remap=None):
+    """記録した静止位置（remap があれば変形した位置）をエディットボーンに書き戻す（ロールは保つ）"""
+    for arm, matrix, inverse, heads, tails in captured:
+        if remap is not None:
+            heads = _to_local(remap(world_coordinates(heads, matrix)), inverse)
+            tails = _to_local(remap(world_coordinates(tails, matrix)), inverse)
+        edit_bones = _edit_armature(arm)
+        rolls = np.empty(len(edit_bones), dtype=np.float32)
+        edit_bones.foreach_get('roll', rolls)
+        edit_bones.foreach_set('head', heads.astype(np.float32).ravel())
+        edit_bones.foreach_set('tail', tails.astype(np.float32).ravel())
+        edit_bones.foreach_set('roll', rolls)
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+def export_variants(variants, targets, exporters):
+    """
+    variants の体型ごとにシーンを変形して targets の各形式で書き出し、最後に元の体型に戻す。
+    variants: {名前: {'height', 'legs', 'torso', 'head', 'arms', 'width'}}（省略したキーは変形しない）
+    targets: [{'format', 'path', 'options'}, ...]（出力パスには variant_path で名前を付ける）
+    exporters: {形式: エクスポート関数}
+    戻り値: [{'name', 'height', 'format', 'path', 'size'}, ...]
+    """
+    scene = bpy.context.scene
+    # Rigify のボーンシェイプ（WGT-*）は体型の計測にも変形にも含めない
+    meshes = export_meshes(scene)
+    armatures = [o for o in scene.objects if o.type == 'ARMATURE']
+    if not meshes:
+        raise RuntimeError("バリエーションを作るメッシュがありません")
+
+    metrics = scene_metrics(meshes)
+    floor, height = metrics['bounds_min'][2], metrics['height']
+    landmarks = find_landmarks(armatures, floor, height)
+    logger.info(f"  体型の区切り: 股関節 {landmarks['hip']:.3f}m / 首 {landmarks['neck']:.3f}m / "
+                f"肩 {landmarks['shoulder']:.3f}m (元の身長 {height:.3f}m)")
+
+    with tracing.span("variants:capture", meshes=len(meshes), armatures=len(armatures)):
+        mesh_state = capture_meshes(meshes)
+        armature_state = capture_armatures(armatures)
+
+    results = []
+    try:
+        for name, params in variants.items():
+            with tracing.span("variant", name=name):
+                remap = variant_mapping(params, landmarks, floor, height)
+                write_meshes(mesh_state, remap)
+                write_armatures(armature_state, remap)
+                for target in targets:
+                    path = variant_path(target['path'], name)
+                    exporters[target['format']](path, **target.get('options', {}))
+                    results.append({'name': name, 'height': params.get('height', height),
+                                    'format': target['format'], 'path': path,
+                                    'size': os.path.getsize(path) if os.path.exists(path) else None})
+            logger.info(f"✓ バリエーション '{name}' を書き出しました: {params}")
+    finally:
+        write_meshes(mesh_state)
+        write_armatures(armature_state)
+    return results
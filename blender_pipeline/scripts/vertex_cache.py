@@ -0,0 +1,203 @@
+# scripts/vertex_cache.py
+"""
+頂点キャッシュに合わせた面・頂点の並べ替え
+
+GPU の変換後頂点キャッシュを効かせるため、エクスポート前にメッシュの面の順序を
+Tipsify（Sander, Nehab, Barczak 2007）で並べ替え、続けて頂点を面から初めて参照される順に並べ替える。
+多角形は扇形に三角形化して評価し、面の順序は各多角形の三角形が最初に出力された順とする。
+
+隣接関係（頂点 → 三角形）と三角形化は NumPy で一括して作り、Tipsify 本体と
+FIFO キャッシュの ACMR（三角形あたりのキャッシュミス数）計算だけを逐次処理する。
+並べ替えは bmesh の sort で行うため、UV・頂点グループ・シェイプキーはそのまま保たれる。
+
+アーマチュア以外のモディファイアは並べ替えの前にメッシュにベイクする（アーマチュアモディファイアは残す）。
+FBX には面・頂点ともこの順序で書き出される。glTF エクスポーターはプリミティブごとにループを
+重複排除して頂点バッファを作り直し、マテリアルごとにプリミティブを分けるため、GLB の三角形と頂点は
+書き出し後に glb_compression.reorder_vertices がプリミティブごとに並べ替え直す
+（vertex_cache を有効にすると pipeline が自動で指定する）。
+ここで返す ACMR は Blender のメッシュ（扇形に三角形化したもの）での値。
+"""
+import bpy
+import bmesh
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from logger import get_logger
+from utils import bake_modifiers, export_meshes, KEEP_MODIFIER_TYPES
+import tracing
+
+logger = get_logger('vertex_cache')
+
+# 想定する変換後頂点キャッシュのサイズ（頂点数）
+DEFAULT_CACHE_SIZE = 32
+
+def mesh_triangles(mesh):
+    """
+    多角形を扇形に三角形化する。
+    戻り値: (三角形の頂点番号 (T, 3), 各三角形の元の多角形番号 (T,))
+    """
+    count = len(mesh.polygons)
+    starts = np.empty(count, dtype=np.int64)
+    totals = np.empty(count, dtype=np.int64)
+    mesh.polygons.foreach_get('loop_start', starts)
+    mesh.polygons.foreach_get('loop_total', totals)
+    loops = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get('vertex_index', loops)
+
+    per_poly = np.maximum(totals - 2, 0)
+    poly = np.repeat(np.arange(count), per_poly)
+    # 多角形内での三角形の番号 k（0 .. n-3）
+    k = np.arange(len(poly)) - np.repeat(np.cumsum(per_poly) - per_poly, per_poly)
+    base = starts[poly]
+    tris = np.stack([loops[base], loops[base + k + 1], loops[base + k + 2]], axis=1)
+    return tris, poly
+
+def acmr(tris, cache_size=DEFAULT_CACHE_SIZE):
+    """FIFO キャッシュでの三角形あたりの平均キャッシュミス数"""
+    if not len(tris):
+        return 0.0
+    inserted = {}
+    misses = 0
+    for v in tris.ravel().tolist():
+        stamp = inserted.get(v)
+        if stamp is None or misses - stamp >= cache_size:
+            misses += 1
+            inserted[v] = misses
+    return misses / len(tris)
+
+def tipsify(tris, vertex_count, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Tipsify で三角形の出力順を求める。
+    戻り値: 三角形番号の並び (T,)
+    """
+    triangle_count = len(tris)
+    flat = tris.ravel()
+    # 頂点 → 隣接三角形（CSR 形式）
+    valence = np.bincount(flat, minlength=vertex_count)
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(valence, out=offsets[1:])
+    adjacency = (np.argsort(flat, kind='stable') // 3).tolist()
+    offsets = offsets.tolist()
+    tri_list = tris.tolist()
+
+    live = valence.tolist()
+    cache_time = [0] * vertex_count
+    emitted = [False] * triangle_count
+    dead_end = []
+    output = []
+    time = cache_size + 1
+    cursor = 0
+    fanning = 0
+
+    while fanning >= 0:
+        candidates = []
+        for t in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            output.append(t)
+            for v in tri_list[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - cache_time[v] > cache_size:
+                    cache_time[v] = time
+                    time += 1
+
+        # 次に扇を広げる頂点: キャッシュに残っていて、残りの三角形を出しても追い出されないもの
+        fanning, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - cache_time[v] + 2 * live[v] <= cache_size:
+                    priority = time - cache_time[v]
+                if priority > best:
+                    fanning, best = v, priority
+        if fanning < 0:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fanning = v
+                    break
+        if fanning < 0:
+            while cursor < vertex_count:
+                if live[cursor] > 0:
+                    fanning = cursor
+                    break
+                cursor += 1
+    return np.array(output, dtype=np.int64)
+
+def face_and_vertex_order(tris, poly, polygon_count, vertex_count, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Tipsify の結果から多角形と頂点の新しい順位を求める。
+    戻り値: (多角形の新しい番号 (P,), 頂点の新しい番号 (V,))
+    """
+    order = tipsify(tris, vertex_count, cache_size)
+    # 多角形は三角形が最初に出力された順。三角形を持たない多角形は末尾に残す
+    first = np.full(polygon_count, len(order), dtype=np.int64)
+    np.minimum.at(first, poly[order], np.arange(len(order)))
+    face_rank = np.empty(polygon_count, dtype=np.int64)
+    face_rank[np.argsort(first, kind='stable')] = np.arange(polygon_count)
+
+    # 頂点は並べ替え後の三角形で初めて参照される順。参照されない頂点は末尾
+    used = tris[order].ravel()
+    first_use = np.full(vertex_count, len(used), dtype=np.int64)
+    np.minimum.at(first_use, used, np.arange(len(used)))
+    vertex_rank = np.empty(vertex_count, dtype=np.int64)
+    vertex_rank[np.argsort(first_use, kind='stable')] = np.arange(vertex_count)
+    return face_rank, vertex_rank
+
+def reorder_mesh(mesh, face_rank, vertex_rank):
+    """bmesh の sort で面と頂点を並べ替える（カスタムデータは要素と一緒に移動する）"""
+    bm = bmesh.new()
+    try:
+        bm.from_mesh(mesh)
+        bm.faces.ensure_lookup_table()
+        bm.verts.ensure_lookup_table()
+        for face, rank in zip(bm.faces, face_rank.tolist()):
+            face.index = rank
+        bm.faces.sort()
+        for vert, rank in zip(bm.verts, vertex_rank.tolist()):
+            vert.index = rank
+        bm.verts.sort()
+        bm.to_mesh(mesh)
+    finally:
+        bm.free()
+    mesh.update()
+
+def optimize_vertex_cache(objects=None, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    各メッシュの面と頂点を並べ替え、ACMR の前後を返す。
+    エクスポートされる順序を元のメッシュと一致させるため、アーマチュア以外のモディファイア
+    （create_base の Subsurf など）は先にメッシュにベイクする（アーマチュアモディファイアは残す）。
+    ベイクできずにモディファイアが残ったメッシュ（シェイプキーを持つもの）はスキップする。
+    戻り値: {オブジェクト名: {'triangles', 'acmr_before', 'acmr_after'}}
+    """
+    if objects is None:
+        objects = export_meshes()
+    names = {mod.name for obj in objects for mod in obj.modifiers if mod.type not in KEEP_MODIFIER_TYPES}
+    if names:
+        bake_modifiers(objects, names)
+    results = {}
+    done = set()
+    for obj in objects:
+        mesh = obj.data
+        if mesh in done or not len(mesh.polygons):
+            continue
+        if any(mod.type not in KEEP_MODIFIER_TYPES for mod in obj.modifiers):
+            logger.warning(f"⚠ '{obj.name}' はモディファイアが残っているため頂点キャッシュの最適化をスキップします。")
+            continue
+        with tracing.span("vertex_cache", object=obj.name):
+            tris, poly = mesh_triangles(mesh)
+            before = acmr(tris, cache_size)
+            face_rank, vertex_rank = face_and_vertex_order(tris, poly, len(mesh.polygons),
+                                                           len(mesh.vertices), cache_size)
+            reorder_mesh(mesh, face_rank, vertex_rank)
+            after = acmr(mesh_triangles(mesh)[0], cache_size)
+        done.add(mesh)
+        results[obj.name] = {'triangles': len(tris), 'acmr_before': round(before, 4), 'acmr_after': round(after, 4)}
+        logger.info(f"  {obj.name}: ACMR {before:.3f} → {after:.3f} ({len(tris)} 三角形, キャッシュ {cache_size})")
+    return results
@@ -0,0 +1,107 @@
+# scripts/worker.py
+"""
+常駐ワーカー: Blender を一度だけ起動し、標準入力から JSON Lines で
+ビルドジョブを受け取って pipeline.run_pipeline を繰り返し実行する。
+
+起動:
+  blender --background --python blender_pipeline/scripts/worker.py [-- --log_level DEBUG --log_json worker.jsonl]
+
+ジョブ (1行1JSON):
+  {"id": "tsumugi", "config": "characters/tsumugi/config.json",
+   "output": "characters/tsumugi", "blend": null, "use_asset_motions": false,
+   "cache_dir": null, "no_cache": false}
+  {"cmd": "quit"}
+
+各ジョブの結果は標準出力に RESULT_PREFIX 付きの1行 JSON で返す。
+それ以外の行は通常のビルドログ。
+"""
+import bpy
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from pipeline import run_pipeline, log, DEFAULT_CACHE_DIR
+import logger as pipeline_logger
+
+RESULT_PREFIX = "@@worker "
+
+def respond(payload):
+    """結果行を出力する（バッファ中のログを先に書き出し、結果行と混ざらないようにする）"""
+    pipeline_logger.flush()
+    sys.stdout.flush()
+    print(RESULT_PREFIX + json.dumps(payload, ensure_ascii=False), flush=True)
+
+def warm_up():
+    """Rigify など毎回のビルドで必要になるアドオンを一度だけ読み込む"""
+    import addon_utils
+    if 'rigify' not in bpy.context.preferences.addons:
+        addon_utils.enable('rigify', default_set=True)
+        log("INFO", "✓ Rigify addon enabled")
+
+def reset_state():
+    """
+    前のジョブのデータを破棄する。
+    run_pipeline がベース .blend を open_mainfile で開き直すため、
+    ここではファクトリー状態の空シーンに戻すだけでよい
+    （read_factory_settings はアドオン設定も初期化するため使わない）。
+    """
+    bpy.ops.wm.read_homefile(use_empty=True)
+
+def handle_job(job):
+    job_id = job.get('id') or job.get('config')
+    start_time = time.time()
+    try:
+        reset_state()
+        outputs = run_pipeline(job['config'],
+                               output_dir=job.get('output'),
+                               blend_path=job.get('blend'),
+                               use_asset_motions=job.get('use_asset_motions', False),
+                               cache_dir=None if job.get('no_cache') else (job.get('cache_dir') or DEFAULT_CACHE_DIR))
+        respond({'id': job_id, 'status': 'success', 'returncode': 0,
+                 'duration': time.time() - start_time, 'outputs': outputs})
+    except Exception as e:
+        log("ERROR", f"❌ パイプライン実行中にエラーが発生しました: {e}")
+        log("ERROR", traceback.format_exc())
+        respond({'id': job_id, 'status': 'failed', 'returncode': 1,
+                 'duration': time.time() - start_time, 'error': str(e)})
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="常駐ビルドワーカー")
+    parser.add_argument('--log_level', type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    parser.add_argument('--log_json', type=str, help='ログを JSON Lines でも書き出すパス')
+    args, _ = parser.parse_known_args(sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else [])
+    return args
+
+def main():
+    args = parse_args()
+    pipeline_logger.configure(args.log_level, json_path=args.log_json)
+    warm_up()
+    respond({'status': 'ready', 'pid': os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            respond({'status': 'failed', 'returncode': 1, 'error': f"invalid job: {e}"})
+            continue
+
+        if job.get('cmd') == 'quit':
+            break
+        if 'config' not in job:
+            respond({'id': job.get('id'), 'status': 'failed', 'returncode': 1,
+                     'error': "'config' が指定されていません"})
+            continue
+        handle_job(job)
+
+    respond({'status': 'exit'})
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+パイプラインの計測用ユーティリティ
+
+span() で囲んだ区間のウォール時間・CPU時間・ピークRSSを記録し、
+Chrome trace-event 形式 (chrome://tracing / Perfetto で表示可能) で書き出す。
+計測が無効なときの span() は使い回しの nullcontext を返すだけなので、
+ホットループ内に置いてもほぼコストはかからない。
+"""
+import os
+import sys
+import time
+import threading
+import contextlib
+import cProfile
+import pstats
+import io
+import json
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_NULL_SPAN = contextlib.nullcontext()
+
+_state = {
+    'enabled': False,
+    'profile': False,
+    'profile_top': 20,
+    'events': [],
+    'origin': 0.0,
+}
+
+def enable(profile=False, profile_top=20):
+    """計測を開始する（記録済みのイベントは破棄する）"""
+    _state['enabled'] = True
+    _state['profile'] = profile
+    _state['profile_top'] = profile_top
+    _state['events'] = []
+    _state['origin'] = time.perf_counter()
+
+def disable():
+    _state['enabled'] = False
+    _state['profile'] = False
+
+def is_enabled():
+    return _state['enabled']
+
+def peak_rss_mb():
+    """プロセスのピーク RSS (MB)。取得できない環境では None"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    if sys.platform == 'darwin':
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+@contextlib.contextmanager
+def _span(name, category, args):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    rss_start = peak_rss_mb()
+    try:
+        yield
+    finally:
+        wall_end = time.perf_counter()
+        event_args = dict(args)
+        event_args['cpu_ms'] = round((time.process_time() - cpu_start) * 1000, 3)
+        rss = peak_rss_mb()
+        if rss is not None:
+            # ピーク RSS はプロセス全体の最大値で減らないため、区間ごとの比較には増分を使う
+            event_args['peak_rss_mb'] = round(rss, 1)
+            event_args['rss_growth_mb'] = round(rss - rss_start, 1)
+        _state['events'].append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (wall_start - _state['origin']) * 1e6,
+            'dur': (wall_end - wall_start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': event_args,
+        })
+
+def span(name, category='pipeline', **args):
+    """
+    計測区間。with tracing.span("create_action", action=name): のように使う。
+    入れ子にすると trace 上でも入れ子で表示される。
+    """
+    if not _state['enabled']:
+        return _NULL_SPAN
+    return _span(name, category, args)
+
+@contextlib.contextmanager
+def _profiled(name, log_func):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(_state['profile_top'])
+        log_func(f"📈 cProfile [{name}] 上位 {_state['profile_top']} 関数:\n{out.getvalue()}")
+
+@contextlib.contextmanager
+def stage(name, log_func=print):
+    """
+    パイプラインのステージ単位の計測。span に加え、プロファイル有効時は
+    cProfile で囲み、累積時間の上位関数をステージごとに出力する。
+    """
+    with span(f"stage:{name}", category='stage'):
+        if _state['profile']:
+            with _profiled(name, log_func):
+                yield
+        else:
+            yield
+
+def write_trace(path):
+    """記録したイベントを Chrome trace-event JSON として書き出す"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    events = sorted(_state['events'], key=lambda e: e['ts'])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return len(events)
+
+def stage_summary():
+    """
+    ステージごとの計測結果を {ステージ名: {wall_ms, cpu_ms, rss_growth_mb}} で返す。
+    rss_growth_mb はステージ中にピーク RSS が増えた量（それまでのピークを超えなければ 0）。
+    """
+    summary = {}
+    for e in _state['events']:
+        if e['cat'] != 'stage':
+            continue
+        summary[e['name'][len('stage:'):]] = {
+            'wall_ms': round(e['dur'] / 1000, 3),
+            'cpu_ms': e['args'].get('cpu_ms'),
+            'rss_growth_mb': e['args'].get('rss_growth_mb'),
+        }
+    return summary
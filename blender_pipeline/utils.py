@@ -1,6 +1,10 @@
 import bpy
 import os
 
+from logger import get_logger
+
+logger = get_logger('utils')
+
 def cleanup_scene():
     """
     シーンから不要なオブジェクトを削除する
@@ -31,57 +35,76 @@ def get_rig_object():
     """
     rigs = [o for o in bpy.context.scene.objects if o.type == 'ARMATURE']
     if not rigs:
-        print("⚠ リグが見つかりません。")
+        logger.warning("⚠ リグが見つかりません。")
         return None
 
-    print(f"  検出されたアーマチュア: {[r.name for r in rigs]}")
+    logger.debug("  検出されたアーマチュア: %s", [r.name for r in rigs])
 
     rig = next((o for o in rigs if o.name == 'rig'), None)
     if rig:
-        print(f"  ターゲットリグとして '{rig.name}' を選択しました (名前 'rig' に一致)。")
+        logger.info(f"  ターゲットリグとして '{rig.name}' を選択しました (名前 'rig' に一致)。")
         return rig
         
     rig = next((o for o in rigs if o.name.endswith('_rig')), None)
     if rig:
-        print(f"  ターゲットリグとして '{rig.name}' を選択しました (接尾辞 '_rig' に一致)。")
+        logger.info(f"  ターゲットリグとして '{rig.name}' を選択しました (接尾辞 '_rig' に一致)。")
         return rig
         
     rig = next((o for o in rigs if 'metarig' not in o.name.lower()), None)
     if rig:
-        print(f"  ターゲットリグとして '{rig.name}' を選択しました ('metarig'を含まない)。")
+        logger.info(f"  ターゲットリグとして '{rig.name}' を選択しました ('metarig'を含まない)。")
         return rig
         
     if rigs:
         rig = rigs[0]
-        print(f"  ターゲットリグとして最初のアーマチュア '{rig.name}' を選択しました。")
+        logger.info(f"  ターゲットリグとして最初のアーマチュア '{rig.name}' を選択しました。")
         return rig
     
     return None
 
 
+def export_meshes(scene=None):
+    """
+    エクスポートされるメッシュ（ビューレイヤーで表示されているもの）を返す。
+    Rigify が WGTS_<rig> コレクションに作るボーンのカスタムシェイプ（WGT-*）は除く。
+    """
+    scene = scene or bpy.context.scene
+    widgets = {pb.custom_shape for o in scene.objects if o.type == 'ARMATURE'
+               for pb in o.pose.bones if pb.custom_shape}
+    return [o for o in scene.objects if o.type == 'MESH' and o.visible_get() and o not in widgets]
+
+
 def find_control_bone(rig, candidates):
     """
     候補リストからリグに存在する最初のコントロールボーンを検出する
     """
     if not rig or not hasattr(rig, 'pose') or not rig.pose:
-        print(f"⚠ 有効なリグが提供されていません。")
+        logger.warning(f"⚠ 有効なリグが提供されていません。")
         return None
         
     for bone_name in candidates:
         if bone_name in rig.pose.bones:
-            print(f"✓ コントロールボーン '{bone_name}' を検出しました。")
+            logger.info(f"✓ コントロールボーン '{bone_name}' を検出しました。")
             return bone_name
             
-    print(f"⚠ コントロールボーン未検出: 候補 {candidates} はリグに存在しません。")
+    logger.warning(f"⚠ コントロールボーン未検出: 候補 {candidates} はリグに存在しません。")
     return None
 
 
+def resolve_control_bones(rig, control_bones):
+    """
+    役割ごとの候補リスト {役割: [候補, ...]} から、リグに存在するボーンを役割ごとに検出する。
+    戻り値: {役割: ボーン名 または None}
+    """
+    return {role: find_control_bone(rig, candidates) for role, candidates in control_bones.items()}
+
+
 def load_asset_library(library_path):
     """
     アセットライブラリをロードする
     """
     if not os.path.exists(library_path):
-        print(f"⚠ アセットライブラリパス '{library_path}' が存在しません。")
+        logger.warning(f"⚠ アセットライブラリパス '{library_path}' が存在しません。")
         return False
         
     try:
@@ -89,9 +112,65 @@ def load_asset_library(library_path):
         library = bpy.context.preferences.filepaths.asset_libraries.get("Asset Library")
         if library:
             library.path = library_path
-            print(f"✓ アセットライブラリを '{library_path}' に設定しました。")
+            logger.info(f"✓ アセットライブラリを '{library_path}' に設定しました。")
             return True
     except Exception as e:
-        print(f"⚠ アセットライブラリの追加に失敗しました: {e}")
+        logger.warning(f"⚠ アセットライブラリの追加に失敗しました: {e}")
         
     return False
+
+
+# ベイクしても削除せず、評価からも外すモディファイア
+KEEP_MODIFIER_TYPES = {'ARMATURE'}
+
+def bake_modifiers(objects, modifier_names):
+    """
+    各オブジェクトのモディファイアスタックを、modifier_names のうち最後のものまで
+    評価済みメッシュから1回で適用し、適用したモディファイアを削除する。
+    それより前のモディファイアも結果に含まれるため一緒に削除し、後ろのモディファイアは残す。
+    アーマチュアなど KEEP_MODIFIER_TYPES のモディファイアは評価から外して残す
+    （スタックの途中にあってもポーズをベイクせず、リグへのバインドを保つ）。
+    シェイプキーを持つメッシュは適用するとキーが失われるためスキップする。
+    戻り値: ベイクしたオブジェクトの数
+    """
+    names = set(modifier_names)
+    targets = []
+    for obj in objects:
+        if obj.type != 'MESH':
+            continue
+        indices = [i for i, mod in enumerate(obj.modifiers) if mod.name in names]
+        if not indices:
+            continue
+        if obj.data.shape_keys:
+            logger.warning(f"⚠ '{obj.name}' はシェイプキーを持つため、モディファイアのベイクをスキップします。")
+            continue
+        last = indices[-1]
+        # 後ろのモディファイアと残すモディファイアを一時的に無効化して評価する
+        disabled = [mod for i, mod in enumerate(obj.modifiers)
+                    if mod.show_viewport and (i > last or mod.type in KEEP_MODIFIER_TYPES)]
+        for mod in disabled:
+            mod.show_viewport = False
+        targets.append((obj, last, disabled))
+    if not targets:
+        return 0
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    try:
+        for obj, last, _ in targets:
+            old_mesh = obj.data
+            mesh = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph),
+                                                   preserve_all_data_layers=True, depsgraph=depsgraph)
+            name = old_mesh.name
+            obj.data = mesh
+            for mod in list(obj.modifiers)[:last + 1]:
+                if mod.type not in KEEP_MODIFIER_TYPES:
+                    obj.modifiers.remove(mod)
+            if old_mesh.users == 0:
+                bpy.data.meshes.remove(old_mesh)
+                mesh.name = name
+    finally:
+        for _, _, disabled in targets:
+            for mod in disabled:
+                mod.show_viewport = True
+    logger.info(f"✓ {len(targets)} オブジェクトのモディファイアをメッシュにベイクしました。")
+    return len(targets)
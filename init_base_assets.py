@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
+import argparse
+import hashlib
+import json
 import os
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 
 def log(message):
@@ -10,23 +14,240 @@ def log(message):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] {message}")
 
-def run_blender_script(script_path, blender_bin="blender"):
-    """Blenderスクリプトを実行する"""
+# 生成スクリプトと依存関係。各スクリプトは base_assets/<kind>/<kind>.blend を書き出す。
+# setup_motion_assets.py は Rigify でリグを生成するため、Rigify の有効化と
+# メタリグ生成を確認する setup_meta_rig.py の完了後に実行する。
+# inputs はスクリプト以外に出力を左右するファイル（リポジトリルートからの相対パス）。
+ASSET_SCRIPTS = {
+    "setup_meta_rig.py": {"kind": "meta_rigs", "deps": []},
+    "setup_motion_assets.py": {"kind": "motions", "deps": ["setup_meta_rig.py"],
+                               "inputs": ["blender_pipeline/motions/asset_library.json",
+                                          "blender_pipeline/motion_data.py",
+                                          "blender_pipeline/utils.py",
+                                          "blender_pipeline/scripts/animation.py"]},
+    "setup_shape_keys.py": {"kind": "shapekeys", "deps": []},
+    "setup_materials.py": {"kind": "materials", "deps": []},
+    "setup_weight_presets.py": {"kind": "weight_presets", "deps": []},
+    "setup_clothing.py": {"kind": "clothing", "deps": []},
+    "setup_hair.py": {"kind": "hair", "deps": []},
+    "setup_lighting.py": {"kind": "lighting", "deps": []},
+}
+
+SCRIPT_DIRS = ["", os.path.join("blender_pipeline", "scripts")]
+
+MANIFEST_NAME = "manifest.json"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ベースアセット (.blend) を生成する")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help='同時に実行する Blender プロセス数')
+    parser.add_argument('--force', action='store_true',
+                        help='マニフェストを無視して全アセットを再生成する')
+    parser.add_argument('--only', action='append', metavar='KIND',
+                        choices=[spec["kind"] for spec in ASSET_SCRIPTS.values()],
+                        help='指定した種類のアセットだけを再生成する (複数指定可)')
+    return parser.parse_args()
+
+def file_digest(path):
+    """ファイル内容の SHA-256 を返す（存在しなければ None）"""
+    if not os.path.isfile(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def get_blender_version(blender_bin):
+    """`blender --version` の1行目 (例: 'Blender 4.4.3') を返す"""
+    try:
+        result = subprocess.run([blender_bin, "--version"], capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    for line in result.stdout.splitlines():
+        if line.startswith("Blender"):
+            return line.strip()
+    return None
+
+def asset_output_path(base_dir, kind):
+    return os.path.join(base_dir, "base_assets", kind, f"{kind}.blend")
+
+def load_manifest(base_dir):
+    path = os.path.join(base_dir, "base_assets", MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {"assets": {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log(f"⚠ マニフェストを読み込めません。全アセットを再生成します: {e}")
+        return {"assets": {}}
+
+def save_manifest(base_dir, manifest):
+    path = os.path.join(base_dir, "base_assets", MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def input_hashes(spec, base_dir):
+    return {path: file_digest(os.path.join(base_dir, path)) for path in spec.get("inputs", [])}
+
+def stale_reason(script, spec, manifest, base_dir, blender_version):
+    """再生成が必要な理由を返す（最新なら None）"""
+    entry = manifest["assets"].get(spec["kind"])
+    if not entry:
+        return "マニフェストに記録なし"
+    if entry.get("script") != script or entry.get("script_hash") != file_digest(find_script(base_dir, script) or ""):
+        return "スクリプトが変更されました"
+    if entry.get("input_hashes", {}) != input_hashes(spec, base_dir):
+        return "入力ファイルが変更されました"
+    if entry.get("blender_version") != blender_version:
+        return f"Blender バージョンが変わりました ({entry.get('blender_version')} → {blender_version})"
+    if entry.get("output_hash") != file_digest(asset_output_path(base_dir, spec["kind"])):
+        return "出力ファイルがないか変更されています"
+    return None
+
+def select_scripts(args, manifest, base_dir, blender_version):
+    """
+    再生成するスクリプトを選ぶ。
+    --only 指定時はその種類だけ、--force 指定時は全て、それ以外は入力が変わったものと
+    その依存元（再生成されたスクリプトに依存するもの）を選ぶ。
+    """
+    if args.only:
+        return {s: spec for s, spec in ASSET_SCRIPTS.items() if spec["kind"] in args.only}
+    if args.force:
+        return dict(ASSET_SCRIPTS)
+
+    selected = {}
+    for script, spec in ASSET_SCRIPTS.items():
+        reason = stale_reason(script, spec, manifest, base_dir, blender_version)
+        if reason:
+            log(f"  ↻ {script}: {reason}")
+            selected[script] = spec
+        else:
+            log(f"  ✓ {script}: 最新です")
+
+    # 依存先が再生成される場合は依存元も再生成する
+    changed = True
+    while changed:
+        changed = False
+        for script, spec in ASSET_SCRIPTS.items():
+            if script not in selected and any(d in selected for d in spec["deps"]):
+                log(f"  ↻ {script}: 依存先が再生成されます")
+                selected[script] = spec
+                changed = True
+    return selected
+
+def update_manifest(manifest, results, base_dir, blender_version):
+    """成功したスクリプトのエントリを更新する"""
+    for script, r in results.items():
+        if r['status'] != 'success':
+            continue
+        kind = ASSET_SCRIPTS[script]["kind"]
+        manifest["assets"][kind] = {
+            "script": script,
+            "script_hash": file_digest(find_script(base_dir, script)),
+            "input_hashes": input_hashes(ASSET_SCRIPTS[script], base_dir),
+            "blender_version": blender_version,
+            "output": os.path.relpath(asset_output_path(base_dir, kind), base_dir),
+            "output_hash": file_digest(asset_output_path(base_dir, kind)),
+            "generated_at": datetime.now().isoformat(timespec='seconds'),
+        }
+
+def find_script(base_dir, script):
+    """リポジトリルートと blender_pipeline/scripts からスクリプトを探す"""
+    for d in SCRIPT_DIRS:
+        path = os.path.join(base_dir, d, script)
+        if os.path.exists(path):
+            return path
+    return None
+
+def run_blender_script(script_path, log_path, blender_bin="blender", cwd=None):
+    """
+    Blenderスクリプトを実行する。
+    標準出力・標準エラーはバッファせずそのまま log_path に書き出す。
+    (成功したか, 所要時間) を返す。
+    """
     log(f"🚀 実行中: {os.path.basename(script_path)}")
     start_time = time.time()
     
-    cmd = [blender_bin, "--background", "--python", script_path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    cmd = [blender_bin, "--background", "--python-exit-code", "1", "--python", script_path]
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        result = subprocess.run(cmd, stdout=log_file, stderr=subprocess.STDOUT, cwd=cwd)
     
+    duration = time.time() - start_time
     if result.returncode != 0:
-        log(f"❌ エラー: {os.path.basename(script_path)} の実行に失敗しました")
-        log(f"エラー出力: {result.stderr}")
-        return False
+        log(f"❌ エラー: {os.path.basename(script_path)} の実行に失敗しました (ログ: {log_path})")
+        return False, duration
     
-    end_time = time.time()
-    duration = end_time - start_time
     log(f"✅ 完了: {os.path.basename(script_path)} (所要時間: {duration:.2f}秒)")
-    return True
+    return True, duration
+
+def run_script_graph(scripts, base_dir, blender_bin, jobs):
+    """
+    依存関係を満たしたスクリプトから順にプロセスプールで並列実行する。
+    依存先が失敗したスクリプトは実行しない。
+    戻り値: {script: {'status': 'success'|'failed'|'skipped'|'missing', 'duration': 秒}}
+    """
+    log_dir = os.path.join(base_dir, "base_assets", "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    results = {}
+    pending = dict(scripts)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            pending_before = len(pending)
+            for script, spec in list(pending.items()):
+                deps = [d for d in spec["deps"] if d in scripts]
+                if any(results.get(d, {}).get('status') in ('failed', 'skipped', 'missing') for d in deps):
+                    log(f"⚠ スキップ: {script} (依存先が失敗しました)")
+                    results[script] = {'status': 'skipped', 'duration': 0.0}
+                    del pending[script]
+                    continue
+                if not all(d in results for d in deps):
+                    continue
+                del pending[script]
+                script_path = find_script(base_dir, script)
+                if not script_path:
+                    log(f"⚠ 警告: スクリプト '{script}' が見つかりません")
+                    results[script] = {'status': 'missing', 'duration': 0.0}
+                    continue
+                log_path = os.path.join(log_dir, f"{os.path.splitext(script)[0]}.log")
+                future = pool.submit(run_blender_script, script_path, log_path, blender_bin, base_dir)
+                running[future] = script
+
+            if not running:
+                if pending and len(pending) == pending_before:
+                    raise ValueError(f"依存関係が循環しています: {', '.join(pending)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                script = running.pop(future)
+                ok, duration = future.result()
+                results[script] = {'status': 'success' if ok else 'failed', 'duration': duration}
+    return results
+
+def critical_path(scripts, results):
+    """所要時間の合計が最大になる依存チェーンを返す: (スクリプトのリスト, 合計秒数)"""
+    finish = {}
+    chain = {}
+
+    def visit(script):
+        if script in finish:
+            return finish[script]
+        best_dep, best_time = None, 0.0
+        for dep in scripts[script]["deps"]:
+            if dep in scripts and visit(dep) > best_time:
+                best_dep, best_time = dep, finish[dep]
+        finish[script] = best_time + results.get(script, {}).get('duration', 0.0)
+        chain[script] = (chain[best_dep] if best_dep else []) + [script]
+        return finish[script]
+
+    end = max(scripts, key=visit)
+    return chain[end], finish[end]
 
 def create_directory_structure():
     """ディレクトリ構造を作成する"""
@@ -59,6 +280,7 @@ def create_directory_structure():
 
 def main():
     """ベースアセットを初期化する"""
+    args = parse_args()
     blender_bin = os.environ.get("BLENDER_BIN", "blender")
     
     base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -67,30 +289,34 @@ def main():
     
     create_directory_structure()
     
-    scripts = [
-        "setup_meta_rig.py",
-        "setup_motion_assets.py",
-        "setup_shape_keys.py",
-        "setup_materials.py",
-        "setup_weight_presets.py",
-        "setup_clothing.py",
-        "setup_hair.py",
-        "setup_lighting.py"
-    ]
+    blender_version = get_blender_version(blender_bin)
+    manifest = load_manifest(base_dir)
+    log(f"🔍 マニフェストを確認します (Blender: {blender_version})")
+    scripts = select_scripts(args, manifest, base_dir, blender_version)
     
-    log("🚀 アセット生成スクリプトを実行します")
+    if not scripts:
+        log("✅ 全てのベースアセットが最新です")
+        return 0
     
-    success_count = 0
-    for script in scripts:
-        script_path = os.path.join(base_dir, script)
-        if os.path.exists(script_path):
-            if run_blender_script(script_path, blender_bin):
-                success_count += 1
-        else:
-            log(f"⚠ 警告: スクリプト '{script}' が見つかりません")
+    log(f"🚀 アセット生成スクリプトを実行します: {len(scripts)}/{len(ASSET_SCRIPTS)} ({args.jobs} 並列)")
+    
+    start_time = time.time()
+    results = run_script_graph(scripts, base_dir, blender_bin, args.jobs)
+    elapsed = time.time() - start_time
     
+    update_manifest(manifest, results, base_dir, blender_version)
+    save_manifest(base_dir, manifest)
+    
+    success_count = sum(1 for r in results.values() if r['status'] == 'success')
     log(f"✅ ベースアセット生成完了: {success_count}/{len(scripts)} スクリプトが成功しました")
     
+    log("⏱ スクリプトごとの所要時間:")
+    for script in scripts:
+        r = results.get(script, {'status': 'skipped', 'duration': 0.0})
+        log(f"  - {script:<26} {r['status']:<8} {r['duration']:7.2f}秒")
+    path, path_time = critical_path(scripts, results)
+    log(f"⏱ クリティカルパス: {' → '.join(path)} ({path_time:.2f}秒) / 全体: {elapsed:.2f}秒")
+    
     log("📁 生成されたアセットファイル:")
     asset_dirs = [
         "base_assets/meta_rigs",